@@ -0,0 +1,392 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import time
+import PyOphidia.client as _client
+import PyOphidia.ophsubmit as _ophsubmit
+from inspect import currentframe
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+def get_linenumber():
+    cf = currentframe()
+    return __file__, cf.f_back.f_lineno
+
+
+class AsyncConnectionPool(object):
+    """AsyncConnectionPool(server, port, context, maxsize=4, idle_timeout=60, path=None) -> obj : pool of non-blocking keep-alive
+    HTTPS connections to an Ophidia server, to be used from a single event loop. Connections are plain HTTP when context is None
+    and go through the UNIX-domain socket at path, if given"""
+
+    def __init__(self, server, port, context, maxsize=_ophsubmit.DEFAULT_POOL_SIZE, idle_timeout=_ophsubmit.DEFAULT_POOL_IDLE_TIMEOUT, path=None):
+        self.server = str(server)
+        self.port = port
+        self.context = context
+        self.path = path
+        self.host = "localhost" if path is not None else "%s:%d" % (self.server, int(port))
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = []
+
+    async def acquire(self):
+        """acquire() -> ((reader, writer), reused) : return an idle connection, or open a new one if none is available"""
+
+        now = time.time()
+        while self._idle:
+            reader, writer, last_used = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing() and (self.idle_timeout is None or now - last_used <= self.idle_timeout):
+                return (reader, writer), True
+            writer.close()
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(self.path)
+        elif self.context is None:
+            reader, writer = await asyncio.open_connection(self.server, int(self.port))
+        else:
+            reader, writer = await asyncio.open_connection(self.server, int(self.port), ssl=self.context, server_hostname=self.server)
+        return (reader, writer), False
+
+    def release(self, conn, reusable=True):
+        """release(conn, reusable=True) -> None : give a connection back to the pool, closing it if it cannot be reused"""
+
+        reader, writer = conn
+        if reusable and not writer.is_closing() and len(self._idle) < self.maxsize:
+            self._idle.append((reader, writer, time.time()))
+        else:
+            writer.close()
+
+    def clear(self):
+        """clear() -> None : close all idle connections"""
+
+        idle, self._idle = self._idle, []
+        for reader, writer, last_used in idle:
+            writer.close()
+
+
+async def _read_response(reader, status_line, sink):
+    status_line = status_line.decode("ISO-8859-1").rstrip("\r\n")
+    version, status, reason = (status_line.split(" ", 2) + [""])[:3]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, value = line.decode("ISO-8859-1").split(":", 1)
+        headers[key.strip().lower()] = value.strip()
+
+    # The body of a successful reply is decompressed and handed over to the sink chunk by chunk, as soon as it is received
+    decoder = _ophsubmit.ContentDecoder(headers.get("content-encoding"), sink)
+    feed = decoder.feed if status == "200" else None
+    will_close = headers.get("connection", "").lower() == "close" or (version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive")
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip(), 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            while size > 0:
+                chunk = await reader.readexactly(min(size, _ophsubmit.READ_CHUNK_SIZE))
+                size -= len(chunk)
+                if feed is not None:
+                    feed(chunk)
+            await reader.readexactly(2)
+    elif "content-length" in headers:
+        size = int(headers["content-length"])
+        while size > 0:
+            chunk = await reader.readexactly(min(size, _ophsubmit.READ_CHUNK_SIZE))
+            size -= len(chunk)
+            if feed is not None:
+                feed(chunk)
+    else:
+        while True:
+            chunk = await reader.read(_ophsubmit.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if feed is not None:
+                feed(chunk)
+        will_close = True
+    decoder.close()
+    return int(status), reason, will_close, decoder
+
+
+async def _post(pool, body, headers, sink, resend=False):
+    # Same policy of the synchronous pool: a stale reused connection causes the request to be sent again on a new one, if
+    # it could not be fully written or if resend is True (e.g. for read-only operators)
+    head = "POST / HTTP/1.1\r\nHost: %s\r\nContent-Length: %d\r\n" % (pool.host, len(body))
+    head += "".join("%s: %s\r\n" % (key, value) for key, value in headers.items()) + "\r\n"
+    while True:
+        conn, reused = await pool.acquire()
+        reader, writer = conn
+        written = False
+        try:
+            writer.write(head.encode("ISO-8859-1"))
+            writer.write(body)
+            await writer.drain()
+            written = True
+            # Wait for the status line of the reply before considering the connection alive
+            status_line = await reader.readline()
+            if not status_line:
+                raise ConnectionResetError("connection closed by the server")
+        except asyncio.CancelledError:
+            # Interrupted by a deadline: the connection is left in an unknown state
+            writer.close()
+            raise
+        except (OSError, asyncio.IncompleteReadError):
+            writer.close()
+            if reused and (resend or not written):
+                continue
+            raise
+        break
+    try:
+        statuscode, statusmessage, will_close, decoder = await _read_response(reader, status_line, sink)
+    except BaseException:
+        writer.close()
+        raise
+    pool.release(conn, not will_close)
+    return statuscode, statusmessage, decoder
+
+
+async def submit(username, password, server, port, query, pool, compression=_ophsubmit.DEFAULT_COMPRESSION, compress_threshold=_ophsubmit.DEFAULT_COMPRESS_THRESHOLD, stats=None, deadline=None):
+    """submit(username, password, server, port, query, pool, compression=True, compress_threshold=None, stats=None, deadline=None) -> tuple :
+    coroutine equivalent of ophsubmit.submit, sending the request through an AsyncConnectionPool and returning the same
+    (response, jobid, newsession, return_value, error) tuple"""
+
+    if not isinstance(query, _ophsubmit.Query):
+        try:
+            query = _ophsubmit.Query(query)
+        except ValueError:
+            return (None, None, None, 3, "Invalid request")
+    request = query.to_workflow(username)
+    resend = query.operator in _ophsubmit.READ_ONLY_OPERATORS
+
+    try:
+        soapMessage, headers = _ophsubmit._build_message(username, password, request)
+        raw_size = len(soapMessage)
+        reader = _ophsubmit.EnvelopeReader()
+        soapMessage = _ophsubmit._negotiate(soapMessage, headers, compression, compress_threshold)
+        if deadline is None:
+            statuscode, statusmessage, decoder = await _post(pool, soapMessage, headers, reader.feed, resend)
+        else:
+            remaining = _ophsubmit._remaining(deadline)
+            try:
+                statuscode, statusmessage, decoder = await asyncio.wait_for(_post(pool, soapMessage, headers, reader.feed, resend), remaining)
+            except asyncio.TimeoutError:
+                raise _ophsubmit.DeadlineExceeded("deadline exceeded")
+        if stats is not None:
+            stats.add(len(soapMessage), raw_size, decoder.received, decoder.decoded)
+
+        if statuscode != 200:
+            print(get_linenumber(), "Something went wrong in submitting the request:", statuscode, statusmessage)
+            return (None, None, None, 1, statusmessage)
+
+        reader.close()
+    except Exception as e:
+        print(get_linenumber(), "Something went wrong in submitting the request:", e)
+        return (None, None, None, 1, e)
+    return _ophsubmit._make_result(reader)
+
+
+class AsyncClient(object):
+    """AsyncClient(client=None, max_concurrency=16, **kwargs) -> obj
+
+    asyncio interface to the Ophidia server sharing login parameters and session state with a Client, so that a single event loop
+    can keep many requests in flight at once. When client is not given, a new Client is created passing all the other keyword
+    arguments to it.
+
+    Attributes:
+        client: Client instance providing login parameters and session state
+        max_concurrency: Maximum number of requests in flight at the same time (default is 16)
+
+    Methods:
+        submit(query, display=False) -> dict : Coroutine submitting a query like 'operator=myoperator;param1=value1;' or
+            'myoperator param1=value1;' and returning the deserialized response.
+        submit_many(queries, display=False) -> list : Coroutine submitting all the queries concurrently and returning the list of
+            deserialized responses, in the same order.
+        refresh_status(monitor, session=None) -> list : Coroutine refreshing the status of the workflows followed by a
+            StatusMonitor, one request for each session, and returning the list of StatusDelta.
+        close() -> None : Close the idle connections.
+
+    The 'https', 'http' and 'unix' transports of the Client are supported, while custom transports are not. An AsyncClient
+    can be used by successive event loops (e.g. by many asyncio.run calls), but not by two loops at the same time.
+    """
+
+    def __init__(self, client=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, **kwargs):
+        """AsyncClient(client=None, max_concurrency=16, **kwargs) -> obj
+        :param client: Client instance providing login parameters and session state
+        :type client: Client
+        :param max_concurrency: Maximum number of requests in flight at the same time
+        :type max_concurrency: int
+        :returns: None
+        :rtype: None
+        :raises: RuntimeError
+        """
+
+        if client is None:
+            client = _client.Client(**kwargs)
+        if client.local_mode is True:
+            raise RuntimeError("AsyncClient cannot be used when local_mode is set")
+        if _ophsubmit.is_transport(client.transport) or client.transport not in _ophsubmit.TRANSPORTS:
+            raise RuntimeError("AsyncClient cannot be used with a custom transport")
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._pool = None
+        self._semaphore = None
+        self._loop = None
+
+    def _get_pool(self):
+        # Event loop objects are created lazily, inside the loop that runs the coroutines, and created again when the
+        # AsyncClient is used from another loop (e.g. by a later asyncio.run), since they cannot be shared among loops
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            if self._pool is not None:
+                try:
+                    self._pool.clear()
+                except RuntimeError:
+                    # The connections belong to a loop that is already closed
+                    pass
+            self._pool = None
+            self._loop = loop
+        if self._pool is None:
+            client = self.client
+            maxsize = max(client.pool_size, self.max_concurrency)
+            if client.transport == "unix":
+                self._pool = AsyncConnectionPool("localhost", None, None, maxsize=maxsize, idle_timeout=client.pool_idle_timeout, path=client.server)
+            else:
+                context = client._get_pool().context if client.transport == "https" else None
+                self._pool = AsyncConnectionPool(client.server, client.port, context, maxsize=maxsize, idle_timeout=client.pool_idle_timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._pool
+
+    async def _submit_request(self, query):
+        # Same retry policy of the Client, but waiting between two attempts without holding a slot of max_concurrency
+        client = self.client
+        pool = self._get_pool()
+        policy = client.retry_policy
+        if policy is not None:
+            try:
+                query = _ophsubmit.Query(query)
+            except ValueError:
+                policy = None
+        if policy is not None:
+            rejected = policy._begin()
+            if rejected is not None:
+                return rejected
+        deadline, cancel = client._get_deadline()
+        if cancel:
+            query, name = _client._tag_query(query)
+        started = time.time()
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                result = await submit(client.username, client.password, client.server, client.port, query, pool, client.compression, client.compress_threshold, client.transfer_stats, deadline)
+            delay = None
+            if policy is not None:
+                delay = policy._next_delay(result, query.operator, attempt, started, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
+        if cancel and isinstance(result[4], _ophsubmit.DeadlineExceeded):
+            await asyncio.get_event_loop().run_in_executor(None, client._cancel_expired, name)
+        return result
+
+    async def submit(self, query, display=False):
+        """submit(query, display=False) -> dict : Coroutine submitting a query like 'operator=myoperator;param1=value1;' or
+               'myoperator param1=value1;' to the Ophidia server according to all login parameters of the Client and its state.
+        :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;'
+        :type query: str
+        :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is False)
+        :type display: bool
+        :returns: deserialized response or None
+        :rtype: dict or None
+        :raises: RuntimeError
+        """
+
+        client = self.client
+        if query is None:
+            raise RuntimeError("query is not present")
+        if client.username is None or client.password is None or client.server is None or client.port is None:
+            raise RuntimeError("one or more login parameters are None")
+        query = client._prepare_query(query)
+        cached = client.response_cache.get(query) if client.response_cache is not None else None
+        result = cached if cached is not None else await self._submit_request(query)
+
+        # The client state is updated under its lock, so it is consistent also with threads sharing the Client
+        try:
+            result = client._handle_result(query, result)
+            if client.response_cache is not None and cached is None:
+                client.response_cache.update(query, result)
+            response = result.deserialize_response()
+            if response is not None and client.api_mode and display is True:
+                client.pretty_print(response, None)
+        except Exception as e:
+            print(get_linenumber(), "Something went wrong in submitting the request:", e)
+            return None
+        return response
+
+    async def _request(self, query, session=None):
+        # Same of Client._request, leaving the state of the client untouched
+        client = self.client
+        query = _client._internal_query(query, session)
+        return _client._check_internal(client._build_result(query, await self._submit_request(query))[0])
+
+    async def refresh_status(self, monitor, session=None):
+        """refresh_status(monitor, session=None) -> list : Coroutine refreshing the status of the workflows followed by a
+               StatusMonitor, sending the requests of all the sessions concurrently
+        :param monitor: monitor of the workflows
+        :type monitor: StatusMonitor
+        :param session: session of the workflows (all sessions if None)
+        :type session: str
+        :returns: list of StatusDelta, one for each workflow whose status or progress changed
+        :rtype: list
+        :raises: RuntimeError
+        """
+
+        queries = monitor.queries(session)
+        results = await asyncio.gather(*[self._request(query, session) for session, query in queries])
+        deltas = []
+        for (session, query), result in zip(queries, results):
+            deltas.extend(monitor.update(session, result.get_response()))
+        return deltas
+
+    async def submit_many(self, queries, display=False):
+        """submit_many(queries, display=False) -> list : Coroutine submitting all the queries concurrently, at most max_concurrency
+               at a time, and returning the list of deserialized responses in the same order of the queries
+        :param queries: list of queries like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;'
+        :type queries: list
+        :param display: option for displaying the responses in a "pretty way" using the pretty_print function (default is False)
+        :type display: bool
+        :returns: list of deserialized responses (None for failed requests)
+        :rtype: list
+        """
+
+        return list(await asyncio.gather(*[self.submit(query, display) for query in queries]))
+
+    def close(self):
+        """close() -> None : Close the idle connections"""
+
+        if self._pool is not None:
+            self._pool.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,198 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import re
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray, BackendEntrypoint
+from xarray.core import indexing
+import PyOphidia.cube as _cube
+
+# PIDs of Ophidia cubes, e.g. http://127.0.0.1/ophidia/1/1
+_PID = re.compile(r"^https?://\S+/[0-9]+/[0-9]+$")
+
+
+def _explore(cube, dims, subset_filter, metadata=False):
+    # Submit an oph_explorecube request for a hyperslab of the cube, selected by index, and return its Response
+    query = "oph_explorecube ncore=1;base64=yes;level=2;show_index=yes;show_time=yes;subset_type=index;limit_filter=0;save=no;subset_dims={0};subset_filter={1};{2}cube={3};".format(
+        "|".join(dims), subset_filter, "export_metadata=yes;" if metadata else "", cube.pid
+    )
+    result = _cube.Cube.client.submit(query, display=False)
+    if result is None:
+        raise RuntimeError("Unable to explore the cube " + str(cube.pid))
+    return result.get_response()
+
+
+def _coordinates(cube):
+    # Return the values of each dimension and the metadata of the cube ({variable: {key: value}}, with '' for global ones),
+    # taken from the metadata cache or otherwise with a small oph_explorecube request for each dimension, which keeps all the
+    # other dimensions at their first index. Time values are strings, as in Cube.to_dataset
+    coordinates = attributes = None
+    if _cube.Cube.metadata_cache is not None:
+        coordinates = _cube.Cube.metadata_cache.get(cube.pid, "coordinates")
+        attributes = _cube.Cube.metadata_cache.get(cube.pid, "attributes")
+    dims = [dim["name"] for dim in cube.dim_info]
+    if coordinates is not None and attributes is not None and set(dims) <= set(coordinates):
+        return coordinates, attributes
+    time_dim = _cube._time_dimension_finder(cube)
+    coordinates = {}
+    attributes = {}
+    for i, dim in enumerate(cube.dim_info):
+        subset_filter = "|".join("1:" + d["size"] if d is dim else "1" for d in cube.dim_info)
+        response = _explore(cube, dims, subset_filter, metadata=(i == 0))
+        values = None
+        dimvalues = response.find(objkey="explorecube_dimvalues")
+        if dimvalues is not None:
+            for content in dimvalues.objcontent:
+                if content["title"] == dim["name"] and content["rowfieldtypes"] and content["rowvalues"]:
+                    values = content
+        if values is None:
+            raise RuntimeError("Unable to get the values of dimension " + dim["name"])
+        if dim["name"] == time_dim:
+            coordinates[dim["name"]] = [row[1].split(",")[0].strip() for row in values["rowvalues"]]
+        else:
+            coordinates[dim["name"]] = _cube._decode_column(values["rowvalues"], 1, values["rowfieldtypes"][1], first=True).tolist()
+        if i == 0:
+            for obj in response.find_all(objkey="explorecube_metadata"):
+                content = obj.objcontent[0]
+                if content.get("rowkeys") and content.get("rowvalues"):
+                    key, value, variable = content["rowkeys"].index("Key"), content["rowkeys"].index("Value"), content["rowkeys"].index("Variable")
+                    for row in content["rowvalues"]:
+                        attributes.setdefault(row[variable], {})[row[key]] = row[value]
+    if _cube.Cube.metadata_cache is not None:
+        _cube.Cube.metadata_cache.put(cube.pid, "coordinates", coordinates)
+        _cube.Cube.metadata_cache.put(cube.pid, "attributes", attributes)
+    return coordinates, attributes
+
+
+class OphidiaBackendArray(BackendArray):
+    """OphidiaBackendArray(cube, dims, shape, dtype, fill_value=None) -> obj : measure of a cube that is not retrieved until it is
+    indexed. Each selection (integers and slices, also with steps) is translated into the subset_filter of an oph_explorecube
+    request, so that only the selected hyperslab is transferred. As in Cube.to_dataset, the values equal to fill_value are
+    replaced with NaN
+
+    Attributes:
+        cube: Cube whose measure is represented
+        dims: Names of the dimensions, in the order of the axes
+        shape: Size of each dimension
+        dtype: NumPy type of the measure
+        fill_value: Value of the missing data, or None
+    """
+
+    def __init__(self, cube, dims, shape, dtype, fill_value=None):
+        self.cube = cube
+        self.dims = dims
+        self.shape = shape
+        self.dtype = dtype
+        self.fill_value = fill_value
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC, self._getitem)
+
+    def _getitem(self, key):
+        filters = []
+        shape = []
+        reversed_axes = []
+        for k, size in zip(key, self.shape):
+            if isinstance(k, slice):
+                indexes = range(*k.indices(size))
+                if len(indexes) == 0:
+                    return np.empty([len(range(*kk.indices(n))) for kk, n in zip(key, self.shape) if isinstance(kk, slice)], dtype=self.dtype)
+                if indexes.step < 0:
+                    # Ophidia filters go forward: the selection is retrieved in ascending order and reversed
+                    indexes = indexes[::-1]
+                    reversed_axes.append(len(shape))
+                if len(indexes) == 1:
+                    filters.append(str(indexes[0] + 1))
+                elif indexes.step == 1:
+                    filters.append("%d:%d" % (indexes[0] + 1, indexes[-1] + 1))
+                else:
+                    filters.append("%d:%d:%d" % (indexes[0] + 1, indexes.step, indexes[-1] + 1))
+                shape.append(len(indexes))
+            else:
+                filters.append(str(int(k) % size + 1))
+        values = self.cube._explore_block("|".join(self.dims), "|".join(filters)).reshape(shape)
+        if reversed_axes:
+            values = values[tuple(slice(None, None, -1) if axis in reversed_axes else slice(None) for axis in range(len(shape)))]
+        if self.fill_value is not None and values.dtype.kind == "f":
+            values = np.array(values)
+            values[values == self.fill_value] = np.nan
+        return values
+
+
+def open_cube(cube, drop_variables=None):
+    """open_cube(cube, drop_variables=None) -> xarray.core.dataset.Dataset : return a Xarray dataset whose measure is retrieved
+    only when (and as far as) it is indexed or loaded, while dimensions and attributes are taken from the metadata of the cube
+    (see Cube.metadata_cache). The measure can be split into dask chunks with xarray.open_dataset(pid, engine='ophidia',
+    chunks={}), which follows the fragments of the cube along its outermost explicit dimension
+    :param cube: a Cube or the PID of a cube
+    :type cube: <class 'PyOphidia.cube.Cube'> or str
+    :param drop_variables: names of the variables to be left out
+    :type drop_variables: str or list
+    :returns: a 'xarray.core.dataset.Dataset' object
+    :rtype: <class 'xarray.core.dataset.Dataset'>
+    :raises: RuntimeError
+    """
+
+    if _cube.Cube.client is None:
+        raise RuntimeError("Cube.client is None")
+    if not isinstance(cube, _cube.Cube):
+        cube = _cube.Cube(pid=str(cube))
+    cube.compute()
+    if isinstance(drop_variables, str):
+        drop_variables = [drop_variables]
+    drop_variables = set(drop_variables or [])
+    if cube.measure_type not in _cube._NUMPY_TYPES:
+        raise RuntimeError("The measure type is not valid")
+
+    coordinates, attributes = _coordinates(cube)
+    dims = [dim["name"] for dim in cube.dim_info]
+    shape = tuple(int(dim["size"]) for dim in cube.dim_info)
+    variables = {}
+    for name in dims:
+        if name not in drop_variables:
+            variables[name] = xr.Variable((name,), coordinates[name], dict(attributes.get(name, {})))
+    if cube.measure not in drop_variables:
+        measure_attributes = dict(attributes.get(cube.measure, {}))
+        fill_value = None
+        if cube.measure_type.lower() not in ("int", "long"):
+            for key in ("_FillValue", "missing_value"):
+                if key in measure_attributes:
+                    fill_value = float(measure_attributes[key])
+        data = indexing.LazilyIndexedArray(OphidiaBackendArray(cube, dims, shape, np.dtype(_cube._NUMPY_TYPES[cube.measure_type]), fill_value))
+        encoding = {}
+        dim, unit = _cube._fragment_indexes(cube.dim_info, cube.rowsxfrag)
+        if dim is not None:
+            encoding["preferred_chunks"] = {dim["name"]: unit}
+        variables[cube.measure] = xr.Variable(dims, data, measure_attributes, encoding)
+    return xr.Dataset(variables, attrs=dict(attributes.get("", {})))
+
+
+class OphidiaBackendEntrypoint(BackendEntrypoint):
+    """OphidiaBackendEntrypoint() -> obj : Xarray backend opening Ophidia cubes by PID with xarray.open_dataset(pid, engine='ophidia'),
+    through the Client set with Cube.setclient (see open_cube)"""
+
+    description = "Open Ophidia datacubes, retrieving only the data that are indexed"
+    url = "http://ophidia.cmcc.it"
+    open_dataset_parameters = ("filename_or_obj", "drop_variables")
+
+    def open_dataset(self, filename_or_obj, drop_variables=None):
+        return open_cube(filename_or_obj, drop_variables=drop_variables)
+
+    def guess_can_open(self, filename_or_obj):
+        return isinstance(filename_or_obj, _cube.Cube) or (isinstance(filename_or_obj, str) and _PID.match(filename_or_obj) is not None)
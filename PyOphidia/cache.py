@@ -0,0 +1,400 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import PyOphidia.ophsubmit as _ophsubmit
+import PyOphidia.retry as _retry
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+DEFAULT_MAXSIZE = 256
+DEFAULT_METADATA_MAXSIZE = 4096
+DEFAULT_METADATA_MAX_BYTES = 64 * 1024 * 1024
+SQLITE_TIMEOUT = 30
+
+# Number of seconds the responses of each operator are kept for
+DEFAULT_TTLS = {
+    "oph_cubeschema": 600,
+    "oph_cubesize": 600,
+    "oph_list": 30,
+    "oph_showgrid": 60,
+    "oph_hierarchy": 3600,
+    "oph_operators_list": 3600,
+    "oph_primitives_list": 3600,
+    "oph_man": 3600,
+}
+
+# Operators whose responses depend on a single cube, invalidated when the cube is changed
+CUBE_OPERATORS = frozenset(["oph_cubeschema", "oph_cubesize"])
+# Operators listing the content of the session, invalidated by any change
+LISTING_OPERATORS = frozenset(["oph_list", "oph_showgrid"])
+# Operators describing the server itself, which depend neither on the session nor on the cwd or the cube
+CATALOG_OPERATORS = frozenset(["oph_hierarchy", "oph_operators_list", "oph_primitives_list", "oph_man"])
+# Operators changing many cubes at once, which invalidate all the responses of the session
+CONTAINER_OPERATORS = frozenset(["oph_deletecontainer", "oph_movecontainer", "oph_createcontainer", "oph_folder", "oph_fs", "oph_randcube", "oph_randcube2"])
+
+# Arguments not affecting the response of a query
+IGNORED_ARGUMENTS = frozenset(["exec_mode", "ncores", "nthreads"])
+CONTEXT_ARGUMENTS = frozenset(["cwd", "cdd", "cube"])
+
+
+def _arguments(query):
+    # Split the 'param=value' arguments of a Query into a dict
+    arguments = {}
+    for argument in query.arguments:
+        key, sep, value = argument.partition("=")
+        arguments[key.strip()] = value.strip()
+    return arguments
+
+
+def _touch(entries, key):
+    # Mark an entry as the most recently used one
+    if hasattr(entries, "move_to_end"):
+        entries.move_to_end(key)
+    else:
+        entries[key] = entries.pop(key)
+
+
+def _cubes(value):
+    # Return the set of PIDs given as cube argument, either a single PID or a list like '[pid1|pid2]'
+    return set(pid for pid in value.strip("[]").split("|") if pid)
+
+
+def _read_only_workflow(workflow):
+    # Return True if all the tasks of a JSON workflow are read-only operators
+    try:
+        tasks = json.loads(workflow).get("tasks")
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return bool(tasks) and all(str(task.get("operator", "")).lower() in _retry.READ_ONLY_OPERATORS for task in tasks)
+
+
+class ResponseCache(object):
+    """ResponseCache(maxsize=256, ttls=None) -> obj : cache of the responses of read-only operators, shared by the requests of a
+    Client
+
+    Only successful synchronous requests for the operators listed in ttls are cached, for the number of seconds given for each
+    operator. Keys are normalized from the queries: the order of the arguments and those not affecting the response (e.g. ncores)
+    are not taken into account. When the cache is full the least recently used response is evicted. Any other request
+    (except those of the read-only operators of the retry module, unless given an action other than read) is assumed to change the session and invalidates the cached
+    listings of the session (e.g. oph_list) and the responses about the cubes it refers to; workflows and operators on whole
+    containers invalidate all the responses of the session (unless the workflows include read-only operators only).
+
+    Attributes:
+        maxsize: Maximum number of responses kept
+        ttls: Dict of the cached operators and the number of seconds their responses are kept for (default is DEFAULT_TTLS)
+        hits: Number of requests answered from the cache
+        misses: Number of requests of cached operators sent to the server
+        evictions: Number of responses evicted because the cache was full
+        invalidations: Number of responses invalidated by other requests or expired
+
+    Methods:
+        get(query) -> Result : Return the cached Result of a query, or None.
+        update(query, result) -> None : Cache the Result of a query or invalidate the responses it may have changed.
+        invalidate(session=None) -> None : Drop all the responses of a session, or of all sessions if None.
+        reset_counters() -> None : Reset hits, misses, evictions and invalidations.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, ttls=None):
+        self.maxsize = maxsize
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, query):
+        # Return (key, session, operator, arguments) for a cached operator, or None
+        try:
+            if not isinstance(query, _ophsubmit.Query):
+                query = _ophsubmit.Query(query)
+        except ValueError:
+            return None
+        if self.ttls.get(query.operator) is None or query.exec_mode not in (None, "sync"):
+            return None
+        arguments = _arguments(query)
+        if arguments.get("action", "read") != "read":
+            return None
+        ignored = IGNORED_ARGUMENTS
+        session = query.sessionid
+        if query.operator in CATALOG_OPERATORS:
+            ignored = ignored | CONTEXT_ARGUMENTS
+            session = None
+        key = (session, query.operator, tuple(sorted((k, v) for k, v in arguments.items() if k not in ignored)))
+        return key, query.sessionid, query.operator, arguments
+
+    def get(self, query):
+        """get(query) -> Result : return the cached Result of a query, or None if the response is not cached or has expired
+        :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;'
+        :type query: str or Query
+        :returns: cached result or None
+        :rtype: Result or None
+        """
+
+        key = self._key(query)
+        if key is None:
+            return None
+        key = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            _touch(self._entries, key)
+            self.hits += 1
+            return entry[1]
+
+    def update(self, query, result):
+        """update(query, result) -> None : cache the Result of a successful request of a cached operator or, for any other request,
+               invalidate the responses it may have changed
+        :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;', or JSON workflow
+        :type query: str or Query
+        :param result: result of the request
+        :type result: Result
+        :returns: None
+        :rtype: None
+        """
+
+        found = self._key(query)
+        if found is not None:
+            key, session, operator, arguments = found
+            if result.return_value or result.error is not None:
+                return
+            with self._lock:
+                self._entries[key] = (time.time() + self.ttls[operator], result, session, operator, arguments.get("cube"))
+                _touch(self._entries, key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return
+
+        try:
+            if not isinstance(query, _ophsubmit.Query):
+                query = _ophsubmit.Query(query)
+        except ValueError:
+            query = None
+        if query is None or query.operator is None:
+            # Workflows may change anything in their session, unless they are made of read-only operators only
+            if query is not None and query.workflow is not None and _read_only_workflow(query.workflow):
+                return
+            self.invalidate(result.session)
+            return
+        arguments = _arguments(query)
+        # Read-only operators change the session only when they are given an action other than read (e.g. oph_cubeschema
+        # action=add adds metadata to the cube)
+        if (query.operator in _retry.READ_ONLY_OPERATORS or query.operator in self.ttls) and arguments.get("action", "read") == "read":
+            return
+        if query.operator in CONTAINER_OPERATORS:
+            self.invalidate(query.sessionid)
+            return
+        cubes = _cubes(arguments.get("cube", ""))
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry[2] != query.sessionid:
+                    continue
+                if entry[3] in LISTING_OPERATORS or (entry[3] in CUBE_OPERATORS and entry[4] in cubes):
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def invalidate(self, session=None):
+        """invalidate(session=None) -> None : drop all the responses of a session, or of all sessions if session is None
+        :param session: ID of the session
+        :type session: str
+        :returns: None
+        :rtype: None
+        """
+
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if session is None or entry[2] == session:
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def reset_counters(self):
+        """reset_counters() -> None : reset hits, misses, evictions and invalidations"""
+
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __repr__(self):
+        return "ResponseCache(size=%d, maxsize=%d, hits=%d, misses=%d)" % (len(self._entries), self.maxsize, self.hits, self.misses)
+
+
+class MetadataCache(object):
+    """MetadataCache(path=None, maxsize=4096, max_bytes=67108864) -> obj : cache of the metadata of cubes, identified by their PID
+
+    Since a cube cannot change once created, its metadata (e.g. the response of oph_cubeschema, the
+    information on its dimensions and their coordinates) is kept with no expiration, until the cube is deleted. Values are
+    stored as JSON, in memory or, if path is given, in a SQLite database shared by all the processes using the same file, so
+    that later runs start with the metadata already known. When more than maxsize values or max_bytes bytes are stored, the
+    least recently used values are evicted.
+
+    Attributes:
+        path: Path of the SQLite database, None to keep the values in memory
+        maxsize: Maximum number of values stored
+        max_bytes: Maximum total size in bytes of the values stored
+        hits: Number of values found in the cache
+        misses: Number of values not found in the cache
+        evictions: Number of values evicted
+
+    Methods:
+        get(pid, kind) -> object : Return the value of the given kind (e.g. 'cubeschema') stored for a cube, or None.
+        put(pid, kind, value) -> None : Store a value, which must be serializable to JSON, for a cube.
+        drop(pid) -> None : Drop all the values stored for a cube, e.g. because it has been deleted.
+        clear() -> None : Drop all the values.
+    """
+
+    def __init__(self, path=None, maxsize=DEFAULT_METADATA_MAXSIZE, max_bytes=DEFAULT_METADATA_MAX_BYTES):
+        if path is not None and sqlite3 is None:
+            raise RuntimeError("sqlite3 module is not available")
+        self.path = os.path.expanduser(path) if path is not None else None
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+
+    def _connect(self):
+        # A connection is opened by each process, also after a fork
+        if self._conn is None or self._conn_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=SQLITE_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS metadata (pid TEXT NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (pid, kind))")
+            self._conn, self._conn_pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, pid, kind):
+        """get(pid, kind) -> object : return the value of the given kind stored for a cube, or None if not stored
+        :param pid: PID of the cube
+        :type pid: str
+        :param kind: kind of value, e.g. 'cubeschema'
+        :type kind: str
+        :returns: value or None
+        :rtype: object
+        """
+
+        with self._lock:
+            if self.path is None:
+                entry = self._entries.get((pid, kind))
+                if entry is not None:
+                    _touch(self._entries, (pid, kind))
+                    entry = entry[0]
+            else:
+                conn = self._connect()
+                entry = conn.execute("SELECT value FROM metadata WHERE pid = ? AND kind = ?", (pid, kind)).fetchone()
+                if entry is not None:
+                    conn.execute("UPDATE metadata SET accessed = ? WHERE pid = ? AND kind = ?", (time.time(), pid, kind))
+                    entry = entry[0]
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(entry)
+
+    def put(self, pid, kind, value):
+        """put(pid, kind, value) -> None : store a value of the given kind for a cube, replacing the previous one
+        :param pid: PID of the cube
+        :type pid: str
+        :param kind: kind of value, e.g. 'cubeschema'
+        :type kind: str
+        :param value: value serializable to JSON
+        :type value: object
+        :returns: None
+        :rtype: None
+        """
+
+        value = json.dumps(value)
+        size = len(value)
+        with self._lock:
+            if self.path is None:
+                previous = self._entries.pop((pid, kind), None)
+                if previous is not None:
+                    self._bytes -= previous[1]
+                self._entries[(pid, kind)] = (value, size)
+                self._bytes += size
+                while self._entries and (len(self._entries) > self.maxsize or self._bytes > self.max_bytes):
+                    self._bytes -= self._entries.popitem(last=False)[1][1]
+                    self.evictions += 1
+                return
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO metadata (pid, kind, value, size, accessed) VALUES (?, ?, ?, ?, ?)", (pid, kind, value, size, time.time()))
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM metadata").fetchone()
+            if count > self.maxsize or total > self.max_bytes:
+                evicted = []
+                for rowid, entry_size in conn.execute("SELECT rowid, size FROM metadata ORDER BY accessed"):
+                    if count <= self.maxsize and total <= self.max_bytes:
+                        break
+                    evicted.append((rowid,))
+                    count, total = count - 1, total - entry_size
+                conn.executemany("DELETE FROM metadata WHERE rowid = ?", evicted)
+                self.evictions += len(evicted)
+
+    def drop(self, pid):
+        """drop(pid) -> None : drop all the values stored for a cube, e.g. because it has been deleted
+        :param pid: PID of the cube
+        :type pid: str
+        :returns: None
+        :rtype: None
+        """
+
+        with self._lock:
+            if self.path is None:
+                for key in [key for key in self._entries if key[0] == pid]:
+                    self._bytes -= self._entries.pop(key)[1]
+            else:
+                self._connect().execute("DELETE FROM metadata WHERE pid = ?", (pid,))
+
+    def clear(self):
+        """clear() -> None : drop all the values"""
+
+        with self._lock:
+            if self.path is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._connect().execute("DELETE FROM metadata")
+
+    def __len__(self):
+        with self._lock:
+            if self.path is None:
+                return len(self._entries)
+            return self._connect().execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def __repr__(self):
+        return "MetadataCache(path=%r, hits=%d, misses=%d)" % (self.path, self.hits, self.misses)
@@ -0,0 +1,253 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import sys
+import binascii
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from inspect import currentframe
+
+if sys.version_info < (3, 0):
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qsl
+else:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qsl
+
+DEFAULT_KEEP = 300
+MAX_BODY_SIZE = 65536
+
+
+def get_linenumber():
+    cf = currentframe()
+    return __file__, cf.f_back.f_lineno
+
+
+Notification = namedtuple("Notification", ["jobid", "session", "workflowid", "status", "params"])
+Notification.__doc__ = """Notification(jobid, session, workflowid, status, params) : notification sent by the Ophidia server to the
+callback_url of a workflow (status is None if not reported, params holds all the parameters received)"""
+
+
+def _job_key(jobid):
+    # Return (session, workflowid) from a jobid like 'session?workflowid#markerid'
+    session, sep, rest = str(jobid).partition("?")
+    if not sep:
+        return None, None
+    return session, rest.split("#")[0]
+
+
+def parse_notification(params):
+    """parse_notification(params) -> Notification : build a Notification from the parameters of a request sent to a callback_url,
+           given either the jobid or the workflowid (and sessionid) of the workflow
+    :param params: parameters of the request
+    :type params: dict
+    :returns: notification or None if the workflow cannot be identified
+    :rtype: Notification or None
+    """
+
+    params = dict((str(key).lower(), value) for key, value in params.items())
+    jobid = params.get("jobid") or params.get("job_id")
+    session, workflowid = _job_key(jobid) if jobid else (None, None)
+    if workflowid is None:
+        workflowid = params.get("workflowid") or params.get("workflow_id") or params.get("idworkflow")
+        session = params.get("sessionid") or params.get("session_id") or params.get("session")
+    if not workflowid:
+        return None
+    status = params.get("status")
+    if status is not None:
+        # Only symbolic statuses (e.g. 'OPH_STATUS_COMPLETED') are meaningful for the client
+        status = str(status)
+        if not status.upper().startswith("OPH_STATUS_"):
+            status = None
+    return Notification(jobid, session, str(workflowid), status, params)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _handle(self, body):
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") != self.server.receiver.path.rstrip("/"):
+            self.send_error(404)
+            return
+        params = dict(parse_qsl(url.query))
+        if body:
+            try:
+                if body.lstrip().startswith(b"{"):
+                    params.update(json.loads(body.decode("utf-8")))
+                else:
+                    params.update(parse_qsl(body.decode("utf-8")))
+            except ValueError:
+                self.send_error(400)
+                return
+        notification = parse_notification(params)
+        if notification is None:
+            self.send_error(400)
+            return
+        self.server.receiver._dispatch(notification)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        self._handle(None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_SIZE:
+            self.send_error(413)
+            return
+        self._handle(self.rfile.read(length))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CallbackReceiver(object):
+    """CallbackReceiver(host='127.0.0.1', port=0, url=None, keep=300) -> obj : local HTTP listener receiving the notifications sent by
+    the Ophidia server to the callback_url of the workflows, so that their completion is known without polling
+
+    The listener runs in a daemon thread, started on first use. Its url, which includes a random token so that notifications
+    cannot be forged by other clients, is given as callback_url of the workflows. Notifications are matched to the handlers by
+    jobid (i.e. session and workflow id); those arriving before the handler of the workflow is registered are kept for keep
+    seconds. When the server cannot reach host directly (e.g. behind NAT), bind host='0.0.0.0' to a fixed port and give the
+    public address as url.
+
+    Attributes:
+        host: Address the listener is bound to
+        port: Port the listener is bound to (0 to choose a free one)
+        url: URL to be given as callback_url of the workflows
+        path: Path of the URL, holding the random token
+        keep: Number of seconds unmatched notifications are kept for
+        notifications: Number of notifications received
+
+    Methods:
+        start() -> self : Start the listener, if not running yet.
+        register(jobid, handler) -> None : Call handler(notification) when the workflow of the given jobid is notified.
+        unregister(jobid) -> None : Forget the handler of the workflow of the given jobid.
+        close() -> None : Stop the listener.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, url=None, keep=DEFAULT_KEEP):
+        self.host = host
+        self.port = port
+        self.path = "/" + binascii.hexlify(os.urandom(16)).decode("ascii")
+        self.keep = keep
+        self.notifications = 0
+        self._url = url
+        self._handlers = {}
+        self._unmatched = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        self.start()
+        if self._url is not None:
+            return self._url.rstrip("/") + self.path
+        return "http://" + self.host + ":" + str(self.port) + self.path
+
+    def start(self):
+        """start() -> self : start the listener in a daemon thread, if not running yet
+        :returns: self
+        :rtype: CallbackReceiver
+        """
+
+        with self._lock:
+            if self._server is None:
+                self._server = _Server((self.host, self.port), _Handler)
+                self._server.receiver = self
+                self.port = self._server.server_address[1]
+                self._thread = threading.Thread(target=self._server.serve_forever, name="PyOphidia-CallbackReceiver")
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def register(self, jobid, handler):
+        """register(jobid, handler) -> None : call handler(notification) when the workflow of the given jobid is notified, at once if
+               its notification has already been received
+        :param jobid: jobid of the workflow, like 'session?workflowid#markerid'
+        :type jobid: str
+        :param handler: function called with the Notification
+        :type handler: callable
+        :returns: None
+        :rtype: None
+        :raises: ValueError
+        """
+
+        key = _job_key(jobid)
+        if key[1] is None:
+            raise ValueError("not a valid jobid: " + str(jobid))
+        with self._lock:
+            self._purge()
+            notification = self._unmatched.pop(key, None) or self._unmatched.pop((None, key[1]), (None, None))
+            notification = notification[1]
+            self._handlers[key] = handler
+        if notification is not None:
+            self._call(handler, notification)
+
+    def unregister(self, jobid):
+        """unregister(jobid) -> None : forget the handler of the workflow of the given jobid"""
+
+        with self._lock:
+            self._handlers.pop(_job_key(jobid), None)
+
+    def close(self):
+        """close() -> None : stop the listener"""
+
+        with self._lock:
+            server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    def _purge(self):
+        now = time.time()
+        for key in [key for key, (received, notification) in self._unmatched.items() if received + self.keep < now]:
+            del self._unmatched[key]
+
+    def _dispatch(self, notification):
+        with self._lock:
+            self.notifications += 1
+            key = (notification.session, notification.workflowid)
+            handler = self._handlers.get(key)
+            if handler is None and notification.session is None:
+                # Match by workflow id only, when it identifies a single workflow
+                found = [k for k in self._handlers if k[1] == notification.workflowid]
+                if len(found) == 1:
+                    key, handler = found[0], self._handlers[found[0]]
+            if handler is None:
+                self._purge()
+                self._unmatched[key] = (time.time(), notification)
+                return
+        self._call(handler, notification)
+
+    def _call(self, handler, notification):
+        try:
+            handler(notification)
+        except Exception as e:
+            print(get_linenumber(), "Something went wrong in handling the notification:", e)
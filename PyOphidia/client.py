@@ -23,8 +23,15 @@ import sys
 import os
 import json
 import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from inspect import currentframe
+import PyOphidia.graph as _graph
 import PyOphidia.ophsubmit as _ophsubmit
+import PyOphidia.response as _response
+import PyOphidia.retry as _retry
 import shutil
 
 sys.path.append(os.path.dirname(__file__))
@@ -35,8 +42,131 @@ def get_linenumber():
     return __file__, cf.f_back.f_lineno
 
 
+CANCEL_TIMEOUT = 10
+SESSION_CACHE_TTL = 3600
+
+# Configuration keys returned by oph_get_config and the client attributes they are resumed into
+_SESSION_CONFIG = (("OPH_SESSION_ID", "session"), ("OPH_BASE_SRC_PATH", "base_src_path"), ("OPH_CDD", "cdd"), ("OPH_CWD", "cwd"), ("OPH_DATACUBE", "cube"))
+
+
+def _internal_query(query, session=None):
+    # Complete a query sent by the client on its own behalf, which runs synchronously in the given session
+    query += "exec_mode=sync;"
+    if session:
+        query += "sessionid=" + session + ";"
+    return query
+
+
+def _check_internal(result):
+    if result.return_value:
+        raise RuntimeError(result.error)
+    return result
+
+
+def _read_session_cache(path, key, ttl=SESSION_CACHE_TTL):
+    # Return the state saved for the given key in a session cache file, or None if missing or older than ttl seconds
+    try:
+        with open(path) as f:
+            entry = json.load(f).get(key)
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+    if not isinstance(entry, dict) or time.time() - entry.get("time", 0) > ttl:
+        return None
+    return entry
+
+
+def _write_session_cache(path, key, state):
+    # Save the state for the given key in a session cache file, shared by many clients, readable only by the user and
+    # replaced atomically so that concurrent readers never see a partial file
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+        if not isinstance(cache, dict):
+            cache = {}
+    except (IOError, OSError, ValueError):
+        cache = {}
+    cache[key] = state
+    tmp = path + "." + str(os.getpid()) + ".tmp"
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        json.dump(cache, f)
+    getattr(os, "replace", os.rename)(tmp, path)
+
+
+def _workflow_progress(response):
+    # Return status, submission date and progress rate of a workflow from the Response of oph_resume with level=0
+    status = None
+    submission_date = "0000-00-00 00:00:00"
+    progress_rate = 0
+    workflow_status = response.text(title="Workflow Status")
+    if workflow_status is not None:
+        status = workflow_status.message
+    progress = response.grid(title="Workflow Progress Ratio")
+    if progress is not None and progress.rowvalues:
+        submission_date = progress.rowvalues[0][0]
+        progress_rate = float(progress.rowvalues[0][1])
+    return status, submission_date, progress_rate
+
+
+def _workflow_rows(response):
+    # Yield a (workflowid, name, status, progress) tuple for each row of the grids listing workflows in a Response (e.g. of
+    # oph_resume or oph_loggingbk), with None for the columns that are missing. Columns are recognized by their names
+    for obj in response.objects:
+        if obj.objclass != "grid" or not obj.rowkeys or not obj.rowvalues:
+            continue
+        keys = [str(key).upper().replace("_", " ").split() for key in obj.rowkeys]
+        ids = [i for i, key in enumerate(keys) if "ID" in key and "WORKFLOW" in key]
+        if not ids:
+            ids = [i for i, key in enumerate(keys) if "ID" in key and not set(key) & set(["MARKER", "SESSION", "PARENT", "JOB"])]
+        if not ids:
+            continue
+        columns = [ids[0]]
+        for word in ("NAME", "STATUS", "PROGRESS"):
+            found = [i for i, key in enumerate(keys) if word in key]
+            columns.append(found[0] if found else None)
+        for row in obj.rowvalues:
+            workflowid, name, status, progress = [row[i] if i is not None and i < len(row) else None for i in columns]
+            try:
+                workflowid = str(int(workflowid))
+                progress = float(progress) if progress is not None else None
+            except (TypeError, ValueError):
+                continue
+            yield workflowid, name, status, progress
+
+
+def _running_workflow(response, name):
+    # Return the id of the workflow with the given name, unique to a request (see _tag_query), if it is still pending or
+    # running in the list of workflows of a session returned by oph_resume
+    for workflowid, workflow_name, status, progress in _workflow_rows(response):
+        if workflow_name != name:
+            continue
+        if status is not None and "RUNNING" not in status.upper() and "PENDING" not in status.upper():
+            continue
+        return int(workflowid)
+    return None
+
+
+def _tag_query(query):
+    # Give the workflow of a request a name unique to it, made of its usual name and a random token, so that it can be told
+    # apart from the workflows of any other request (e.g. of another thread) when it has to be cancelled. Return the Query
+    # and the name, or None as name if the query is not valid
+    try:
+        if not isinstance(query, _ophsubmit.Query):
+            query = _ophsubmit.Query(query)
+        token = " #" + uuid.uuid4().hex
+        if query.workflow is None:
+            query.name = query.operator + token
+            return query, query.name
+        workflow = json.loads(query.workflow)
+        workflow["name"] = str(workflow.get("name", "")) + token
+        return _ophsubmit.Query(json.dumps(workflow)), workflow["name"]
+    except (ValueError, AttributeError):
+        return query, None
+
+
 class Client:
-    """Client(username='', password='', server='', port='', token='', read_env=False, api_mode=True, local_mode=False, project=None) -> obj
+    """Client(username='', password='', server='', port='', token='', read_env=False, api_mode=True, local_mode=False, project=None,
+              pool_size=4, pool_idle_timeout=60, compression=True, compress_threshold=None, retry_policy=None,
+              transport='https', timeout=None, callback_receiver=None, session_cache=None, response_cache=None) -> obj
 
     Attributes:
         username: Ophidia username
@@ -59,13 +189,32 @@ class Client:
         last_error: Last error value associated to response
         last_exec_time: Last execution time associated to response
         project: Project ID to be used for the resource manager (if required)
+        pool_size: Maximum number of idle keep-alive connections kept open towards the server (default is 4)
+        pool_idle_timeout: Number of seconds after which an idle connection is closed instead of being reused (default is 60)
+        compression: If True, ask the server for gzip or deflate compressed responses (default is True)
+        compress_threshold: Minimum size in bytes of the requests to be sent gzip compressed (default is None, requests are never compressed)
+        transfer_stats: TransferStats object counting the bytes exchanged with the server, with and without compression
+        retry_policy: RetryPolicy object used to send again read-only requests failed because of transient errors (default is None)
+        transport: 'https' (default), 'http' for plaintext HTTP on trusted networks, 'unix' to connect to the UNIX-domain socket
+            given as server, or any object carrying the requests with the post() method of Transport
+        timeout: Maximum number of seconds waited for the reply to each request, retries included (default is None, no limit)
+        callback_receiver: CallbackReceiver notified by the server of the end of the workflows submitted with exec_mode='async',
+            instead of polling their status (default is None)
+        session_cache: Path of a file where session, base path, cdd, cwd and cube are saved, so that clients created within
+            SESSION_CACHE_TTL seconds resume them without any request (default is None, no cache)
+        response_cache: ResponseCache object answering repeated requests of read-only operators (e.g. oph_cubeschema) without
+            contacting the server (default is None)
 
     Methods:
-        submit(query, display=False) -> self : Submit a query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;' to the
-            Ophidia server according to all login parameters of the Client and its state.
+        submit(query, display=False, exec_mode=None) -> Result or Job : Submit a query like 'operator=myoperator;param1=value1;' or
+            'myoperator param1=value1;' to the Ophidia server according to all login parameters of the Client and its state. With
+            exec_mode='async' return a Job future of the workflow.
         get_progress(id=None) -> dict : Get progress of a workflow, either specifying the id or from the last submitted one.
         deserialize_response() -> dict : Return the last_response JSON string attribute as a Python dictionary.
+        get_response() -> Response : Return the last response as a Response object, holding both the JSON string and the dictionary.
+        get_result() -> Result : Return the Result of the last request submitted by the current thread.
         get_base_path(display=False) -> self : Get base path for data from the Ophidia instance.
+        resume_state(display=False) -> self : Resume session, base path, cdd, cwd and cube with a single request.
         resume_session(display=False) -> self : Resume the last session the user was connected to.
         resume_cdd(display=False) -> self : Resume the last cdd (current data directory) the user was located into.
         resume_cwd(display=False) -> self : Resume the last cwd (current working directory) the user was located into.
@@ -74,11 +223,40 @@ class Client:
             of parameters that will replace $1, $2 etc. in the workflow.
             The workflow will be validated against the Ophidia Workflow JSON Schema.
         wisvalid(workflow) -> bool : Return True if the workflow (a JSON string or a Python dict) is valid against the Ophidia Workflow JSON Schema or False.
-        pretty_print(response, response_i) -> self : Prints the last_response JSON string attribute as a formatted response
+        pretty_print(response, response_i) -> self : Prints a response (by default the last_response JSON string attribute) as a formatted response
+        deadline(seconds, cancel=False) -> context manager : Bound the time spent by the requests submitted by the current thread
+            within a with block, optionally cancelling the workflow of a request interrupted by the deadline.
+        lazy(name=None) -> context manager : Defer the requests of operators producing cubes submitted by the current thread within
+            a with block, which are then computed with a single workflow when their cubes are needed.
+        workflow(name=None, exec_mode='sync') -> context manager : Record all the requests submitted by the current thread within a
+            with block and submit them with a single workflow at the end of the block.
     """
 
-    def __init__(self, username="", password="", server="", port="", token="", read_env=False, api_mode=True, local_mode=False, project=None):
-        """Client(username='', password='', server='', port='', token='', read_env=False, api_mode=True, local_mode=False, project=None) -> obj
+    def __init__(
+        self,
+        username="",
+        password="",
+        server="",
+        port="",
+        token="",
+        read_env=False,
+        api_mode=True,
+        local_mode=False,
+        project=None,
+        pool_size=_ophsubmit.DEFAULT_POOL_SIZE,
+        pool_idle_timeout=_ophsubmit.DEFAULT_POOL_IDLE_TIMEOUT,
+        compression=_ophsubmit.DEFAULT_COMPRESSION,
+        compress_threshold=_ophsubmit.DEFAULT_COMPRESS_THRESHOLD,
+        retry_policy=None,
+        transport="https",
+        timeout=None,
+        callback_receiver=None,
+        session_cache=None,
+        response_cache=None,
+    ):
+        """Client(username='', password='', server='', port='', token='', read_env=False, api_mode=True, local_mode=False, project=None,
+                  pool_size=4, pool_idle_timeout=60, compression=True, compress_threshold=None, retry_policy=None,
+                  transport='https', timeout=None, callback_receiver=None, session_cache=None, response_cache=None) -> obj
         :param api_mode: If True, use the class as an API and catch also framework-level errors
         :type api_mode: bool
         :param local_mode: If True, use only the local feature from the class
@@ -97,6 +275,26 @@ class Client:
         :type read_env: bool
         :param project: String with project ID to be used for job scheduling
         :type project: str
+        :param pool_size: Maximum number of idle keep-alive connections kept open towards the server
+        :type pool_size: int
+        :param pool_idle_timeout: Number of seconds after which an idle connection is closed instead of being reused
+        :type pool_idle_timeout: int
+        :param compression: If True, ask the server for gzip or deflate compressed responses
+        :type compression: bool
+        :param compress_threshold: Minimum size in bytes of the requests to be sent gzip compressed, None to never compress requests
+        :type compress_threshold: int
+        :param retry_policy: RetryPolicy object used to send again read-only requests failed because of transient errors
+        :type retry_policy: RetryPolicy
+        :param transport: 'https', 'http', 'unix' (server is then the path of the UNIX-domain socket) or any object with the post() method of Transport
+        :type transport: str or Transport
+        :param timeout: Maximum number of seconds waited for the reply to each request, retries included
+        :type timeout: float
+        :param callback_receiver: CallbackReceiver whose URL is given as callback_url of the workflows submitted with exec_mode='async'
+        :type callback_receiver: CallbackReceiver
+        :param session_cache: Path of a file where the state of the client is saved and resumed from
+        :type session_cache: str
+        :param response_cache: ResponseCache object answering repeated requests of read-only operators
+        :type response_cache: ResponseCache
         :returns: None
         :rtype: None
         :raises: RuntimeError
@@ -120,6 +318,22 @@ class Client:
         self.last_return_value = 0
         self.last_error = ""
         self.last_exec_time = 0.0
+        self._response = None
+        self.pool_size = pool_size
+        self.pool_idle_timeout = pool_idle_timeout
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.transfer_stats = _ophsubmit.TransferStats()
+        self.retry_policy = retry_policy
+        self.transport = transport
+        self.timeout = timeout
+        self.callback_receiver = callback_receiver
+        self.session_cache = session_cache
+        self.response_cache = response_cache
+        self._saved_state = None
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._monitor = None
 
         if local_mode is False:
             if read_env is False:
@@ -159,14 +373,11 @@ class Client:
 
             if not self.username or not self.password or not self.server or not self.port:
                 raise RuntimeError("one or more login parameters are None")
+            if not _ophsubmit.is_transport(self.transport) and self.transport not in _ophsubmit.TRANSPORTS:
+                raise RuntimeError("unknown transport " + str(self.transport))
             try:
-                if self.api_mode:
-                    self.resume_session()
-                    if self.session is not None and self.session:
-                        self.get_base_path()
-                        self.resume_cdd()
-                        self.resume_cwd()
-                        self.resume_cube()
+                if self.api_mode and not self._load_session():
+                    self.resume_state()
             except Exception as e:
                 print(get_linenumber(), "Something went wrong in resuming last session, cwd or cube:", e)
             else:
@@ -205,20 +416,181 @@ class Client:
         del self.last_request
         del self.last_response
         del self.last_response_status
+        del self._response
         del self.last_jobid
         del self.last_return_value
         del self.last_error
         del self.project
+        del self.pool_size
+        del self.pool_idle_timeout
+        del self.compression
+        del self.compress_threshold
+        del self.transfer_stats
+        del self.retry_policy
+        del self.transport
+        del self.timeout
+        del self.callback_receiver
+        del self.session_cache
+        del self.response_cache
+
+    def _get_pool(self):
+        if _ophsubmit.is_transport(self.transport):
+            return self.transport
+        return _ophsubmit.get_pool(self.username, self.password, self.server, self.port, self.pool_size, self.pool_idle_timeout, self.transport)
+
+    def _submit_request(self, query):
+        # Send the query to the server, according to the retry policy if any: in this case the query is parsed first, to know
+        # its operator, and it is not parsed again when retried
+        if self.retry_policy is not None:
+            try:
+                query = _ophsubmit.Query(query)
+            except ValueError:
+                pass
+
+        deadline, cancel = self._get_deadline()
+        if cancel:
+            query, name = _tag_query(query)
+
+        def request():
+            return self._send(query, deadline)
+
+        if self.retry_policy is None or not isinstance(query, _ophsubmit.Query):
+            result = request()
+        else:
+            result = self.retry_policy.execute(request, query.operator, deadline)
+        if cancel and isinstance(result[4], _ophsubmit.DeadlineExceeded):
+            self._cancel_expired(name)
+        return result
+
+    def _send(self, query, deadline=None):
+        # Send a single request through the transport of the client
+        return _ophsubmit.submit(self.username, self.password, self.server, self.port, query, pool=self._get_pool(), compression=self.compression, compress_threshold=self.compress_threshold, stats=self.transfer_stats, deadline=deadline)
+
+    def _get_deadline(self):
+        # The earliest between the deadline set by the current thread, if any, and the one given by the timeout of the client
+        deadline = getattr(self._local, "deadline", None)
+        cancel = getattr(self._local, "cancel", False)
+        if self.timeout is not None:
+            timeout = time.time() + self.timeout
+            if deadline is None or timeout < deadline:
+                deadline = timeout
+        return deadline, cancel
+
+    def _cancel_expired(self, name):
+        # The workflow of a request interrupted by its deadline may keep running on the server, but its id is returned only
+        # with the reply: it is looked for by the name unique to the request (see _tag_query) among the workflows of the
+        # session and cancelled. If it is not found (e.g. the request never reached the server), nothing is cancelled. Both
+        # requests are sent directly, so that the state of the client still refers to the interrupted request
+        try:
+            if name is None:
+                raise RuntimeError("the request is not valid")
+            if not self.session:
+                raise RuntimeError("the session of the request is not known")
+            deadline = time.time() + CANCEL_TIMEOUT
+            lookup = "oph_resume session=" + self.session + ";id=0;level=1;user=" + self.username + ";sessionid=" + self.session + ";"
+            result = self._send(lookup, deadline)
+            if result[3]:
+                raise RuntimeError(result[4])
+            workflowid = _running_workflow(_response.Response(result[0]), name)
+            if workflowid is None:
+                print(get_linenumber(), "The request was not cancelled: no running workflow named '" + name + "' was found")
+                return None
+            cancel = "oph_cancel id=" + str(workflowid) + ";sessionid=" + self.session + ";"
+            result = self._send(cancel, deadline)
+            if result[3]:
+                raise RuntimeError(result[4])
+            return workflowid
+        except Exception as e:
+            print(get_linenumber(), "Something went wrong in cancelling the request:", e)
+        return None
+
+    @contextmanager
+    def deadline(self, seconds, cancel=False):
+        """deadline(seconds, cancel=False) -> context manager : Bound the time spent by the requests submitted by the current thread
+               within the with block to the given number of seconds in total, covering connection, sending and reading of the
+               replies. A request still running when the deadline expires fails with a DeadlineExceeded error; if cancel is True,
+               each request is sent as a workflow with a name unique to it and, once interrupted, its workflow is found by that
+               name and cancelled with oph_cancel, unless it never reached the server. Nested deadlines cannot extend the outer
+               ones.
+        :param seconds: maximum number of seconds spent in the with block
+        :type seconds: float
+        :param cancel: option for cancelling the workflow of a request interrupted by the deadline (default is False)
+        :type cancel: bool
+        :returns: self
+        :rtype: Client
+        """
+
+        local = self._local
+        previous = getattr(local, "deadline", None), getattr(local, "cancel", False)
+        deadline = time.time() + seconds
+        if previous[0] is not None and previous[0] < deadline:
+            deadline = previous[0]
+        local.deadline, local.cancel = deadline, cancel or previous[1]
+        try:
+            yield self
+        finally:
+            local.deadline, local.cancel = previous
+
+    @contextmanager
+    def lazy(self, name=None):
+        """lazy(name=None) -> context manager : Record, instead of submitting, the requests of the operators producing cubes (see
+               graph.CUBE_OPERATORS) submitted by the current thread within the with block. Each of them returns at once a Result
+               whose cube is a placeholder PID (e.g. 'lazy://<token>/3'), which can be used by later requests. When a cube is
+               needed, i.e. on Graph.compute or when any other request refers to its placeholder (also after the with block), the
+               deferred requests are compiled into a single Ophidia workflow, submitted with one request.
+        :param name: name of the workflows (default is None)
+        :type name: str
+        :returns: graph of the deferred requests
+        :rtype: Graph
+        """
 
-    def submit(self, query, display=False):
-        """submit(query,display=False) -> self : Submit a query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;' to the Ophidia server
-               according to all login parameters of the Client and its state.
+        local = self._local
+        previous = getattr(local, "graph", None)
+        local.graph = _graph.Graph(self, name)
+        try:
+            yield local.graph
+        finally:
+            local.graph = previous
+
+    @contextmanager
+    def workflow(self, name=None, exec_mode="sync"):
+        """workflow(name=None, exec_mode='sync') -> context manager : Record, instead of submitting, all the requests submitted by
+               the current thread within the with block, as tasks of an Ophidia workflow: the dependencies among them are
+               inferred from the placeholder PIDs of the cubes they produce (see Client.lazy), while the requests not producing
+               cubes keep their order. At the end of the block, unless it raises an exception, the workflow is submitted with a
+               single request; in asynchronous mode, its Job is available as the job attribute of the yielded Graph.
+        :param name: name of the workflow (default is None)
+        :type name: str
+        :param exec_mode: 'sync' or 'async' (default is 'sync')
+        :type exec_mode: str
+        :returns: graph of the recorded requests
+        :rtype: Graph
+        :raises: RuntimeError, ValueError
+        """
+
+        local = self._local
+        previous = getattr(local, "graph", None)
+        local.graph = graph = _graph.Graph(self, name, exec_mode=exec_mode, record_all=True)
+        try:
+            yield graph
+        finally:
+            local.graph = previous
+        graph.submit()
+
+    def submit(self, query, display=False, exec_mode=None):
+        """submit(query,display=False,exec_mode=None) -> Result or Job : Submit a query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;' to the Ophidia server
+               according to all login parameters of the Client and its state. The outcome of the request is returned as an
+               immutable Result, which is not affected by requests submitted later, e.g. by other threads sharing the Client.
+               With exec_mode='async' a Job future is returned instead, resolved in background with the Result of the final
+               response of the workflow, as soon as the server notifies its end if the Client has a callback_receiver.
         :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;'
         :type query: str
         :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is False)
         :type display: bool
-        :returns: self or None
-        :rtype: Client or None
+        :param exec_mode: 'sync' or 'async', overriding the exec_mode of the client for this request (default is None)
+        :type exec_mode: str
+        :returns: result of the request, job of the workflow or None
+        :rtype: Result or Job or None
         :raises: RuntimeError
         """
 
@@ -228,6 +600,40 @@ class Client:
             raise RuntimeError("query is not present")
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
+        graph = getattr(self._local, "graph", None)
+        if graph is not None and graph.records(query):
+            return graph.record(query)
+        query = self._prepare_query(_graph.bind(query), exec_mode)
+        if exec_mode == "async" and self.callback_receiver is not None and "callback_url" not in query:
+            query += "callback_url=" + self.callback_receiver.url + ";"
+        try:
+            cached = self.response_cache.get(query) if self.response_cache is not None else None
+            result = self._handle_result(query, cached if cached is not None else self._submit_request(query))
+            if self.response_cache is not None and cached is None:
+                self.response_cache.update(query, result)
+            # The response is fully decoded only to be printed, so that large grids (e.g. of oph_explorecube) are left to the caller
+            if self.api_mode and display is True:
+                response = result.deserialize_response()
+                if response is not None:
+                    self.pretty_print(response, None)
+
+        except Exception as e:
+            print(get_linenumber(), "Something went wrong in submitting the request:", e)
+            return None
+        if exec_mode == "async":
+            return self._get_monitor().watch(result)
+        return result
+
+    def _get_monitor(self):
+        # The monitor of asynchronous jobs is created on first use, since it needs concurrent.futures
+        with self._lock:
+            if self._monitor is None:
+                import PyOphidia.jobs as _jobs
+
+                self._monitor = _jobs.JobMonitor(self, receiver=self.callback_receiver)
+            return self._monitor
+
+    def _prepare_query(self, query, exec_mode=None):
         # Check if the query contains only the oph operator
         r = query.split()
         if len(r) != 1:
@@ -236,89 +642,115 @@ class Client:
                 query += ";"
         else:
             query += " "
-        if self.session and "sessionid" not in query:
-            query += "sessionid=" + self.session + ";"
-        if self.cwd and "cwd" not in query:
-            query += "cwd=" + self.cwd + ";"
-        if self.cdd and "cdd" not in query:
-            query += "cdd=" + self.cdd + ";"
-        if self.cube and "cube" not in query:
-            query += "cube=" + self.cube + ";"
-        if self.host_partition and "host_partition" not in query:
-            query += "host_partition=" + self.host_partition + ";"
-        if self.exec_mode and "exec_mode" not in query:
-            query += "exec_mode=" + self.exec_mode + ";"
-        if self.ncores and "ncores" not in query:
-            query += "ncores=" + str(self.ncores) + ";"
-        if self.project and "project" not in query:
-            query += "project=" + str(self.project) + ";"
-        self.last_request = query
-        try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            if newsession is not None:
-                if len(newsession) == 0:
-                    self.session = None
-                else:
-                    if self.session != newsession:
-                        self.cwd = "/"
-                    self.session = newsession
-            response = self.deserialize_response()
-            if response is not None:
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Output Cube":
-                        self.cube = response_i["objcontent"][0]["message"]
-                        break
+        # The state is read in a single step, so that it is consistent even if other threads are updating it
+        with self._lock:
+            if self.session and "sessionid" not in query:
+                query += "sessionid=" + self.session + ";"
+            if self.cwd and "cwd" not in query:
+                query += "cwd=" + self.cwd + ";"
+            if self.cdd and "cdd" not in query:
+                query += "cdd=" + self.cdd + ";"
+            if self.cube and "cube" not in query:
+                query += "cube=" + self.cube + ";"
+            if self.host_partition and "host_partition" not in query:
+                query += "host_partition=" + self.host_partition + ";"
+            if (exec_mode or self.exec_mode) and "exec_mode" not in query:
+                query += "exec_mode=" + (exec_mode or self.exec_mode) + ";"
+            if self.ncores and "ncores" not in query:
+                query += "ncores=" + str(self.ncores) + ";"
+            if self.project and "project" not in query:
+                query += "project=" + str(self.project) + ";"
+        return query
+
+    def _build_result(self, query, result):
+        # Build the Result of a request from the tuple returned by ophsubmit.submit, along with the access token possibly
+        # returned by the server, without changing the client
+        response, jobid, newsession, return_value, error = result
+        indexed = _response.Response(response)
+        cube = status = exec_time = cwd = cdd = access_token = None
+        if not return_value and indexed.raw is not None:
+            output_cube = indexed.text(title="Output Cube")
+            if output_cube is not None:
+                cube = output_cube.content["message"]
+
+            status_obj = indexed.text(objkey="status")
+            if status_obj is not None:
+                if "message" in status_obj.content:
+                    status = status_obj.title + ": " + status_obj.content["message"]
                 else:
-                    index = 0
-                    if "extra" in response:
-                        for response_i in response["extra"]["keys"]:
-                            if response_i == "cube":
-                                self.cube = response["extra"]["values"][index]
-                                break
-                            index += 1
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objkey"] == "status":
-                        if "message" in response_i["objcontent"][0]:
-                            self.last_response_status = response_i["objcontent"][0]["title"] + ": " + response_i["objcontent"][0]["message"]
-                        else:
-                            self.last_response_status = response_i["objcontent"][0]["title"]
-                        break
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Current Working Directory":
-                        self.cwd = response_i["objcontent"][0]["message"]
-                        break
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Current Data Directory":
-                        self.cdd = response_i["objcontent"][0]["message"]
-                        break
-
-                index = 0
-                if "extra" in response:
-                    for response_i in response["extra"]["keys"]:
-                        if response_i == "execution_time":
-                            self.last_exec_time = float(response["extra"]["values"][index])
-                        elif response_i == "access_token":
-                            self.password = response["extra"]["values"][index]
-                        elif response_i == "cwd":
-                            self.cwd = response["extra"]["values"][index]
-                        elif response_i == "cdd":
-                            self.cdd = response["extra"]["values"][index]
-                        index += 1
-
-                if self.api_mode and display is True:
-                    self.pretty_print(response_i, response)
-
-        except Exception as e:
-            print(get_linenumber(), "Something went wrong in submitting the request:", e)
-            return None
-        return self
+                    status = status_obj.title
+
+            cwd_obj = indexed.text(title="Current Working Directory")
+            if cwd_obj is not None:
+                cwd = cwd_obj.content["message"]
+
+            cdd_obj = indexed.text(title="Current Data Directory")
+            if cdd_obj is not None:
+                cdd = cdd_obj.content["message"]
+
+            extra = indexed.extra
+            if extra is not None:
+                for index, response_i in enumerate(extra["keys"]):
+                    value = extra["values"][index]
+                    if response_i == "cube":
+                        if output_cube is None and cube is None:
+                            cube = value
+                    elif response_i == "execution_time":
+                        exec_time = float(value)
+                    elif response_i == "access_token":
+                        access_token = value
+                    elif response_i == "cwd":
+                        cwd = value
+                    elif response_i == "cdd":
+                        cdd = value
+        return _response.Result(query, response, jobid, newsession, return_value, error, status, exec_time, cube, cwd, cdd, indexed), access_token
+
+    def _handle_result(self, query, result, workflow=False, update=True):
+        # Check the outcome of a request and build its Result, unless it is already a Result (e.g. from the response cache). The
+        # last_* attributes and, if update is True, the client state are updated while holding the lock, so that other threads
+        # never see a mix of two requests
+        if isinstance(result, _response.Result):
+            access_token = None
+        else:
+            result, access_token = self._build_result(query, result)
+        newsession, cube, status, exec_time, cwd, cdd = result.session, result.cube, result.status, result.exec_time, result.cwd, result.cdd
+        with self._lock:
+            self.last_request = query
+            self.last_response, self.last_jobid, self.last_return_value, self.last_error = result.response, result.jobid, result.return_value, result.error
+            self._response = result.get_response()
+            self._local.result = result
+            if result.return_value:
+                raise RuntimeError(result.error)
+            if self.api_mode and result.error is not None:
+                raise RuntimeError(result.error)
+            if update:
+                if newsession is not None:
+                    if len(newsession) == 0:
+                        self.session = None
+                    else:
+                        if workflow or self.session != newsession:
+                            self.cwd = "/"
+                        self.session = newsession
+                if cube is not None:
+                    self.cube = cube
+                if status is not None:
+                    self.last_response_status = status
+                if exec_time is not None:
+                    self.last_exec_time = exec_time
+                if access_token is not None:
+                    self.password = access_token
+                if cwd is not None:
+                    self.cwd = cwd
+                if cdd is not None:
+                    self.cdd = cdd
+                self._save_session()
+        return result
+
+    def _request(self, query, session=None):
+        # Submit a synchronous request on behalf of the client itself (e.g. to monitor a workflow), leaving its state and the
+        # last_* attributes untouched, and return its Result
+        query = _internal_query(query, session)
+        return _check_internal(self._build_result(query, self._submit_request(query))[0])
 
     def get_progress(self, id=None):
         """get_progress(id=None) -> dict : Get progress of a workflow, either specifying the id or from the last submitted one
@@ -336,29 +768,18 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
 
+        # The request does not change the state of the client, so that it can be issued while other requests are in progress
         query = "oph_resume level=0;"
+        session = self.session
         if id:
             query += "id=" + str(id) + ";"
         elif self.last_jobid:
             jobid = self.last_jobid.split("?")[1].split("#")[0]
             query += "id=" + jobid + ";"
+            session = self.last_jobid.split("?")[0]
 
-        progress_rate = 0
-        submission_date = "0000-00-00 00:00:00"
         try:
-            if self.submit(query, display=False) is None:
-                raise RuntimeError()
-
-            if self.last_response is not None:
-                response = self.deserialize_response()
-
-            if response is not None:
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "grid" and response_i["objcontent"][0]["title"] == "Workflow Progress Ratio":
-                        submission_date = response_i["objcontent"][0]["rowvalues"][0][0]
-                        progress_rate = float(response_i["objcontent"][0]["rowvalues"][0][1])
-                        break
-
+            status, submission_date, progress_rate = _workflow_progress(self._request(query, session).get_response())
         except Exception as e:
             print(get_linenumber(), "Something went wrong:", e)
             return None
@@ -366,26 +787,52 @@ class Client:
         return {"submission date": submission_date, "progress rate": progress_rate}
 
     def deserialize_response(self):
-        """deserialize_response() -> dict : Return the last_response JSON string attribute as a Python dictionary
+        """deserialize_response() -> dict : Return the last_response JSON string attribute as a Python dictionary. The string is
+               decoded only once and the same dictionary is returned to all callers, so it should not be modified
         :returns: deserialized response or None
         :rtype: dict or None
         """
 
-        if self.last_response is None:
-            return None
-        return json.loads(self.last_response)
+        return self.get_response().parsed
+
+    def get_response(self):
+        """get_response() -> Response : Return the last response as a Response object, holding both the last_response JSON string
+               and the dictionary decoded from it the first time it is needed
+        :returns: last response
+        :rtype: Response
+        """
+
+        # A new object is assigned to last_response for each request, so the cached Response is valid as long as it wraps it
+        with self._lock:
+            if self._response is None or self._response.raw is not self.last_response:
+                self._response = _response.Response(self.last_response)
+            return self._response
+
+    def get_result(self):
+        """get_result() -> Result : Return the Result of the last request submitted by the current thread, e.g. by a Cube method
+        :returns: result of the last request of the thread or None
+        :rtype: Result or None
+        """
+
+        return getattr(self._local, "result", None)
 
-    def pretty_print(self, response, response_i):
-        """pretty_print(response, response_i) -> self : Prints the last_response JSON string attribute as a formatted response
-        :param response: Python dictionary derived from the last_response JSON string
+    def pretty_print(self, response, response_i=None):
+        """pretty_print(response, response_i) -> self : Prints a response as a formatted response, or the last_response JSON string
+               attribute if response is None
+        :param response: Python dictionary derived from a JSON response, e.g. by deserialize_response()
         :type response: dict
-        :param response_i: each of the responses included in the list given by the dictionary key response['response']
+        :param response_i: the response to be printed when given by callers passing (response_i, response), else not used
         :type response_i: dict
         :returns: self or None
         :rtype: Client or None
         """
 
-        response = self.deserialize_response()
+        # The response is given by the caller, since the last one of the client may belong to another request (e.g. of
+        # another thread or answered from a cache); older callers passed it as second argument
+        if isinstance(response_i, dict) and "response" in response_i:
+            response = response_i
+        elif not isinstance(response, dict) or "response" not in response:
+            response = self.deserialize_response()
         if sys.version_info[0] < 3 or (sys.version_info[0] == 3 and sys.version_info[1] < 3):
             from collections import namedtuple
 
@@ -415,7 +862,9 @@ class Client:
                         print(HORIZONTAL_CHAR * title_length)
                         num_columns = len(response_i["objcontent"][0]["rowkeys"])
                         columns = range(num_columns)
-                        num_rows = len(response_i["objcontent"][0]["rowvalues"])
+                        # The rows are changed while printing them, so a copy is used to leave the shared decoded response untouched
+                        grid_rows = [list(row) for row in response_i["objcontent"][0]["rowvalues"]]
+                        num_rows = len(grid_rows)
                         rows = range(num_rows)
                         max_column_width = []
                         for j in columns:
@@ -423,10 +872,10 @@ class Client:
                             max_column_width[j] = len(response_i["objcontent"][0]["rowkeys"][j])
                             for i in rows:
                                 # Replace tabs with 4 spaces
-                                response_i["objcontent"][0]["rowvalues"][i][j] = response_i["objcontent"][0]["rowvalues"][i][j].replace("\t", "    ")
-                                if len(response_i["objcontent"][0]["rowvalues"][i][j]) > max_column_width[j]:
+                                grid_rows[i][j] = grid_rows[i][j].replace("\t", "    ")
+                                if len(grid_rows[i][j]) > max_column_width[j]:
                                     # Compute max width based on line breaks
-                                    max_column_width[j] = max([len(s) for s in response_i["objcontent"][0]["rowvalues"][i][j].split("\n")])
+                                    max_column_width[j] = max([len(s) for s in grid_rows[i][j].split("\n")])
                         available_width = sz.columns
                         needed_width = sum(i for i in max_column_width) + (num_columns + 1) + (2 * num_columns)
                         while needed_width > available_width:
@@ -491,16 +940,16 @@ class Client:
                                 text_length[i].append(j)
                                 start[i].append(j)
                                 num_rows_per_column[i].append(j)
-                                text_length[i][j] = len(response_i["objcontent"][0]["rowvalues"][i][j])
+                                text_length[i][j] = len(grid_rows[i][j])
                                 start[i][j] = 0
                                 # Compute num of rows per column based on line breaks
-                                num_rows_per_column[i][j] = sum([(int)(len(s) / (max_column_width[j] + 1)) + 1 for s in response_i["objcontent"][0]["rowvalues"][i][j].split("\n")])
+                                num_rows_per_column[i][j] = sum([(int)(len(s) / (max_column_width[j] + 1)) + 1 for s in grid_rows[i][j].split("\n")])
                             maximum_rows[i] = num_rows_per_column[i][0]
                             for j in columns:
                                 if maximum_rows[i] < num_rows_per_column[i][j]:
                                     maximum_rows[i] = num_rows_per_column[i][j]
                         for i in rows:
-                            rowvalues = response_i["objcontent"][0]["rowvalues"][i]
+                            rowvalues = grid_rows[i]
                             for x in range(maximum_rows[i]):
                                 for j in columns:
                                     if start[i][j] < text_length[i][j]:
@@ -566,6 +1015,90 @@ class Client:
 
         return self
 
+    def _session_key(self):
+        return str(self.server) + ":" + str(self.port) + ":" + str(self.username)
+
+    def _load_session(self):
+        # Resume the state of the client from the session cache, if any, returning True on success
+        if not self.session_cache:
+            return False
+        state = _read_session_cache(self.session_cache, self._session_key())
+        if state is None:
+            return False
+        with self._lock:
+            for key, name in _SESSION_CONFIG:
+                if name in state:
+                    setattr(self, name, state[name])
+            self._saved_state = dict((name, getattr(self, name)) for key, name in _SESSION_CONFIG)
+        return True
+
+    def _save_session(self):
+        # Save the state of the client into the session cache, only when it changes
+        if not self.session_cache:
+            return
+        with self._lock:
+            state = dict((name, getattr(self, name)) for key, name in _SESSION_CONFIG)
+            if state == self._saved_state:
+                return
+            self._saved_state = state
+            state = dict(state, time=time.time())
+            try:
+                _write_session_cache(self.session_cache, self._session_key(), state)
+            except (IOError, OSError) as e:
+                print(get_linenumber(), "Something went wrong in saving the session cache:", e)
+
+    def resume_state(self, display=False):
+        """resume_state(display=False) -> self : Resume session, base path, cdd, cwd and cube with a single request, instead of calling
+               resume_session, get_base_path, resume_cdd, resume_cwd and resume_cube one after the other
+        :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is False)
+        :type display: bool
+        :returns: self or None
+        :rtype: Client or None
+        :raises: RuntimeError
+        """
+
+        if self.local_mode is True:
+            raise RuntimeError("this function cannot be run when local_mode is set")
+        if self.username is None or self.password is None or self.server is None or self.port is None:
+            raise RuntimeError("one or more login parameters are None")
+        query = "operator=oph_get_config;key=all;"
+        config = {}
+        try:
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
+            if response is not None:
+                for response_i in response["response"]:
+                    if response_i["objkey"] == "get_config":
+                        for row in response_i["objcontent"][0]["rowvalues"]:
+                            config[row[0]] = row[1]
+
+                    if self.api_mode and display is True:
+                        self.pretty_print(response, None)
+
+                    break
+        except Exception as e:
+            print(get_linenumber(), "Something went wrong in resuming last session, cwd or cube:", e)
+            return None
+
+        if "OPH_SESSION_ID" not in config:
+            # The configuration keys are requested one by one from servers not returning all of them at once
+            if self.resume_session() is None:
+                return None
+            if self.session is not None and self.session:
+                self.get_base_path()
+                self.resume_cdd()
+                self.resume_cwd()
+                self.resume_cube()
+            return self
+
+        with self._lock:
+            self.session = config["OPH_SESSION_ID"]
+            if self.session:
+                for key, name in _SESSION_CONFIG:
+                    if key in config:
+                        setattr(self, name, config[key])
+        self._save_session()
+        return self
+
     def get_base_path(self, display=False):
         """get_base_path(display=False) -> self : Get base path for data from the Ophidia instance.
         :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is False)
@@ -580,21 +1113,16 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
         query = "operator=oph_get_config;key=OPH_BASE_SRC_PATH;"
-        self.last_request = query
         try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            response = self.deserialize_response()
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
             if response is not None:
                 for response_i in response["response"]:
                     if response_i["objkey"] == "get_config":
                         self.base_src_path = response_i["objcontent"][0]["rowvalues"][0][1]
+                        self._save_session()
 
                     if self.api_mode and display is True:
-                        self.pretty_print(response_i, response)
+                        self.pretty_print(response, None)
 
                     break
         except Exception as e:
@@ -616,21 +1144,16 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
         query = "operator=oph_get_config;key=OPH_SESSION_ID;"
-        self.last_request = query
         try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            response = self.deserialize_response()
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
             if response is not None:
                 for response_i in response["response"]:
                     if response_i["objkey"] == "get_config":
                         self.session = response_i["objcontent"][0]["rowvalues"][0][1]
+                        self._save_session()
 
                     if self.api_mode and display is True:
-                        self.pretty_print(response_i, response)
+                        self.pretty_print(response, None)
 
                     break
         except Exception as e:
@@ -652,21 +1175,16 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
         query = "operator=oph_get_config;key=OPH_CDD;"
-        self.last_request = query
         try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            response = self.deserialize_response()
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
             if response is not None:
                 for response_i in response["response"]:
                     if response_i["objkey"] == "get_config":
                         self.cdd = response_i["objcontent"][0]["rowvalues"][0][1]
+                        self._save_session()
 
                     if self.api_mode and display is True:
-                        self.pretty_print(response_i, response)
+                        self.pretty_print(response, None)
 
                     break
         except Exception as e:
@@ -688,21 +1206,16 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
         query = "operator=oph_get_config;key=OPH_CWD;"
-        self.last_request = query
         try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            response = self.deserialize_response()
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
             if response is not None:
                 for response_i in response["response"]:
                     if response_i["objkey"] == "get_config":
                         self.cwd = response_i["objcontent"][0]["rowvalues"][0][1]
+                        self._save_session()
 
                     if self.api_mode and display is True:
-                        self.pretty_print(response_i, response)
+                        self.pretty_print(response, None)
 
                     break
         except Exception as e:
@@ -724,21 +1237,16 @@ class Client:
         if self.username is None or self.password is None or self.server is None or self.port is None:
             raise RuntimeError("one or more login parameters are None")
         query = "operator=oph_get_config;key=OPH_DATACUBE;"
-        self.last_request = query
         try:
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, query)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-            response = self.deserialize_response()
+            response = self._handle_result(query, self._submit_request(query), update=False).deserialize_response()
             if response is not None:
                 for response_i in response["response"]:
                     if response_i["objkey"] == "get_config":
                         self.cube = response_i["objcontent"][0]["rowvalues"][0][1]
+                        self._save_session()
 
                     if self.api_mode and display is True:
-                        self.pretty_print(response_i, response)
+                        self.pretty_print(response, None)
 
                     break
         except Exception as e:
@@ -800,20 +1308,7 @@ class Client:
                 print(get_linenumber(), "Something went wrong in parsing the string:", e)
                 return None
 
-        if self.session and "sessionid" not in request:
-            request["sessionid"] = self.session
-        if self.cwd and "cwd" not in request:
-            request["cwd"] = self.cwd
-        if self.cdd and "cdd" not in request:
-            request["cdd"] = self.cdd
-        if self.cube and "cube" not in request:
-            request["cube"] = self.cube
-        if self.exec_mode and "exec_mode" not in request:
-            request["exec_mode"] = self.exec_mode
-        if self.ncores and "ncores" not in request:
-            request["ncores"] = str(self.ncores)
-        if self.project and "project" not in request:
-            request["project"] = str(self.project)
+        self._complete_workflow(request)
         if "command" not in request:
             request["command"] = "wsubmit(" + workflow + ")" + params_list
         if "direct_output" not in request:
@@ -824,71 +1319,50 @@ class Client:
             if not err:
                 print("The workflow is not valid: " + str(err_msg))
                 return None
-            self.last_response, self.last_jobid, newsession, self.last_return_value, self.last_error = _ophsubmit.submit(self.username, self.password, self.server, self.port, self.last_request)
-            if self.last_return_value:
-                raise RuntimeError(self.last_error)
-            if self.api_mode and not self.last_return_value and self.last_error is not None:
-                raise RuntimeError(self.last_error)
-
-            if newsession is not None:
-                if len(newsession) == 0:
-                    self.session = None
-                else:
-                    self.session = newsession
-                    self.cwd = "/"
-            response = self.deserialize_response()
+            result = self._handle_result(self.last_request, self._submit_request(self.last_request), workflow=True)
+            if self.response_cache is not None:
+                self.response_cache.update(self.last_request, result)
+            response = result.deserialize_response()
             if response is not None:
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Output Cube":
-                        self.cube = response_i["objcontent"][0]["message"]
-                        break
-                else:
-                    index = 0
-                    if "extra" in response:
-                        for response_i in response["extra"]["keys"]:
-                            if response_i == "cube":
-                                self.cube = response["extra"]["values"][index]
-                                break
-                            index += 1
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objkey"] == "status":
-                        if "message" in response_i["objcontent"][0]:
-                            self.last_response_status = response_i["objcontent"][0]["title"] + ": " + response_i["objcontent"][0]["message"]
-                        else:
-                            self.last_response_status = response_i["objcontent"][0]["title"]
-                        break
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Current Working Directory":
-                        self.cwd = response_i["objcontent"][0]["message"]
-                        break
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and response_i["objcontent"][0]["title"] == "Current Data Directory":
-                        self.cdd = response_i["objcontent"][0]["message"]
-                        break
-
-                index = 0
-                if "extra" in response:
-                    for response_i in response["extra"]["keys"]:
-                        if response_i == "execution_time":
-                            self.last_exec_time = float(response["extra"]["values"][index])
-                        elif response_i == "access_token":
-                            self.password = response["extra"]["values"][index]
-                        elif response_i == "cwd":
-                            self.cwd = response["extra"]["values"][index]
-                        elif response_i == "cdd":
-                            self.cdd = response["extra"]["values"][index]
-                        index += 1
-
-                self.pretty_print(response_i, response)
+                self.pretty_print(response, None)
 
         except Exception as e:
             print(get_linenumber(), "Something went wrong in submitting the request:", e)
             return None
         return self
 
+    def _complete_workflow(self, request):
+        # Fill the global arguments missing from a workflow (a dict) with the state of the client
+        if self.session and "sessionid" not in request:
+            request["sessionid"] = self.session
+        if self.cwd and "cwd" not in request:
+            request["cwd"] = self.cwd
+        if self.cdd and "cdd" not in request:
+            request["cdd"] = self.cdd
+        if self.cube and "cube" not in request:
+            request["cube"] = self.cube
+        if self.exec_mode and "exec_mode" not in request:
+            request["exec_mode"] = self.exec_mode
+        if self.ncores and "ncores" not in request:
+            request["ncores"] = str(self.ncores)
+        if self.project and "project" not in request:
+            request["project"] = str(self.project)
+        return request
+
+    def _wrequest(self, request, update=True):
+        # Submit a workflow built by PyOphidia itself (a dict), completed with the state of the client, and return the Result of
+        # its final response without displaying it
+        if self.local_mode is True:
+            raise RuntimeError("this function cannot be run when local_mode is set")
+        query = _graph.bind(json.dumps(self._complete_workflow(request)))
+        err, err_msg = self.wisvalid(query)
+        if not err:
+            raise RuntimeError("The workflow is not valid: " + str(err_msg))
+        result = self._handle_result(query, self._submit_request(query), workflow=True, update=update)
+        if self.response_cache is not None:
+            self.response_cache.update(query, result)
+        return result
+
     def wisvalid(self, workflow):
         """wisvalid(workflow) -> bool : Return True if the workflow (a JSON string or a Python dict) is valid against the Ophidia Workflow JSON Schema or False.
         :param workflow: a JSON string or a Python dict containing an Ophidia workflow
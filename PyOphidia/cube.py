@@ -22,8 +22,18 @@ from __future__ import absolute_import
 import sys
 import os
 import base64
+import collections
+import itertools
+import json
 import struct
+try:
+    from math import gcd
+except ImportError:
+    from fractions import gcd
 import PyOphidia.client as _client
+import PyOphidia.graph as _graph
+import PyOphidia.response as _response
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from inspect import currentframe
 
 sys.path.append(os.path.dirname(__file__))
@@ -54,6 +64,52 @@ def _dependency_check(dependency):
         raise AttributeError("Dependency must be xarray, numpy or pandas")
 
 
+_INFO_ATTRIBUTES = (
+    "creation_date",
+    "measure",
+    "measure_type",
+    "level",
+    "nfragments",
+    "source_file",
+    "hostxcube",
+    "fragxdb",
+    "rowsxfrag",
+    "elementsxrow",
+    "compressed",
+    "size",
+    "nelements",
+    "dim_info",
+)
+
+
+def _info_workflow(pids, author):
+    # Build a workflow of the given author running OPH_CUBESIZE and then OPH_CUBESCHEMA on each cube, so that the final responses
+    # are the schemas
+    tasks = []
+    for index, pid in enumerate(pids):
+        tasks.append({"name": "Size " + str(index), "operator": "oph_cubesize", "arguments": ["cube=" + str(pid)]})
+        tasks.append({"name": "Schema " + str(index), "operator": "oph_cubeschema", "arguments": ["cube=" + str(pid)], "dependencies": [{"task": "Size " + str(index)}]})
+    return {"name": "PyOphidia info", "author": str(author), "abstract": "Size and schema of " + str(len(pids)) + " cube(s)", "exec_mode": "sync", "tasks": tasks}
+
+
+def _schema_groups(res):
+    # Split the objects of a Response including the schemas of several cubes into a dict of lists keyed by PID, each list
+    # starting with the cubeschema_cubeinfo grid of a cube
+    groups = {}
+    objects = None
+    for obj in res.objects:
+        if obj.objkey == "cubeschema_cubeinfo" and obj.rowvalues:
+            objects = groups.setdefault(obj.rowvalues[0][0], [])
+        if objects is not None:
+            objects.append(obj)
+    return groups
+
+
+def _response_string(objects):
+    # Build the JSON string of a response including the given objects only
+    return json.dumps({"response": [{"objclass": obj.objclass, "objkey": obj.objkey, "objcontent": obj.objcontent} for obj in objects]})
+
+
 def _time_dimension_finder(cube):
     for c in cube.dim_info:
         if c["hierarchy"].lower() == "oph_time" or c["name"].lower() == "time":
@@ -93,6 +149,111 @@ def _calculate_decoded_length(decoded_string, output_type):
     return num
 
 
+_NUMPY_TYPES = {"float": "f4", "double": "f8", "int": "i4", "long": "i8", "short": "i2", "char": "S1"}
+
+
+def _decode_column(rows, index, output_type, first=False):
+    # Decode at once the base64 cells of a column of a grid (e.g. the measure of explorecube_data). Rows kept as a span of the
+    # response are decoded straight into a NumPy array; otherwise the bytes of the cells are joined into a single writable buffer,
+    # viewed with no further copy as a NumPy array of the right type, or unpacked with a single struct call if NumPy is not
+    # installed. If first is True, only the first value of each row is returned
+    if output_type not in _NUMPY_TYPES:
+        raise RuntimeError("The value type is not valid")
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None and isinstance(rows, _response.Rows):
+        return rows.column(index, _NUMPY_TYPES[output_type], first)
+    buffer = bytearray().join([base64.b64decode(row[index] + "==") for row in rows])
+    if np is None:
+        values = struct.unpack(_get_unpack_format(_calculate_decoded_length(buffer, output_type), output_type), bytes(buffer))
+        if first and len(rows) and len(values) != len(rows):
+            return values[:: len(values) // len(rows)]
+        return values
+    values = np.frombuffer(buffer, dtype=_NUMPY_TYPES[output_type])
+    if first and len(values) != len(rows):
+        return values.reshape(len(rows), -1)[:, 0]
+    return values
+
+
+def _split_rows(values, nrows):
+    # Split the values decoded from a column into one list for each row (rows hold the same number of values)
+    if nrows == 0:
+        return []
+    if len(values) % nrows != 0:
+        raise RuntimeError("Rows hold different numbers of values")
+    if hasattr(values, "reshape"):
+        return values.reshape(nrows, -1).tolist()
+    length = len(values) // nrows
+    return [list(values[i : i + length]) for i in range(0, len(values), length)]
+
+
+def _plan_chunks(dim_info, dims, chunk_size):
+    # Split the index ranges of the given dimensions into blocks of at most chunk_size indexes (one value for each dimension),
+    # returning for each block the subset_filter of oph_explorecube with subset_type=index and the 0-based slice of each dimension
+    sizes = dict((dim["name"], int(dim["size"])) for dim in dim_info)
+    for name in dims:
+        if name not in sizes:
+            raise RuntimeError("Dimension " + name + " not found in the cube")
+    if len(chunk_size) != len(dims) or min(chunk_size) < 1:
+        raise RuntimeError("chunk_size must be a positive number of indexes for each dimension")
+    ranges = [[(start, min(start + step, sizes[name])) for start in range(0, sizes[name], step)] for name, step in zip(dims, chunk_size)]
+    chunks = []
+    for block in itertools.product(*ranges):
+        subset_filter = "|".join("%d:%d" % (start + 1, stop) for start, stop in block)
+        chunks.append((subset_filter, dict((name, slice(start, stop)) for name, (start, stop) in zip(dims, block))))
+    return chunks
+
+
+def _fragment_indexes(dim_info, rowsxfrag):
+    # Return the outermost explicit dimension and the smallest number of its indexes whose rows fill whole fragments (1 if
+    # rowsxfrag is not known), so that blocks spanning a multiple of them end on fragment boundaries
+    explicit = [dim for dim in dim_info if dim["array"] == "no"]
+    if not explicit:
+        return None, 1
+    inner = 1
+    for dim in explicit[1:]:
+        inner *= int(dim["size"])
+    try:
+        return explicit[0], int(rowsxfrag) // gcd(int(rowsxfrag), inner)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return explicit[0], 1
+
+
+def _plan_parallel(dim_info, rowsxfrag, nfragments, parallel):
+    # Split the outermost explicit dimension into at most parallel blocks (and no more than the fragments), for as many
+    # oph_explorecube requests, ending on fragment boundaries whenever possible. Return the name of the dimension and the blocks
+    # planned by _plan_chunks
+    dim, unit = _fragment_indexes(dim_info, rowsxfrag)
+    if dim is None:
+        return None, []
+    try:
+        parallel = min(parallel, int(nfragments))
+    except (TypeError, ValueError):
+        pass
+    units = -(-int(dim["size"]) // unit)
+    step = -(-units // max(parallel, 1)) * unit
+    return dim["name"], _plan_chunks(dim_info, [dim["name"]], [step])
+
+
+def _fetch_blocks(chunks, parallel, fetch):
+    # Run fetch(subset_filter) for each block planned by _plan_chunks on a pool of parallel threads, each one sending its
+    # requests over its own connection, and yield (position, selection, result) as the requests end
+    executor = ThreadPoolExecutor(max_workers=parallel)
+    futures = {}
+    try:
+        for position, (subset_filter, selection) in enumerate(chunks):
+            futures[executor.submit(fetch, subset_filter)] = position
+        for future in as_completed(futures):
+            position = futures[future]
+            yield position, chunks[position][1], future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
 class Cube:
     """Cube(container='-', cwd=None, exp_dim='auto', host_partition='auto', imp_dim='auto', measure=None, src_path=None,
             cdd=None, compressed='no', exp_concept_level='c', grid='-', imp_concept_level='c', import_metadata='no',
@@ -119,9 +280,11 @@ class Cube:
         size: size of the cube
         nelements: total number of elements
         dim_info: list of dict with information on each cube dimension
+        (the attributes other than pid are filled by info(), at the latest when one of them is read for the first time)
 
     Class Attributes:
         client: instance of class Client through which it is possible to submit all requests
+        metadata_cache: instance of class MetadataCache keeping the metadata of the cubes across calls and runs (default is None)
 
     Methods:
         aggregate(ncores=1, nthreads=1, exec_mode='sync', schedule=0, group_size='all', operation=None, missingvalue='-',
@@ -142,6 +305,8 @@ class Cube:
                   description='-', subset_dims='none', subset_filter='all', subset_type='index', time_filter='yes', ncores=1,
                   nthreads=1, exec_mode='sync', schedule=0, save='yes', display=False)
            -> Cube or None : wrapper of the operator OPH_CONCATNC2
+        compute()
+          -> self : compute the cube, if it is lazy, and set its actual PID
         cubeelements( schedule=0, algorithm='dim_product', ncores=1, exec_mode='sync', objkey_filter='all', save='yes', display=True)
           -> dict or None : wrapper of the operator OPH_CUBEELEMENTS
         cubeschema(objkey_filter='all', exec_mode='sync', level=0, dim=None, show_index='no', show_time='no', base64='no',
@@ -166,10 +331,13 @@ class Cube:
         exportnc2(misc='no', output_path='default', output_name='default', cdd=None, force='no', export_metadata='yes', schedule=0,
                   shuffle='no', deflate=0, exec_mode='sync', ncores=1, save='yes', display=False)
           -> None : wrapper of the operator OPH_EXPORTNC2
-        export_array(show_id='no', show_time='no', subset_dims=None, subset_filter=None, time_filter='no')
+        export_array(show_id='no', show_time='no', subset_dims=None, subset_filter=None, time_filter='no', subset_type='coord',
+                     parallel=1)
           -> dict or None : return data from an Ophidia datacube into a Python structure
         info(display=True)
-          -> None : call OPH_CUBESIZE and OPH_CUBESCHEMA to fill all Cube attributes
+          -> None : call OPH_CUBESIZE and OPH_CUBESCHEMA, in a single workflow, to fill all Cube attributes
+        info_many(cubes, display=False)
+          -> list : fill the attributes of several cubes with a single workflow
         intercube(cube2=None, cubes=None, operation='sub', missingvalue="-", container='-', exec_mode='sync', ncores=1,
                   description='-', save='yes', display=False)
           -> Cube or None : wrapper of the operator OPH_INTERCUBE
@@ -204,7 +372,9 @@ class Cube:
                time_filter='yes', offset=0, grid='-', ncores=1, nthreads=1, schedule=0, description='-', check_grid='no',
                save='yes', display=False)
           -> Cube or None : wrapper of the operator OPH_SUBSET
-        to_dataset()
+        iter_chunks(dims=None, chunk_size=1, output='numpy', prefetch=1)
+          -> generator : return data from an Ophidia datacube block by block, with a request for each block
+        to_dataset(subset_dims=None, subset_filter=None, subset_type='coord', parallel=1, lazy=False)
           -> xarray.core.dataset.Dataset or None : return data from an Ophidia datacube into a Xarray Dataset
         to_dataframe()
           -> pandas.core.frame.DataFrame or None : return data from an Ophidia datacube into a Pandas Dataframe
@@ -214,6 +384,12 @@ class Cube:
     Class Methods:
         setclient(username='', password='', server, port='11732', token='', read_env=False, api_mode=True, project=None)
           -> None : Instantiate the Client, common for all Cube objects, for submitting requests
+        deadline(seconds, cancel=False)
+          -> context manager : bound the time spent by the requests of the Cube methods called within a with block
+        lazy(name=None)
+          -> context manager : defer the Cube methods producing cubes called within a with block, computed with a single workflow
+        workflow(name=None, exec_mode='sync')
+          -> context manager : record the Cube methods called within a with block and submit them as a single workflow
         b2drop(action='put', auth_path='-', src_path=None, dst_path='-', cdd=None, exec_mode='sync', save='yes', display=False)
           -> None : wrapper of the operator OPH_B2DROP
         cancel(id=None, type='kill', objkey_filter='all', display=False)
@@ -337,6 +513,7 @@ class Cube:
     """
 
     client = None
+    metadata_cache = None
 
     @classmethod
     def setclient(
@@ -389,6 +566,64 @@ class Cube:
         finally:
             pass
 
+    @classmethod
+    def deadline(cls, seconds, cancel=False):
+        """deadline(seconds, cancel=False) -> context manager : bound the time spent by the requests of the Cube methods called by
+        the current thread within a with block, e.g. 'with Cube.deadline(60, cancel=True): mycube.reduce(operation="max")'.
+        A method still waiting for the server when the deadline expires raises RuntimeError
+
+        :param seconds: maximum number of seconds spent in the with block
+        :type seconds: float
+        :param cancel: option for cancelling the workflow of a request interrupted by the deadline (default is False)
+        :type cancel: bool
+        :returns: context manager
+        :rtype: contextmanager
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None:
+            raise RuntimeError("Cube.client is None")
+        return Cube.client.deadline(seconds, cancel)
+
+    @classmethod
+    def lazy(cls, name=None):
+        """lazy(name=None) -> context manager : defer the Cube methods producing cubes (e.g. subset, reduce, aggregate, apply,
+        intercube, permute) called by the current thread within a with block: they return at once lazy cubes, whose pid is a
+        placeholder like 'lazy://<token>/3'. The graph of the deferred requests is compiled into a single Ophidia workflow,
+        submitted with one request, on compute() or when the data or the attributes of a lazy cube are accessed
+
+        :param name: name of the workflows (default is None)
+        :type name: str
+        :returns: context manager yielding the Graph of the deferred requests
+        :rtype: contextmanager
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None:
+            raise RuntimeError("Cube.client is None")
+        return Cube.client.lazy(name)
+
+    @classmethod
+    def workflow(cls, name=None, exec_mode="sync"):
+        """workflow(name=None, exec_mode='sync') -> context manager : record the requests of the Cube methods called by the current
+        thread within a with block as tasks of an Ophidia workflow, submitted with a single request at the end of the block, e.g.
+        'with Cube.workflow(name="max") as wf: mycube.subset(subset_dims="time", subset_filter="1:12").reduce(operation="max")'.
+        The methods producing cubes return lazy cubes (see Cube.lazy), bound to their PIDs when the workflow is done; the
+        dependencies among the tasks are inferred from the cubes they use
+
+        :param name: name of the workflow (default is None)
+        :type name: str
+        :param exec_mode: sync|async
+        :type exec_mode: str
+        :returns: context manager yielding the Graph of the recorded requests
+        :rtype: contextmanager
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None:
+            raise RuntimeError("Cube.client is None")
+        return Cube.client.workflow(name, exec_mode)
+
     @classmethod
     def b2drop(
         cls,
@@ -558,11 +793,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -831,11 +1067,12 @@ class Cube:
             if objkey_filter is not None:
                 query += "objkey_filter=" + str(objkey_filter) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -869,11 +1106,12 @@ class Cube:
             if objkey_filter is not None:
                 query += "objkey_filter=" + str(objkey_filter) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -932,11 +1170,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1016,11 +1255,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1083,11 +1323,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1209,11 +1450,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1565,11 +1807,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1637,11 +1880,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1715,11 +1959,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1771,11 +2016,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -1879,11 +2125,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -2041,12 +2288,13 @@ class Cube:
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -2209,12 +2457,13 @@ class Cube:
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -2370,11 +2619,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -2603,12 +2853,13 @@ class Cube:
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -2843,12 +3094,13 @@ class Cube:
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3088,12 +3340,13 @@ class Cube:
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3150,11 +3403,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3254,11 +3508,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3331,11 +3586,12 @@ class Cube:
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3569,11 +3825,12 @@ if __name__ == '__main__':
             if save is not None:
                 query += "save=" + str(save) + ";"
 
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3657,12 +3914,13 @@ if __name__ == '__main__':
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3746,12 +4004,13 @@ if __name__ == '__main__':
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -3894,26 +4153,16 @@ if __name__ == '__main__':
         :raises: RuntimeError
         """
 
+        # The other attributes are filled by info(), at the latest on first access
         self.pid = None
-        self.creation_date = None
-        self.measure = None
-        self.measure_type = None
-        self.level = None
-        self.nfragments = None
-        self.source_file = None
-        self.hostxcube = None
-        self.fragxdb = None
-        self.rowsxfrag = None
-        self.elementsxrow = None
-        self.compressed = None
-        self.size = None
-        self.nelements = None
-        self.dim_info = None
 
         if pid is not None:
             if Cube.client is None:
                 raise RuntimeError("Cube.client is None")
             self.pid = pid
+            if _graph.is_lazy(pid):
+                # The graph of a lazy cube is kept as long as the cube
+                self._graph = _graph.graph_of(pid)
         else:
             if (Cube.client is not None) and (cwd is not None or measure is not None or src_path is not None):
                 if (cwd is None and Cube.client.cwd is None) or measure is None or src_path is None:
@@ -4003,12 +4252,15 @@ if __name__ == '__main__':
                         query += "save=" + str(save) + ";"
 
                     try:
-                        if Cube.client.submit(query, display) is None:
+                        result = Cube.client.submit(query, display)
+                        if result is None:
                             raise RuntimeError()
 
-                        if Cube.client.last_response is not None:
-                            if Cube.client.cube:
-                                self.pid = Cube.client.cube
+                        if result.response is not None:
+                            if result.cube:
+                                self.pid = result.cube
+                                if _graph.is_lazy(self.pid):
+                                    self._graph = _graph.graph_of(self.pid)
                     except Exception as e:
                         print(_get_linenumber(), "Something went wrong in instantiating the cube", e)
                         raise RuntimeError()
@@ -4017,24 +4269,42 @@ if __name__ == '__main__':
                             print("New cube is " + self.pid)
 
     def __del__(self):
-        del self.pid
-        del self.creation_date
-        del self.measure
-        del self.measure_type
-        del self.level
-        del self.nfragments
-        del self.source_file
-        del self.hostxcube
-        del self.fragxdb
-        del self.rowsxfrag
-        del self.elementsxrow
-        del self.compressed
-        del self.size
-        del self.nelements
-        del self.dim_info
+        for name in ("pid",) + _INFO_ATTRIBUTES:
+            self.__dict__.pop(name, None)
+
+    def __getattr__(self, name):
+        # Called only for the attributes not set yet: those filled by info() are retrieved with a single request on first access
+        if name not in _INFO_ATTRIBUTES:
+            raise AttributeError(name)
+        if self.__dict__.get("pid") is not None and Cube.client is not None and not self.__dict__.get("_info_loaded"):
+            self._info_loaded = True
+            try:
+                self.info(display=False)
+            except Exception as e:
+                print(_get_linenumber(), "Something went wrong in retrieving the info of the cube:", e)
+        return self.__dict__.get(name)
+
+    def compute(self):
+        """compute() -> self : compute the cube, if it is lazy (see Cube.lazy), with a single workflow including all the deferred
+        requests it depends on, and set its actual PID
+
+        :returns: self
+        :rtype: Cube
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None or self.pid is None:
+            raise RuntimeError("Cube.client is None or pid is None")
+        if _graph.is_lazy(self.pid):
+            try:
+                self.pid = _graph.bind(self.pid)
+            except Exception as e:
+                print(_get_linenumber(), "Something went wrong in computing the cube:", e)
+                raise RuntimeError()
+        return self
 
     def info(self, display=True):
-        """info(display=True) -> None : call OPH_CUBESIZE and OPH_CUBESCHEMA to fill all Cube attributes
+        """info(display=True) -> None : call OPH_CUBESIZE and OPH_CUBESCHEMA, in a single workflow, to fill all Cube attributes
 
         :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is True)
         :type display: bool
@@ -4045,44 +4315,124 @@ if __name__ == '__main__':
 
         if Cube.client is None or self.pid is None:
             raise RuntimeError("Cube.client is None or pid is None")
-        query = "oph_cubesize exec_mode=sync;cube=" + str(self.pid) + ";"
-        if Cube.client.submit(query, display=False) is None:
-            raise RuntimeError()
-        query = "oph_cubeschema exec_mode=sync;cube=" + str(self.pid) + ";"
-        if Cube.client.submit(query, display) is None:
-            raise RuntimeError()
-        res = Cube.client.deserialize_response()
-        if res is not None:
-            for res_i in res["response"]:
-                if res_i["objkey"] == "cubeschema_cubeinfo":
-                    self.pid = res_i["objcontent"][0]["rowvalues"][0][0]
-                    self.creation_date = res_i["objcontent"][0]["rowvalues"][0][1]
-                    self.measure = res_i["objcontent"][0]["rowvalues"][0][2]
-                    self.measure_type = res_i["objcontent"][0]["rowvalues"][0][3]
-                    self.level = res_i["objcontent"][0]["rowvalues"][0][4]
-                    self.nfragments = res_i["objcontent"][0]["rowvalues"][0][5]
-                    self.source_file = res_i["objcontent"][0]["rowvalues"][0][6]
-                elif res_i["objkey"] == "cubeschema_morecubeinfo":
-                    self.hostxcube = res_i["objcontent"][0]["rowvalues"][0][1]
-                    self.fragxdb = res_i["objcontent"][0]["rowvalues"][0][2]
-                    self.rowsxfrag = res_i["objcontent"][0]["rowvalues"][0][3]
-                    self.elementsxrow = res_i["objcontent"][0]["rowvalues"][0][4]
-                    self.compressed = res_i["objcontent"][0]["rowvalues"][0][5]
-                    self.size = res_i["objcontent"][0]["rowvalues"][0][6] + " " + res_i["objcontent"][0]["rowvalues"][0][7]
-                    self.nelements = res_i["objcontent"][0]["rowvalues"][0][8]
-                elif res_i["objkey"] == "cubeschema_diminfo":
-                    self.dim_info = list()
-                    for row_i in res_i["objcontent"][0]["rowvalues"]:
-                        element = dict()
-                        element["name"] = row_i[0]
-                        element["type"] = row_i[1]
-                        element["size"] = row_i[2]
-                        element["hierarchy"] = row_i[3]
-                        element["concept_level"] = row_i[4]
-                        element["array"] = row_i[5]
-                        element["level"] = row_i[6]
-                        element["lattice_name"] = row_i[7]
-                        self.dim_info.append(element)
+        self._info_loaded = True
+        self.compute()
+        # The metadata of a cube cannot change, so the responses may be taken from the metadata cache
+        schema = None
+        if Cube.metadata_cache is not None:
+            schema = Cube.metadata_cache.get(self.pid, "cubeschema")
+        if schema is None:
+            result = Cube.client._wrequest(_info_workflow([self.pid], Cube.client.username), update=False)
+            res = result.get_response()
+            if res.parsed is not None and res.find(objkey="cubeschema_cubeinfo") is None:
+                # The final response of the workflow is not the schema (e.g. older servers): ask for it directly
+                query = "oph_cubeschema exec_mode=sync;cube=" + str(self.pid) + ";"
+                result = Cube.client.submit(query, display=False)
+                if result is None:
+                    raise RuntimeError()
+                res = result.get_response()
+            if Cube.metadata_cache is not None and res.find(objkey="cubeschema_cubeinfo") is not None:
+                Cube.metadata_cache.put(self.pid, "cubeschema", result.response)
+        else:
+            res = _response.Response(schema)
+        if res.parsed is not None:
+            if Cube.client.api_mode and display is True:
+                Cube.client.pretty_print(res.parsed, None)
+            self._set_info(res.objects)
+
+    @classmethod
+    def info_many(cls, cubes, display=False):
+        """info_many(cubes, display=False) -> list : fill the attributes of several cubes with a single workflow running OPH_CUBESIZE
+               and OPH_CUBESCHEMA on all of them (cubes whose schema is missing from the final response are filled one by one)
+
+        :param cubes: cubes to be filled
+        :type cubes: list of Cube
+        :param display: option for displaying the response in a "pretty way" using the pretty_print function (default is False)
+        :type display: bool
+        :returns: the cubes
+        :rtype: list
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None:
+            raise RuntimeError("Cube.client is None")
+        cubes = list(cubes)
+        if any(cube.pid is None for cube in cubes):
+            raise RuntimeError("pid is None")
+        lazy = [cube for cube in cubes if _graph.is_lazy(cube.pid)]
+        if lazy:
+            # Lazy cubes are computed first, with a single workflow for each graph
+            for cube, pid in zip(lazy, _graph.bind("|".join(cube.pid for cube in lazy)).split("|")):
+                cube.pid = pid
+        pending = []
+        for cube in cubes:
+            cube._info_loaded = True
+            schema = None
+            if Cube.metadata_cache is not None:
+                schema = Cube.metadata_cache.get(cube.pid, "cubeschema")
+            if schema is not None:
+                cube._set_info(_response.Response(schema).objects)
+            else:
+                pending.append(cube)
+        pids = []
+        for cube in pending:
+            if cube.pid not in pids:
+                pids.append(cube.pid)
+        if not pids:
+            return cubes
+        res = Cube.client._wrequest(_info_workflow(pids, Cube.client.username), update=False).get_response()
+        if res.parsed is not None and Cube.client.api_mode and display is True:
+            Cube.client.pretty_print(res.parsed, None)
+        groups = _schema_groups(res)
+        for cube in pending:
+            objects = groups.get(cube.pid)
+            if objects is None:
+                cube.info(display=False)
+                continue
+            cube._set_info(objects)
+            if Cube.metadata_cache is not None:
+                Cube.metadata_cache.put(cube.pid, "cubeschema", _response_string(objects))
+        return cubes
+
+    def _set_info(self, objects):
+        # Fill the attributes from the objects of a response of OPH_CUBESCHEMA, taking the first object of each kind
+        found = dict()
+        for obj in objects:
+            found.setdefault(obj.objkey, obj)
+        res_i = found.get("cubeschema_cubeinfo")
+        if res_i is not None:
+            row = res_i.rowvalues[0]
+            self.pid = row[0]
+            self.creation_date = row[1]
+            self.measure = row[2]
+            self.measure_type = row[3]
+            self.level = row[4]
+            self.nfragments = row[5]
+            self.source_file = row[6]
+        res_i = found.get("cubeschema_morecubeinfo")
+        if res_i is not None:
+            row = res_i.rowvalues[0]
+            self.hostxcube = row[1]
+            self.fragxdb = row[2]
+            self.rowsxfrag = row[3]
+            self.elementsxrow = row[4]
+            self.compressed = row[5]
+            self.size = row[6] + " " + row[7]
+            self.nelements = row[8]
+        res_i = found.get("cubeschema_diminfo")
+        if res_i is not None:
+            self.dim_info = list()
+            for row_i in res_i.rowvalues:
+                element = dict()
+                element["name"] = row_i[0]
+                element["type"] = row_i[1]
+                element["size"] = row_i[2]
+                element["hierarchy"] = row_i[3]
+                element["concept_level"] = row_i[4]
+                element["array"] = row_i[5]
+                element["level"] = row_i[6]
+                element["lattice_name"] = row_i[7]
+                self.dim_info.append(element)
 
     def exportnc(
         self,
@@ -4346,12 +4696,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4453,12 +4804,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4564,12 +4916,13 @@ if __name__ == '__main__':
         internal_query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(internal_query, display) is None:
+            result = Cube.client.submit(internal_query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4684,12 +5037,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4809,12 +5163,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4862,11 +5217,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4922,6 +5278,8 @@ if __name__ == '__main__':
         try:
             if Cube.client.submit(query, display) is None:
                 raise RuntimeError()
+            if Cube.metadata_cache is not None:
+                Cube.metadata_cache.drop(self.pid)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -4984,12 +5342,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5054,12 +5413,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5181,11 +5541,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5255,11 +5616,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5380,11 +5742,15 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
+            # Dimensions added or cleared change the schema of the cube
+            if Cube.metadata_cache is not None and action not in (None, "read"):
+                Cube.metadata_cache.drop(self.pid)
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5447,11 +5813,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5509,11 +5876,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5599,12 +5967,13 @@ if __name__ == '__main__':
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5688,12 +6057,13 @@ if __name__ == '__main__':
             query += "save=" + str(save) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5758,12 +6128,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5857,11 +6228,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None and display is False:
-                response = Cube.client.deserialize_response()["response"]
+            if result.response is not None and display is False:
+                response = result.deserialize_response()["response"]
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -5931,12 +6303,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6032,12 +6405,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6143,12 +6517,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6218,12 +6593,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6293,12 +6669,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6403,12 +6780,13 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display) is None:
+            result = Cube.client.submit(query, display)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                if Cube.client.cube:
-                    newcube = Cube(pid=Cube.client.cube)
+            if result.response is not None:
+                if result.cube:
+                    newcube = Cube(pid=result.cube)
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
             raise RuntimeError()
@@ -6458,13 +6836,11 @@ if __name__ == '__main__':
             )
 
             file_path = ""
-            if Cube.client.last_response is not None:
-                response = Cube.client.deserialize_response()
-
-                for response_i in response["response"]:
-                    if response_i["objclass"] == "text" and "title" in response_i["objcontent"][0] and response_i["objcontent"][0]["title"] == "Output File":
-                        file_path = response_i["objcontent"][0]["message"]
-                        break
+            result = Cube.client.get_result()
+            if result is not None and result.response is not None:
+                output_file = result.get_response().text(title="Output File")
+                if output_file is not None:
+                    file_path = output_file.message
 
             if not file_path:
                 raise RuntimeError("Unable to export NetCDF file")
@@ -6491,8 +6867,10 @@ if __name__ == '__main__':
         subset_dims=None,
         subset_filter=None,
         time_filter="no",
+        subset_type="coord",
+        parallel=1,
     ):
-        """export_array(show_id='no', show_time='no', subset_dims=None, subset_filter=None, time_filter='no') -> dict or None : return data from an Ophidia datacube into a Python structure
+        """export_array(show_id='no', show_time='no', subset_dims=None, subset_filter=None, time_filter='no', subset_type='coord', parallel=1) -> dict or None : return data from an Ophidia datacube into a Python structure
 
         :param show_id: yes|no
         :type show_id: str
@@ -6504,6 +6882,10 @@ if __name__ == '__main__':
         :type subset_filter: str
         :param time_filter: yes|no
         :type time_filter: str
+        :param subset_type: index|coord
+        :type subset_type: str
+        :param parallel: number of concurrent requests, each one for a block of the outermost explicit dimension aligned to the fragments, used when no subset is given
+        :type parallel: int
         :returns: data_values or None
         :rtype: dict or None
         :raises: RuntimeError
@@ -6513,7 +6895,13 @@ if __name__ == '__main__':
             raise RuntimeError("Cube.client or pid is None")
         response = None
 
-        query = "oph_explorecube ncore=1;base64=yes;level=2;show_index=yes;subset_type=coord;limit_filter=0;save=no;"
+        if parallel > 1 and subset_dims is None and subset_filter is None:
+            self.compute()
+            name, chunks = _plan_parallel(self.dim_info, self.rowsxfrag, self.nfragments, parallel)
+            if len(chunks) > 1:
+                return self._export_array_blocks(name, chunks, parallel, show_id, show_time, time_filter)
+
+        query = "oph_explorecube ncore=1;base64=yes;level=2;show_index=yes;subset_type=" + str(subset_type) + ";limit_filter=0;save=no;"
 
         if time_filter is not None:
             query += "time_filter=" + str(time_filter) + ";"
@@ -6529,11 +6917,12 @@ if __name__ == '__main__':
         query += "cube=" + str(self.pid) + ";"
 
         try:
-            if Cube.client.submit(query, display=False) is None:
+            result = Cube.client.submit(query, display=False)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                response = Cube.client.deserialize_response()
+            if result.response is not None:
+                response = result.get_response()
 
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
@@ -6546,46 +6935,40 @@ if __name__ == '__main__':
         adimCube = True
         try:
             dimensions = []
-            for response_i in response["response"]:
-                if response_i["objkey"] == "explorecube_dimvalues":
-                    data_values["dimension"] = {}
-                    adimCube = False
+            response_i = response.find(objkey="explorecube_dimvalues")
+            if response_i is not None:
+                data_values["dimension"] = {}
+                adimCube = False
 
-                    for response_j in response_i["objcontent"]:
-                        if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
-                            curr_dim = {}
-                            curr_dim["name"] = response_j["title"]
+                for response_j in response_i.objcontent:
+                    if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
+                        curr_dim = {}
+                        curr_dim["name"] = response_j["title"]
 
-                            # Append actual values
-                            dim_array = []
+                        # Append actual values
+                        dim_array = []
 
-                            # Special case for time
-                            if show_time == "yes" and response_j["title"] == "time":
-                                for val in response_j["rowvalues"]:
-                                    dims = [s.strip() for s in val[1].split(",")]
-                                    for v in dims:
-                                        dim_array.append(v)
-                            else:
-                                for val in response_j["rowvalues"]:
-                                    decoded_bin = base64.b64decode(val[1] + "==")
-                                    length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][1])
-                                    format = _get_unpack_format(length, response_j["rowfieldtypes"][1])
-                                    dims = struct.unpack(format, decoded_bin)
-                                    for v in dims:
-                                        dim_array.append(v)
+                        # Special case for time
+                        if show_time == "yes" and response_j["title"] == "time":
+                            for val in response_j["rowvalues"]:
+                                dims = [s.strip() for s in val[1].split(",")]
+                                for v in dims:
+                                    dim_array.append(v)
+                        else:
+                            dims = _decode_column(response_j["rowvalues"], 1, response_j["rowfieldtypes"][1])
+                            dim_array = dims.tolist() if hasattr(dims, "tolist") else list(dims)
 
-                            curr_dim["values"] = dim_array
-                            dimensions.append(curr_dim)
+                        curr_dim["values"] = dim_array
+                        dimensions.append(curr_dim)
 
-                        else:
-                            raise RuntimeError("Unable to get dimension name or values in response")
+                    else:
+                        raise RuntimeError("Unable to get dimension name or values in response")
 
-                    dim_num = len(dimensions)
-                    if dim_num == 0:
-                        raise RuntimeError("No dimension found")
+                dim_num = len(dimensions)
+                if dim_num == 0:
+                    raise RuntimeError("No dimension found")
 
-                    data_values["dimension"] = dimensions
-                    break
+                data_values["dimension"] = dimensions
 
         except Exception as e:
             print(_get_linenumber(), "Unable to get dimensions from response:", e)
@@ -6594,51 +6977,37 @@ if __name__ == '__main__':
         # Read values
         try:
             measures = []
-            for response_i in response["response"]:
-                if response_i["objkey"] == "explorecube_data":
-
-                    for response_j in response_i["objcontent"]:
-                        if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
-                            curr_mes = {}
-                            measure_name = ""
-                            measure_index = 0
-
-                            if not adimCube:
-                                # Check that implicit dimension is just one
-                                if dim_num - (len(response_j["rowkeys"]) - 1) / 2.0 > 1:
-                                    raise RuntimeError("More than one implicit dimension")
-
-                            for i, t in enumerate(response_j["rowkeys"]):
-                                if response_j["title"] == t:
-                                    measure_name = t
-                                    measure_index = i
-                                    break
-
-                            if measure_index == 0:
-                                raise RuntimeError("Unable to get measure name in response")
-
-                            curr_mes["name"] = measure_name
-
-                            # Append actual values
-                            measure_value = []
-                            for val in response_j["rowvalues"]:
-                                decoded_bin = base64.b64decode(val[measure_index] + "==")
-                                length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][measure_index])
-                                format = _get_unpack_format(length, response_j["rowfieldtypes"][measure_index])
-                                measure = struct.unpack(format, decoded_bin)
-                                curr_line = []
-                                for v in measure:
-                                    curr_line.append(v)
+            response_i = response.find(objkey="explorecube_data")
+            if response_i is not None:
+                for response_j in response_i.objcontent:
+                    if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
+                        curr_mes = {}
+                        measure_name = ""
+                        measure_index = 0
+
+                        if not adimCube:
+                            # Check that implicit dimension is just one
+                            if dim_num - (len(response_j["rowkeys"]) - 1) / 2.0 > 1:
+                                raise RuntimeError("More than one implicit dimension")
+
+                        for i, t in enumerate(response_j["rowkeys"]):
+                            if response_j["title"] == t:
+                                measure_name = t
+                                measure_index = i
+                                break
 
-                                measure_value.append(curr_line)
+                        if measure_index == 0:
+                            raise RuntimeError("Unable to get measure name in response")
 
-                            curr_mes["values"] = measure_value
-                            measures.append(curr_mes)
+                        curr_mes["name"] = measure_name
 
-                        else:
-                            raise RuntimeError("Unable to get measure values in response")
+                        # Append actual values, one list for each row
+                        measure = _decode_column(response_j["rowvalues"], measure_index, response_j["rowfieldtypes"][measure_index])
+                        curr_mes["values"] = _split_rows(measure, len(response_j["rowvalues"]))
+                        measures.append(curr_mes)
 
-                        break
+                    else:
+                        raise RuntimeError("Unable to get measure values in response")
 
                     break
 
@@ -6654,9 +7023,39 @@ if __name__ == '__main__':
         else:
             return data_values
 
-    def to_dataset(self):
-        """to_dataset() -> xarray.core.dataset.Dataset or None : return data from an Ophidia datacube into a Xarray dataset
+    def _export_array_blocks(self, name, chunks, parallel, show_id, show_time, time_filter):
+        # Run export_array for the blocks of the given dimension on a pool of threads and join their dimension values and rows, in
+        # the order of the blocks
+        def _fetch(subset_filter):
+            data = self.export_array(show_id=show_id, show_time=show_time, subset_dims=name, subset_filter=subset_filter, time_filter=time_filter, subset_type="index")
+            if data is None:
+                raise RuntimeError("Unable to export the block " + subset_filter)
+            return data
+
+        blocks = [None] * len(chunks)
+        for position, selection, data in _fetch_blocks(chunks, parallel, _fetch):
+            blocks[position] = data
+        data_values = blocks[0]
+        for i, dimension in enumerate(data_values.get("dimension", [])):
+            if dimension["name"] == name:
+                dimension["values"] = list(itertools.chain.from_iterable(block["dimension"][i]["values"] for block in blocks))
+        for i, measure in enumerate(data_values["measure"]):
+            measure["values"] = list(itertools.chain.from_iterable(block["measure"][i]["values"] for block in blocks))
+        return data_values
+
+    def to_dataset(self, subset_dims=None, subset_filter=None, subset_type="coord", parallel=1, lazy=False):
+        """to_dataset(subset_dims=None, subset_filter=None, subset_type='coord', parallel=1, lazy=False) -> xarray.core.dataset.Dataset or None : return data from an Ophidia datacube into a Xarray dataset
 
+        :param subset_dims: pipe (|) separated list of dimensions on which to apply the subsetting
+        :type subset_dims: str
+        :param subset_filter: pipe (|) separated list of filters, one per dimension, composed of comma-separated microfilters (e.g. 1,5,10:2:50)
+        :type subset_filter: str
+        :param subset_type: index|coord
+        :type subset_type: str
+        :param parallel: number of concurrent requests, each one for a block of the outermost explicit dimension aligned to the fragments, used when no subset is given
+        :type parallel: int
+        :param lazy: if True, the measure is retrieved only when (and as far as) it is indexed or loaded, with an oph_explorecube request for each selected hyperslab (see PyOphidia.backend), and the other arguments are ignored
+        :type lazy: bool
         :returns: a 'xarray.core.dataset.Dataset' object or None
         :rtype: <class 'xarray.core.dataset.Dataset'>
         :raises: RuntimeError
@@ -6666,30 +7065,18 @@ if __name__ == '__main__':
             raise RuntimeError("Cube.client or pid is None")
         response = None
 
-        def _append_with_format(var, frmt):
-            """_append_with_format(var, frmt) ->
-            numpy.float32|numpy.float64|numpy.int32|numpy.int64 converts a variable
-                to the appropriate format according to pyophidia's type
-            :param var: the variable to convert
-            :type var: int|float|str
-            :param frmt: a string representing pyophidias format
-            :type frmt: str
-            :rtype: <class 'numpy.float32'>|<class 'numpy.float64'>|<class
-            'numpy.int32'>|<class 'numpy.int64'>
-            """
-            _dependency_check("numpy")
-            import numpy as np
-
-            if frmt == "float":
-                return np.float32(var)
-            elif frmt == "double":
-                return np.float64(var)
-            elif frmt == "int":
-                return np.int32(var)
-            elif frmt == "long":
-                return np.int64(var)
-            else:
-                return var
+        if lazy:
+            _dependency_check(dependency="xarray")
+            from PyOphidia import backend
+
+            return backend.open_cube(self)
+
+        if parallel > 1 and subset_dims is None and subset_filter is None:
+            _dependency_check(dependency="xarray")
+            self.compute()
+            name, chunks = _plan_parallel(self.dim_info, self.rowsxfrag, self.nfragments, parallel)
+            if len(chunks) > 1:
+                return self._to_dataset_blocks(name, chunks, parallel)
 
         def _scientific_notation(num):
             """_scientific_notation(v) -> str : converts a large number to
@@ -6717,39 +7104,30 @@ if __name__ == '__main__':
             :param ds: the xarray dataset object
             :type ds:  <class 'xarray.core.dataset.Dataset'>
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: xarray.core.dataset.Dataset,int|None
             :rtype: <class 'xarray.core.dataset.Dataset'>,<class 'int'>|None
             """
             lengths = []
             try:
-                for response_i in response["response"]:
-                    if "objcontent" in response_i.keys() and "objkey" in response_i.keys():
-                        if response_i["objkey"] == "explorecube_dimvalues":
-                            for response_j in response_i["objcontent"]:
-                                if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
-                                    if response_j["title"] == _time_dimension_finder(cube):
-                                        temp_array = []
-                                        lengths.append(len(response_j["rowvalues"]))
-                                        for val in response_j["rowvalues"]:
-                                            dims = [s.strip() for s in val[1].split(",")]
-                                            temp_array.append(dims[0])
-                                        ds[response_j["title"]] = temp_array
-                                        ds[response_j["title"]].attrs = _convert_to_metadict(meta_info, filter=response_j["title"])
-                                    else:
-                                        lengths.append(len(response_j["rowvalues"]))
-                                        temp_array = []
-                                        for val in response_j["rowvalues"]:
-                                            decoded_bin = base64.b64decode(val[1] + "==")
-                                            length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][1])
-                                            format = _get_unpack_format(length, response_j["rowfieldtypes"][1])
-                                            dims = struct.unpack(format, decoded_bin)
-                                            temp_array.append(_append_with_format(dims[0], response_j["rowfieldtypes"][1]))
-                                        ds[response_j["title"]] = list(temp_array)
-                                        ds[response_j["title"]].attrs = _convert_to_metadict(meta_info, filter=response_j["title"])
-                                else:
-                                    raise RuntimeError("Unable to get dimension name or values in " "response")
-                            break
+                response_i = response.find(objkey="explorecube_dimvalues")
+                if response_i is not None:
+                    for response_j in response_i.objcontent:
+                        if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
+                            if response_j["title"] == _time_dimension_finder(cube):
+                                temp_array = []
+                                lengths.append(len(response_j["rowvalues"]))
+                                for val in response_j["rowvalues"]:
+                                    dims = [s.strip() for s in val[1].split(",")]
+                                    temp_array.append(dims[0])
+                                ds[response_j["title"]] = temp_array
+                                ds[response_j["title"]].attrs = _convert_to_metadict(meta_info, filter=response_j["title"])
+                            else:
+                                lengths.append(len(response_j["rowvalues"]))
+                                ds[response_j["title"]] = _decode_column(response_j["rowvalues"], 1, response_j["rowfieldtypes"][1], first=True)
+                                ds[response_j["title"]].attrs = _convert_to_metadict(meta_info, filter=response_j["title"])
+                        else:
+                            raise RuntimeError("Unable to get dimension name or values in " "response")
             except Exception as e:
                 print(_get_linenumber(), "Unable to get dimensions from response:", e)
                 return None
@@ -6765,65 +7143,39 @@ if __name__ == '__main__':
             :param ds: the xarray dataset object
             :type ds:  <class 'xarray.core.dataset.Dataset'>
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :param lengths: list of the coordinate lengths
             :type lengths:  <class 'list'>
             :returns: xarray.core.dataset.Dataset|None
             :rtype: <class 'xarray.core.dataset.Dataset'>|None
             """
             try:
-                for response_i in response["response"]:
-                    if "objcontent" in response_i.keys() and "objkey" in response_i.keys():
-                        if response_i["objkey"] == "explorecube_data":
-                            for response_j in response_i["objcontent"]:
-                                if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
-                                    measure_index = 0
-
-                                    for i, t in enumerate(response_j["rowkeys"]):
-                                        if response_j["title"] == t:
-                                            measure_index = i
-                                            break
-                                    if measure_index == 0:
-                                        raise RuntimeError("Unable to get measure name in response")
-                                    values = []
-                                    for val in response_j["rowvalues"]:
-                                        decoded_bin = base64.b64decode(val[measure_index] + "==")
-                                        length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][measure_index])
-                                        format = _get_unpack_format(length, response_j["rowfieldtypes"][measure_index])
-                                        data_format = response_j["rowfieldtypes"][measure_index]
-                                        measure = struct.unpack(format, decoded_bin)
-                                        if (type(measure)) is (tuple or list) and len(measure) == 1:
-                                            values.append(_append_with_format(measure[0], data_format))
-                                        else:
-                                            for v in measure:
-                                                values.append(_append_with_format(v, data_format))
-                                    previous_array = []
-                                    for i in range(len(lengths) - 1, -1, -1):
-                                        current_array = []
-                                        if i == len(lengths) - 1:
-                                            for j in range(0, len(values), lengths[i]):
-                                                current_array.append(values[j : j + lengths[i]])
-                                        else:
-                                            for j in range(0, len(previous_array), lengths[i]):
-                                                current_array.append(previous_array[j : j + lengths[i]])
-                                        previous_array = current_array
-                                    measure = previous_array[0]
-                                else:
-                                    raise RuntimeError("Unable to get measure values in response")
-                                break
-                            break
+                response_i = response.find(objkey="explorecube_data")
+                if response_i is not None:
+                    for response_j in response_i.objcontent:
+                        if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
+                            measure_index = 0
+
+                            for i, t in enumerate(response_j["rowkeys"]):
+                                if response_j["title"] == t:
+                                    measure_index = i
+                                    break
+                            if measure_index == 0:
+                                raise RuntimeError("Unable to get measure name in response")
+                            values = _decode_column(response_j["rowvalues"], measure_index, response_j["rowfieldtypes"][measure_index])
+                            # The values are in the order of the coordinates, so the array is reshaped with no copy
+                            measure = values.reshape(lengths)
+                        else:
+                            raise RuntimeError("Unable to get measure values in response")
+                        break
                 if len(measure) == 0:
                     raise RuntimeError("No measure found")
             except Exception as e:
                 print("Unable to get measure from response:", e)
                 return None
 
-            sorted_coordinates = []
-            for ln in lengths:
-                for c in cube.dim_info:
-                    if ln == int(c["size"]) and c["name"] not in sorted_coordinates:
-                        sorted_coordinates.append(c["name"])
-                        break
+            # The measure is laid out as the dimension values, also when only a subset of them is extracted
+            sorted_coordinates = [response_j["title"] for response_j in response.find(objkey="explorecube_dimvalues").objcontent]
             ds[cube.measure] = (
                 sorted_coordinates,
                 measure,
@@ -6838,25 +7190,23 @@ if __name__ == '__main__':
             response from
                 the oph_explorecube and returns metadata information
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: list
             :rtype: <class 'list'>|None
             """
             try:
                 meta_list = []
-                for obj in response["response"]:
-                    if "objcontent" in obj.keys() and "objkey" in obj.keys():
-                        if obj["objkey"] == "explorecube_metadata":
-                            if ("rowvalues" and "rowkeys") in obj["objcontent"][0].keys():
-                                key_indx, value_indx, variable_indx, type_indx = _get_meta_indexes(obj["objcontent"][0]["rowkeys"])
-                                for row in obj["objcontent"][0]["rowvalues"]:
-                                    key = row[key_indx]
-                                    value = row[value_indx]
-                                    variable = row[variable_indx]
-                                    _type = row[type_indx]
-                                    if (_type == "float" or _type == "int") and len(str(value)) > 9:
-                                        value = _scientific_notation(value)
-                                    meta_list.append({"key": key, "value": value, "variable": variable})
+                for obj in response.find_all(objkey="explorecube_metadata"):
+                    if ("rowvalues" and "rowkeys") in obj.objcontent[0].keys():
+                        key_indx, value_indx, variable_indx, type_indx = _get_meta_indexes(obj.objcontent[0]["rowkeys"])
+                        for row in obj.objcontent[0]["rowvalues"]:
+                            key = row[key_indx]
+                            value = row[value_indx]
+                            variable = row[variable_indx]
+                            _type = row[type_indx]
+                            if (_type == "float" or _type == "int") and len(str(value)) > 9:
+                                value = _scientific_notation(value)
+                            meta_list.append({"key": key, "value": value, "variable": variable})
             except Exception as e:
                 print("Unable to parse meta info from response:", e)
                 return None
@@ -6954,19 +7304,17 @@ if __name__ == '__main__':
             response from
                 the oph_explorecube and fills cube measure information
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: list
             :rtype: <bool>
             """
             try:
-                for obj in response["response"]:
-                    if "objcontent" in obj.keys() and "objkey" in obj.keys():
-                        if obj["objkey"] == "explorecube_data":
-                            if "title" in obj["objcontent"][0].keys():
-                                self.measure = obj["objcontent"][0]["title"]
-                            if ("rowfieldtypes" and "rowkeys") in obj["objcontent"][0].keys():
-                                measure_indx = obj["objcontent"][0]["rowkeys"].index(self.measure)
-                                self.measure_type = obj["objcontent"][0]["rowfieldtypes"][measure_indx]
+                for obj in response.find_all(objkey="explorecube_data"):
+                    if "title" in obj.objcontent[0].keys():
+                        self.measure = obj.objcontent[0]["title"]
+                    if ("rowfieldtypes" and "rowkeys") in obj.objcontent[0].keys():
+                        measure_indx = obj.objcontent[0]["rowkeys"].index(self.measure)
+                        self.measure_type = obj.objcontent[0]["rowfieldtypes"][measure_indx]
             except Exception as e:
                 print("Unable to parse measure info from response:", e)
                 return False
@@ -6978,28 +7326,26 @@ if __name__ == '__main__':
             response from
                 the oph_explorecube and fills cube dim information
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: list
             :rtype: <bool>
             """
             try:
                 dim_info = list()
-                for obj in response["response"]:
-                    if "objcontent" in obj.keys() and "objkey" in obj.keys():
-                        if obj["objkey"] == "explorecube_diminfo":
-                            if ("rowvalues" and "rowkeys") in obj["objcontent"][0].keys():
-                                name_indx, type_indx, size_indx, hier_indx, clev_indx, array_indx, level_indx, lattice_indx = _get_dim_indexes(obj["objcontent"][0]["rowkeys"])
-                                for row in obj["objcontent"][0]["rowvalues"]:
-                                    element = dict()
-                                    element["name"] = row[name_indx]
-                                    element["type"] = row[type_indx]
-                                    element["size"] = row[size_indx]
-                                    element["hierarchy"] = row[hier_indx]
-                                    element["concept_level"] = row[clev_indx]
-                                    element["array"] = row[array_indx]
-                                    element["level"] = row[level_indx]
-                                    element["lattice_name"] = row[lattice_indx]
-                                    dim_info.append(element)
+                for obj in response.find_all(objkey="explorecube_diminfo"):
+                    if ("rowvalues" and "rowkeys") in obj.objcontent[0].keys():
+                        name_indx, type_indx, size_indx, hier_indx, clev_indx, array_indx, level_indx, lattice_indx = _get_dim_indexes(obj.objcontent[0]["rowkeys"])
+                        for row in obj.objcontent[0]["rowvalues"]:
+                            element = dict()
+                            element["name"] = row[name_indx]
+                            element["type"] = row[type_indx]
+                            element["size"] = row[size_indx]
+                            element["hierarchy"] = row[hier_indx]
+                            element["concept_level"] = row[clev_indx]
+                            element["array"] = row[array_indx]
+                            element["level"] = row[level_indx]
+                            element["lattice_name"] = row[lattice_indx]
+                            dim_info.append(element)
             except Exception as e:
                 print("Unable to parse dim info from response:", e)
                 return False
@@ -7009,13 +7355,20 @@ if __name__ == '__main__':
         _dependency_check(dependency="xarray")
         import xarray as xr
 
-        query = "oph_explorecube " "ncore=1;base64=yes;level=2;show_index=yes;subset_type=coord;limit_filter=0;show_time=yes;export_metadata=yes;cube={0};".format(self.pid)
+        query = "oph_explorecube " "ncore=1;base64=yes;level=2;show_index=yes;subset_type={0};limit_filter=0;show_time=yes;export_metadata=yes;".format(subset_type)
+        if subset_dims is not None:
+            query += "subset_dims=" + str(subset_dims) + ";"
+        if subset_filter is not None:
+            query += "subset_filter=" + str(subset_filter) + ";"
+        query += "cube=" + str(self.pid) + ";"
+        subset = subset_dims is not None and subset_filter is not None
         try:
-            if Cube.client.submit(query, display=False) is None:
+            result = Cube.client.submit(query, display=False)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                response = Cube.client.deserialize_response()
+            if result.response is not None:
+                response = result.get_response()
 
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
@@ -7023,7 +7376,8 @@ if __name__ == '__main__':
 
         try:
             _set_measure_info(self, response)
-            _set_dim_info(self, response)
+            if not subset:
+                _set_dim_info(self, response)
         except Exception as e:
             print(_get_linenumber(), "Something is wrong with the cube info, error: ", e)
             return None
@@ -7038,6 +7392,12 @@ if __name__ == '__main__':
         except Exception as e:
             print(_get_linenumber(), "Something is wrong with the coordinates, error: ", e)
             return None
+        if Cube.metadata_cache is not None and not subset:
+            try:
+                Cube.metadata_cache.put(self.pid, "dim_info", self.dim_info)
+                Cube.metadata_cache.put(self.pid, "coordinates", dict((dim["name"], ds[dim["name"]].values.tolist()) for dim in self.dim_info if dim["name"] in ds))
+            except Exception as e:
+                print(_get_linenumber(), "Unable to cache the coordinates:", e)
         try:
             ds = _add_measure(self, ds, response, lengths, meta_list)
         except Exception as e:
@@ -7045,6 +7405,38 @@ if __name__ == '__main__':
             return None
         return ds
 
+    def _to_dataset_blocks(self, name, chunks, parallel):
+        # Run to_dataset for the blocks of the given dimension on a pool of threads, copying the measure of each block into its
+        # slot of a preallocated array as soon as it is received
+        import numpy as np
+
+        def _fetch(subset_filter):
+            ds = self.to_dataset(subset_dims=name, subset_filter=subset_filter, subset_type="index")
+            if ds is None:
+                raise RuntimeError("Unable to export the block " + subset_filter)
+            return ds
+
+        first = values = axis = None
+        coordinates = [None] * len(chunks)
+        for position, selection, ds in _fetch_blocks(chunks, parallel, _fetch):
+            block = ds[self.measure]
+            if values is None:
+                first = ds
+                axis = block.dims.index(name)
+                shape = list(block.shape)
+                shape[axis] = chunks[-1][1][name].stop
+                values = np.empty(shape, dtype=block.dtype)
+            index = [slice(None)] * values.ndim
+            index[axis] = selection[name]
+            values[tuple(index)] = block.values
+            coordinates[position] = ds[name].values
+        ds = first.drop_vars([self.measure, name])
+        ds[name] = np.concatenate(coordinates)
+        ds[name].attrs = first[name].attrs
+        ds[self.measure] = (first[self.measure].dims, values)
+        ds[self.measure].attrs = first[self.measure].attrs
+        return ds
+
     def to_dataframe(self):
         """to_dataframe() -> pandas.core.frame.DataFrame or None : return data from an Ophidia datacube into a Pandas dataframe
 
@@ -7066,34 +7458,26 @@ if __name__ == '__main__':
             :param cube: the cube object
             :type cube:  <class 'PyOphidia.cube.Cube'>
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: pandas.core.indexes.multi.MultiIndex|None
             :rtype: <class 'pandas.core.indexes.multi.MultiIndex'>|None
             """
             indexes = {}
             try:
-                for response_i in response["response"]:
-                    if response_i["objkey"] == "explorecube_dimvalues":
-                        for response_j in response_i["objcontent"]:
-                            if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
-                                if response_j["title"] == _time_dimension_finder(cube):
-                                    temp_array = []
-                                    for val in response_j["rowvalues"]:
-                                        dims = [s.strip() for s in val[1].split(",")]
-                                        temp_array.append(dims[0])
-                                    indexes[response_j["title"]] = temp_array
-                                else:
-                                    temp_array = []
-                                    for val in response_j["rowvalues"]:
-                                        decoded_bin = base64.b64decode(val[1] + "==")
-                                        length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][1])
-                                        format = _get_unpack_format(length, response_j["rowfieldtypes"][1])
-                                        dims = struct.unpack(format, decoded_bin)
-                                        temp_array.append(dims[0])
-                                    indexes[response_j["title"]] = list(temp_array)
+                response_i = response.find(objkey="explorecube_dimvalues")
+                if response_i is not None:
+                    for response_j in response_i.objcontent:
+                        if response_j["title"] and response_j["rowfieldtypes"] and response_j["rowfieldtypes"][1] and response_j["rowvalues"]:
+                            if response_j["title"] == _time_dimension_finder(cube):
+                                temp_array = []
+                                for val in response_j["rowvalues"]:
+                                    dims = [s.strip() for s in val[1].split(",")]
+                                    temp_array.append(dims[0])
+                                indexes[response_j["title"]] = temp_array
                             else:
-                                raise RuntimeError("Unable to get dimension name or values in " "response")
-                        break
+                                indexes[response_j["title"]] = _decode_column(response_j["rowvalues"], 1, response_j["rowfieldtypes"][1], first=True).tolist()
+                        else:
+                            raise RuntimeError("Unable to get dimension name or values in " "response")
             except Exception as e:
                 print(_get_linenumber(), "Unable to get dimensions from response:", e)
                 return None
@@ -7109,38 +7493,27 @@ if __name__ == '__main__':
             :param indexes: indexes in pandas multiindex format
             :type indexes: <class 'pandas.core.indexes.multi.MultiIndex'>
             :param response: response from pyophidia query
-            :type response:  <class 'dict'>
+            :type response:  <class 'PyOphidia.response.Response'>
             :returns: pandas.core.frame.DataFrame|None
             :rtype: <class 'pandas.core.frame.DataFrame'>|None
             """
             try:
-                for response_i in response["response"]:
-                    if response_i["objkey"] == "explorecube_data":
-                        for response_j in response_i["objcontent"]:
-                            if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
-                                measure_index = 0
-                                for i, t in enumerate(response_j["rowkeys"]):
-                                    if response_j["title"] == t:
-                                        measure_index = i
-                                        break
-                                if measure_index == 0:
-                                    raise RuntimeError("Unable to get measure name in response")
-                                values = []
-                                for val in response_j["rowvalues"]:
-                                    decoded_bin = base64.b64decode(val[measure_index] + "==")
-                                    length = _calculate_decoded_length(decoded_bin, response_j["rowfieldtypes"][measure_index])
-                                    format = _get_unpack_format(length, response_j["rowfieldtypes"][measure_index])
-                                    measure = struct.unpack(format, decoded_bin)
-                                    if (type(measure)) is (tuple or list) and len(measure) == 1:
-                                        values.append(measure[0])
-                                    else:
-                                        for v in measure:
-                                            values.append(v)
-                            else:
-                                raise RuntimeError("Unable to get measure values in response")
-                            break
+                response_i = response.find(objkey="explorecube_data")
+                if response_i is not None:
+                    for response_j in response_i.objcontent:
+                        if response_j["title"] and response_j["rowkeys"] and response_j["rowfieldtypes"] and response_j["rowvalues"]:
+                            measure_index = 0
+                            for i, t in enumerate(response_j["rowkeys"]):
+                                if response_j["title"] == t:
+                                    measure_index = i
+                                    break
+                            if measure_index == 0:
+                                raise RuntimeError("Unable to get measure name in response")
+                            values = _decode_column(response_j["rowvalues"], measure_index, response_j["rowfieldtypes"][measure_index])
+                        else:
+                            raise RuntimeError("Unable to get measure values in response")
                         break
-                if len(measure) == 0:
+                if len(values) == 0:
                     raise RuntimeError("No measure found")
             except Exception as e:
                 print("Unable to get measure from response:", e)
@@ -7154,11 +7527,12 @@ if __name__ == '__main__':
         query = "oph_explorecube " "ncore=1;base64=yes;level=2;show_time=yes;show_index=yes" ";subset_type=coord;" "limit_filter=0;cube={0};".format(self.pid)
 
         try:
-            if Cube.client.submit(query, display=False) is None:
+            result = Cube.client.submit(query, display=False)
+            if result is None:
                 raise RuntimeError()
 
-            if Cube.client.last_response is not None:
-                response = Cube.client.deserialize_response()
+            if result.response is not None:
+                response = result.get_response()
 
         except Exception as e:
             print(_get_linenumber(), "Something went wrong:", e)
@@ -7176,6 +7550,99 @@ if __name__ == '__main__':
             return None
         return df
 
+    def _explore_block(self, subset_dims, subset_filter):
+        # Return the measure of a subset of the cube, selected by index, as a NumPy array with an axis for each dimension
+        query = "oph_explorecube ncore=1;base64=yes;level=2;show_index=yes;subset_type=index;limit_filter=0;save=no;subset_dims={0};subset_filter={1};cube={2};".format(subset_dims, subset_filter, self.pid)
+        try:
+            result = Cube.client.submit(query, display=False)
+            if result is None:
+                raise RuntimeError()
+            response = result.get_response()
+        except Exception as e:
+            print(_get_linenumber(), "Something went wrong:", e)
+            raise RuntimeError()
+
+        lengths = []
+        dimvalues = response.find(objkey="explorecube_dimvalues")
+        if dimvalues is not None:
+            for content in dimvalues.objcontent:
+                lengths.append(len(content["rowvalues"]))
+        data = response.grid(objkey="explorecube_data")
+        if data is None or not data.rowkeys or data.title not in data.rowkeys or not data.rowvalues:
+            raise RuntimeError("Unable to get measure values in response")
+        measure_index = data.rowkeys.index(data.title)
+        return _decode_column(data.rowvalues, measure_index, data.rowfieldtypes[measure_index]).reshape(lengths)
+
+    def iter_chunks(self, dims=None, chunk_size=1, output="numpy", prefetch=1):
+        """iter_chunks(dims=None, chunk_size=1, output='numpy', prefetch=1) -> generator : return data from an Ophidia datacube block by block, with an oph_explorecube request for each block, so that cubes larger than the memory of the client or the response limit of the server can be processed
+
+        :param dims: pipe (|) separated list of dimensions along which the cube is split (default is the first explicit dimension)
+        :type dims: str
+        :param chunk_size: number of indexes of each block along the dimensions, as an int or a pipe (|) separated list with a value for each dimension
+        :type chunk_size: int or str
+        :param output: numpy|xarray
+        :type output: str
+        :param prefetch: number of blocks requested in background while the current one is processed (0 to disable)
+        :type prefetch: int
+        :returns: generator yielding, for each block, a dict with the slice of each split dimension and a NumPy array with an axis for each dimension (numpy), or a Xarray Dataset (xarray)
+        :rtype: generator
+        :raises: RuntimeError
+        """
+
+        if Cube.client is None or self.pid is None:
+            raise RuntimeError("Cube.client or pid is None")
+        if output not in ("numpy", "xarray"):
+            raise RuntimeError("output must be numpy or xarray")
+        _dependency_check("numpy" if output == "numpy" else "xarray")
+        self.compute()
+        if dims is None:
+            explicit = [dim["name"] for dim in self.dim_info if dim["array"] == "no"]
+            dims = explicit[0] if explicit else self.dim_info[0]["name"]
+        dims = str(dims).split("|")
+        try:
+            chunk_size = [int(size) for size in str(chunk_size).split("|")]
+        except ValueError:
+            raise RuntimeError("chunk_size must be a positive number of indexes for each dimension")
+        if len(chunk_size) == 1:
+            chunk_size = chunk_size * len(dims)
+        chunks = _plan_chunks(self.dim_info, dims, chunk_size)
+        subset_dims = "|".join(dims)
+
+        def _fetch(subset_filter):
+            if output == "numpy":
+                return self._explore_block(subset_dims, subset_filter)
+            ds = self.to_dataset(subset_dims=subset_dims, subset_filter=subset_filter, subset_type="index")
+            if ds is None:
+                raise RuntimeError("Unable to export the block " + subset_filter)
+            return ds
+
+        def _blocks():
+            # At most prefetch blocks are requested ahead, by a single thread, so that memory stays bounded
+            if not prefetch:
+                for subset_filter, selection in chunks:
+                    block = _fetch(subset_filter)
+                    yield (selection, block) if output == "numpy" else block
+                return
+            executor = ThreadPoolExecutor(max_workers=1)
+            pending = collections.deque()
+            try:
+                for subset_filter, selection in chunks:
+                    pending.append((executor.submit(_fetch, subset_filter), selection))
+                    if len(pending) > prefetch:
+                        future, current = pending.popleft()
+                        block = future.result()
+                        yield (current, block) if output == "numpy" else block
+                while pending:
+                    future, current = pending.popleft()
+                    block = future.result()
+                    yield (current, block) if output == "numpy" else block
+            finally:
+                for future, current in pending:
+                    future.cancel()
+                executor.shutdown(wait=False)
+
+        return _blocks()
+
     def __str__(self):
         buf = "-" * 30 + "\n"
         buf += "%30s: %s" % ("Cube", self.pid) + "\n"
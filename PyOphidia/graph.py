@@ -0,0 +1,383 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import binascii
+import json
+import os
+import re
+import threading
+import weakref
+import PyOphidia.ophsubmit as _ophsubmit
+import PyOphidia.response as _response
+
+LAZY_PREFIX = "lazy://"
+
+# Operators producing a single output cube, whose requests can be deferred
+CUBE_OPERATORS = frozenset(
+    [
+        "oph_aggregate",
+        "oph_aggregate2",
+        "oph_apply",
+        "oph_concatnc",
+        "oph_concatnc2",
+        "oph_drilldown",
+        "oph_duplicate",
+        "oph_importnc",
+        "oph_importnc2",
+        "oph_intercube",
+        "oph_intercube2",
+        "oph_merge",
+        "oph_mergecubes",
+        "oph_mergecubes2",
+        "oph_permute",
+        "oph_randcube",
+        "oph_randcube2",
+        "oph_reduce",
+        "oph_reduce2",
+        "oph_rollup",
+        "oph_subset",
+    ]
+)
+
+_PLACEHOLDER = re.compile(re.escape(LAZY_PREFIX) + r"([0-9a-f]+)/([0-9]+)")
+
+# Graphs are found from the placeholders of their cubes, as long as some lazy Cube or the Client still refers to them
+_graphs = weakref.WeakValueDictionary()
+
+_EMPTY_RESPONSE = json.dumps({"response": []})
+
+
+def is_lazy(pid):
+    """is_lazy(pid) -> bool : return True if pid is the placeholder of a cube not computed yet
+    :param pid: PID of a cube
+    :type pid: str
+    :returns: True or False
+    :rtype: bool
+    """
+
+    return pid is not None and _PLACEHOLDER.match(str(pid)) is not None
+
+
+def graph_of(pid):
+    """graph_of(pid) -> Graph : return the Graph a placeholder belongs to, or None
+    :param pid: placeholder of a lazy cube
+    :type pid: str
+    :returns: graph or None
+    :rtype: Graph or None
+    """
+
+    match = _PLACEHOLDER.match(str(pid))
+    return _graphs.get(match.group(1)) if match else None
+
+
+def bind(query):
+    """bind(query) -> str : replace the placeholders of lazy cubes in a query (or JSON workflow) with the PIDs of the cubes,
+           computing them first if needed, with one workflow for each graph
+    :param query: query or JSON workflow
+    :type query: str
+    :returns: query with the actual PIDs
+    :rtype: str
+    :raises: RuntimeError
+    """
+
+    if LAZY_PREFIX not in query:
+        return query
+    placeholders = {}
+    for match in _PLACEHOLDER.finditer(query):
+        placeholders.setdefault(match.group(1), []).append(match.group(0))
+    pids = {}
+    for token, found in placeholders.items():
+        graph = _graphs.get(token)
+        if graph is None:
+            raise RuntimeError("the graph of the lazy cube " + found[0] + " is no longer available")
+        pids.update(zip(found, graph.compute(*found)))
+    return _PLACEHOLDER.sub(lambda match: pids[match.group(0)], query)
+
+
+class _Node(object):
+    __slots__ = ("index", "operator", "arguments", "parents", "pid", "done", "job")
+
+    def __init__(self, index, operator, arguments, parents):
+        self.index = index
+        self.operator = operator
+        self.arguments = arguments
+        self.parents = parents
+        self.pid = None
+        self.done = False
+        self.job = None
+
+
+class Graph(object):
+    """Graph(client, name=None, exec_mode='sync', record_all=False) -> obj : graph of deferred requests, recorded by Client.lazy
+    or Cube.lazy (requests of operators producing cubes only) or by Client.workflow or Cube.workflow (all requests) instead of
+    being submitted
+
+    Each recorded request is a node; the output cube of the operators of CUBE_OPERATORS is identified by a placeholder PID (e.g.
+    'lazy://<token>/3') until it is computed, and the requests using that placeholder depend on the node. Requests not producing
+    cubes, when recorded, depend on all the previous ones and the following ones depend on them, so that their order is kept.
+    When the graph is submitted, or when a cube is needed, i.e. on compute() or when a request not recorded refers to its
+    placeholder, the nodes not run yet are compiled into a single Ophidia workflow and submitted with one request, and the PIDs
+    of the final cubes are bound to their placeholders (in asynchronous mode, when the Job of the workflow is done).
+    Intermediate cubes are not bound: in lazy mode they are computed again if they are needed on their own later, while those of
+    recorded workflows cannot be used after the workflow.
+
+    Attributes:
+        client: Client submitting the workflows
+        name: Name of the workflows
+        exec_mode: Execution mode of the workflows, 'sync' or 'async'
+        record_all: True if all the requests are recorded, False if only those of CUBE_OPERATORS are
+        token: Random token identifying the graph in the placeholders
+        nodes: Number of recorded requests
+        pids: Placeholders of the cubes produced by the recorded requests
+        workflows: Number of workflows submitted
+        job: Job of the last workflow submitted in asynchronous mode, or None
+
+    Methods:
+        record(query) -> Result : Record a request and return a Result with the placeholder of its output cube, if any.
+        submit() -> Result or Job : Submit the requests not run yet with a single workflow.
+        compute(*pids) -> list : Compute the cubes with the given placeholders (all the final cubes, if none is given) and return
+            their PIDs.
+        workflow(*pids) -> dict : Return the workflow computing the cubes with the given placeholders.
+    """
+
+    def __init__(self, client, name=None, exec_mode="sync", record_all=False):
+        if exec_mode not in ("sync", "async"):
+            raise ValueError("exec_mode must be 'sync' or 'async'")
+        self.client = client
+        self.name = name or ("PyOphidia workflow" if record_all else "PyOphidia lazy graph")
+        self.exec_mode = exec_mode
+        self.record_all = record_all
+        self.token = binascii.hexlify(os.urandom(8)).decode("ascii")
+        self.workflows = 0
+        self.job = None
+        self._nodes = []
+        self._barrier = None
+        self._jobs = {}
+        self._lock = threading.RLock()
+        _graphs[self.token] = self
+
+    @property
+    def nodes(self):
+        return len(self._nodes)
+
+    @property
+    def pids(self):
+        return [self._placeholder(node) for node in self._nodes if node.operator in CUBE_OPERATORS]
+
+    def records(self, query):
+        """records(query) -> bool : return True if the request is deferred, i.e. if all requests are recorded or its operator
+        produces a cube"""
+
+        try:
+            return self.record_all or _ophsubmit.Query(query).operator in CUBE_OPERATORS
+        except ValueError:
+            return False
+
+    def record(self, query):
+        """record(query) -> Result : record a request, instead of submitting it
+        :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;'
+        :type query: str
+        :returns: result whose cube is the placeholder of the output cube, if any
+        :rtype: Result
+        :raises: ValueError
+        """
+
+        # Cubes of other graphs are computed at once, those of this graph become dependencies
+        query = _PLACEHOLDER.sub(lambda match: match.group(0) if match.group(1) == self.token else bind(match.group(0)), str(query))
+        parsed = _ophsubmit.Query(query)
+        with self._lock:
+            index = len(self._nodes)
+            parents = []
+            for argument in parsed.arguments:
+                key = argument.split("=", 1)[0]
+                for match in _PLACEHOLDER.finditer(argument):
+                    parents.append((key, int(match.group(2))))
+            node = _Node(index, parsed.operator, list(parsed.arguments), parents)
+            if parsed.operator in CUBE_OPERATORS:
+                if self._barrier is not None:
+                    parents.append((None, self._barrier))
+            else:
+                # Requests with side effects (e.g. oph_createcontainer or oph_delete) are run in the order they were recorded
+                linked = set(parent for key, parent in parents)
+                parents.extend((None, previous) for previous in range(index) if previous not in linked)
+                self._barrier = index
+            self._nodes.append(node)
+        if parsed.operator not in CUBE_OPERATORS:
+            return _response.Result(query, _EMPTY_RESPONSE, status="SUCCESS")
+        return _response.Result(query, _EMPTY_RESPONSE, status="SUCCESS", cube=self._placeholder(node))
+
+    def _placeholder(self, node):
+        return LAZY_PREFIX + self.token + "/" + str(node.index)
+
+    def _node(self, pid):
+        match = _PLACEHOLDER.match(str(pid))
+        if match is None or match.group(1) != self.token or int(match.group(2)) >= len(self._nodes):
+            raise ValueError("not a cube of this graph: " + str(pid))
+        return self._nodes[int(match.group(2))]
+
+    def _task_name(self, node):
+        return node.operator[4:] + "_" + str(node.index)
+
+    def _needed(self, targets):
+        # Return the nodes to be run to compute the targets, in the order they were recorded
+        needed = set()
+        stack = list(targets)
+        while stack:
+            node = stack.pop()
+            if node.done or node.index in needed:
+                continue
+            needed.add(node.index)
+            stack.extend(self._nodes[index] for key, index in node.parents)
+        return [self._nodes[index] for index in sorted(needed)]
+
+    def _task(self, node, nodes):
+        # Placeholders of computed cubes are replaced with their PIDs, the others become dependencies on the argument
+        arguments = []
+        dependencies = []
+        for key, index in node.parents:
+            if key is None and index in nodes:
+                dependencies.append({"task": self._task_name(self._nodes[index])})
+        for argument in node.arguments:
+            key, value = argument.split("=", 1)
+            for match in _PLACEHOLDER.finditer(value):
+                parent = self._nodes[int(match.group(2))]
+                if parent.pid is None:
+                    dependencies.append({"task": self._task_name(parent), "type": "single", "argument": key})
+            value = _PLACEHOLDER.sub(lambda match: self._nodes[int(match.group(2))].pid or "", value)
+            value = re.sub(r"\|{2,}", "|", value).replace("[|", "[").replace("|]", "]").strip("|")
+            if value and value != "[]":
+                arguments.append(key + "=" + value)
+        task = {"name": self._task_name(node), "operator": node.operator, "arguments": arguments}
+        if dependencies:
+            task["dependencies"] = dependencies
+        return task
+
+    def workflow(self, *pids):
+        """workflow(*pids) -> dict : return the workflow computing the cubes with the given placeholders (all the final cubes, if
+               none is given), including only the nodes not run yet
+        :param pids: placeholders of lazy cubes
+        :type pids: str
+        :returns: Ophidia workflow
+        :rtype: dict
+        :raises: ValueError
+        """
+
+        with self._lock:
+            nodes = self._needed(self._targets(pids))
+            indexes = set(node.index for node in nodes)
+            return {
+                "name": self.name,
+                "author": str(self.client.username),
+                "abstract": "Workflow of " + str(len(nodes)) + " deferred request(s)",
+                "exec_mode": self.exec_mode,
+                "tasks": [self._task(node, indexes) for node in nodes],
+            }
+
+    def _targets(self, pids):
+        if pids:
+            return [self._node(pid) for pid in pids]
+        consumed = set(index for node in self._nodes for key, index in node.parents)
+        return [node for node in self._nodes if node.index not in consumed]
+
+    def submit(self):
+        """submit() -> Result or Job : submit the requests not run yet with a single workflow, without waiting for its end in
+               asynchronous mode
+        :returns: result of the workflow, its job in asynchronous mode or None if there is nothing to run
+        :rtype: Result or Job or None
+        :raises: RuntimeError
+        """
+
+        with self._lock:
+            pending = [node for node in self._targets(()) if not node.done and node.job is None]
+            if not pending:
+                return None
+            return self._run(pending)
+
+    def compute(self, *pids):
+        """compute(*pids) -> list : compute the cubes with the given placeholders (all the final cubes, if none is given) with a
+               single workflow, waiting for its end, and return their PIDs
+        :param pids: placeholders of lazy cubes
+        :type pids: str
+        :returns: PIDs of the cubes
+        :rtype: list
+        :raises: RuntimeError, ValueError
+        """
+
+        with self._lock:
+            targets = self._targets(pids)
+            while True:
+                pending = [node for node in targets if not node.done]
+                if not pending:
+                    break
+                submitted = [node for node in pending if node.job is not None]
+                if submitted:
+                    self._wait(submitted[0].job)
+                else:
+                    self._run(pending)
+                    if self.exec_mode == "async":
+                        self._wait(self.job)
+            for node in targets:
+                if node.pid is None and node.operator in CUBE_OPERATORS:
+                    raise RuntimeError("the PID of the intermediate cube " + self._placeholder(node) + " is not known")
+            return [node.pid for node in targets]
+
+    def _run(self, pending):
+        # The cubes of the workflows still running are needed to build the new one
+        for job in list(self._jobs):
+            self._wait(job)
+        nodes = self._needed(pending)
+        consumed = set(index for node in nodes for key, index in node.parents)
+        finals = [node for node in nodes if node.index not in consumed]
+        result = self.client._wrequest(self.workflow(*[self._placeholder(node) for node in finals]), update=False)
+        self.workflows += 1
+        if self.exec_mode == "async":
+            self.job = self.client._get_monitor().watch(result)
+            for node in nodes:
+                node.job = self.job
+            self._jobs[self.job] = (nodes, finals)
+            return self.job
+        self._bind(nodes, finals, result)
+        return result
+
+    def _wait(self, job):
+        # Bind the cubes of a workflow submitted in asynchronous mode, once it is done
+        result = job.result()
+        nodes, finals = self._jobs.pop(job, (None, None))
+        if nodes is not None:
+            self._bind(nodes, finals, result)
+
+    def _bind(self, nodes, finals, result):
+        finals = [node for node in finals if node.operator in CUBE_OPERATORS]
+        if len(finals) == 1:
+            cubes = [result.cube]
+        elif finals:
+            # The final response includes the output of each final task, in the order of the tasks
+            cubes = [obj.message for obj in result.get_response().find_all(title="Output Cube")]
+            if len(cubes) != len(finals):
+                raise RuntimeError("the workflow reported " + str(len(cubes)) + " output cubes instead of " + str(len(finals)))
+        else:
+            cubes = []
+        if not all(cubes):
+            raise RuntimeError("the workflow did not report its output cube")
+        for node, cube in zip(finals, cubes):
+            node.pid = cube
+        for node in nodes:
+            node.job = None
+            # Intermediate cubes are left to be computed again, if needed, unless other recorded requests (e.g. oph_delete) may
+            # have changed their inputs
+            node.done = node.pid is not None or node.operator not in CUBE_OPERATORS or self.record_all
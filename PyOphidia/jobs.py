@@ -0,0 +1,337 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+import PyOphidia.client as _client
+
+# Re-exported, so that jobs can be waited for without importing concurrent.futures
+from concurrent.futures import wait, as_completed
+
+DEFAULT_MIN_INTERVAL = 0.5
+DEFAULT_MAX_INTERVAL = 30.0
+DEFAULT_BACKOFF = 1.5
+MAX_POLL_ERRORS = 5
+DEFAULT_NLINES = 1000
+
+COMPLETED_STATUS = "OPH_STATUS_COMPLETED"
+FAILED_STATUSES = frozenset(["OPH_STATUS_ERROR", "OPH_STATUS_ABORTED", "OPH_STATUS_EXPIRED"])
+
+
+def is_final(status):
+    """is_final(status) -> bool : return True if a workflow with the given status (e.g. 'OPH_STATUS_RUNNING') is over"""
+
+    return status == COMPLETED_STATUS or status in FAILED_STATUSES or (status is not None and status.endswith("_ERROR"))
+
+
+StatusDelta = namedtuple("StatusDelta", ["session", "workflowid", "status", "progress", "previous_status", "previous_progress"])
+StatusDelta.__doc__ = """StatusDelta(session, workflowid, status, progress, previous_status, previous_progress) : change of the status and/or
+progress rate of a workflow between two refreshes of a StatusMonitor (progress is None if not reported by the server)"""
+
+
+class StatusMonitor(object):
+    """StatusMonitor(client, nlines=1000) -> obj : status of many workflows, refreshed with a single oph_loggingbk request for each
+    session, instead of one oph_resume request for each workflow
+
+    Workflows to be followed are registered with track(). Each refresh lists the workflows of the session (at most nlines of them)
+    and returns the changes found since the previous one. Since the requests do not change the state of the client, a monitor
+    can be refreshed from any thread, or from a coroutine through AsyncClient.refresh_status().
+
+    Attributes:
+        client: Client used to submit the requests
+        nlines: Maximum number of workflows listed for each session
+        refreshes: Number of requests sent
+
+    Methods:
+        track(workflowid, session) -> None : Follow the status of a workflow of a session.
+        untrack(workflowid, session) -> None : Stop following the status of a workflow.
+        get(workflowid, session) -> tuple : Return the last known (status, progress) of a workflow, or None.
+        refresh(session=None) -> list : Refresh the status of the workflows of a session (all sessions if None) and return the
+            list of StatusDelta, one for each workflow whose status or progress changed.
+        queries(session=None) -> list : Return the (session, query) pairs needed to refresh the status of the workflows.
+        update(session, response) -> list : Update the status of the workflows of a session from the Response of a query.
+    """
+
+    def __init__(self, client, nlines=DEFAULT_NLINES):
+        self.client = client
+        self.nlines = nlines
+        self.refreshes = 0
+        self._statuses = {}
+        self._lock = threading.Lock()
+
+    def track(self, workflowid, session):
+        """track(workflowid, session) -> None : follow the status of a workflow of a session"""
+
+        with self._lock:
+            self._statuses.setdefault(session, {}).setdefault(str(workflowid), (None, None))
+
+    def untrack(self, workflowid, session):
+        """untrack(workflowid, session) -> None : stop following the status of a workflow"""
+
+        with self._lock:
+            workflows = self._statuses.get(session)
+            if workflows is not None:
+                workflows.pop(str(workflowid), None)
+                if not workflows:
+                    del self._statuses[session]
+
+    def get(self, workflowid, session):
+        """get(workflowid, session) -> tuple : return the last known (status, progress) of a workflow, or None if not tracked"""
+
+        with self._lock:
+            return self._statuses.get(session, {}).get(str(workflowid))
+
+    def queries(self, session=None):
+        """queries(session=None) -> list : return the (session, query) pairs needed to refresh the status of the workflows of a
+        session, or of all sessions if session is None"""
+
+        with self._lock:
+            sessions = [session] if session is not None else list(self._statuses)
+            return [(s, "oph_loggingbk session_level=0;job_level=1;session_filter=" + s + ";nlines=" + str(self.nlines) + ";") for s in sessions if self._statuses.get(s)]
+
+    def update(self, session, response):
+        """update(session, response) -> list : update the status of the workflows of a session from the Response of one of the
+        queries() and return the list of StatusDelta"""
+
+        deltas = []
+        with self._lock:
+            self.refreshes += 1
+            workflows = self._statuses.get(session, {})
+            for workflowid, name, status, progress in _client._workflow_rows(response):
+                previous = workflows.get(workflowid)
+                if previous is None:
+                    continue
+                if progress is None:
+                    progress = previous[1]
+                if (status, progress) != previous:
+                    workflows[workflowid] = (status, progress)
+                    deltas.append(StatusDelta(session, workflowid, status, progress, previous[0], previous[1]))
+        return deltas
+
+    def refresh(self, session=None):
+        """refresh(session=None) -> list : refresh the status of the workflows of a session, or of all sessions if session is None,
+               and return the list of StatusDelta, one for each workflow whose status or progress changed
+        :param session: session of the workflows
+        :type session: str
+        :returns: changes since the previous refresh
+        :rtype: list
+        :raises: RuntimeError
+        """
+
+        deltas = []
+        for session, query in self.queries(session):
+            deltas.extend(self.update(session, self.client._request(query, session).get_response()))
+        return deltas
+
+
+class Job(Future):
+    """Job(submission) -> obj : Future of a workflow submitted in asynchronous mode, resolved by a JobMonitor with the Result of
+    the final response of the workflow (whose cube attribute is the PID of the output cube, if any), or with a RuntimeError if
+    the workflow fails. As any concurrent.futures.Future, it supports result(timeout), add_done_callback(fn) and can be passed
+    to wait() and as_completed().
+
+    Attributes:
+        submission: Result of the submission, holding the jobid
+        workflowid: ID of the workflow
+        session: ID of the session of the workflow
+        status: Last status of the workflow reported by the server (e.g. 'OPH_STATUS_RUNNING')
+        progress: Last progress rate of the workflow reported by the server (between 0 and 1)
+        polls: Number of status requests sent for the workflow
+    """
+
+    def __init__(self, submission):
+        Future.__init__(self)
+        self.submission = submission
+        self.workflowid = None
+        self.session = submission.session
+        if submission.jobid is not None and "?" in submission.jobid:
+            self.workflowid = submission.jobid.split("?")[1].split("#")[0]
+        self.status = None
+        self.progress = 0.0
+        self.polls = 0
+        self._interval = DEFAULT_MIN_INTERVAL
+        self._next_poll = 0
+        self._errors = 0
+        self._notification = None
+        self.set_running_or_notify_cancel()
+
+    def __repr__(self):
+        return "Job(workflowid=%r, status=%r, progress=%r)" % (self.workflowid, self.status, self.progress)
+
+
+class JobMonitor(object):
+    """JobMonitor(client, min_interval=0.5, max_interval=30, backoff=1.5, receiver=None) -> obj : monitor of the workflows submitted
+    in asynchronous mode by a Client, shared by all of them
+
+    A background thread, running only while there are jobs to follow, polls the status of the workflows and, once a workflow is
+    over, retrieves its final response and resolves the Job. The status of all the workflows of a session is refreshed at once
+    through a StatusMonitor; only workflows missing from its listing are polled one by one with oph_resume. The polling interval
+    of each workflow starts from min_interval and is multiplied by backoff, up to max_interval, after every poll that reports no
+    progress. The requests of the monitor do not change the state and the last_* attributes of the client.
+
+    Workflows submitted with the callback_url of a CallbackReceiver are not polled: the Job is resolved as soon as the server
+    notifies the end of the workflow. Only in case the notification is lost, their status is checked every max_interval seconds.
+
+    Attributes:
+        client: Client used to submit the status requests
+        min_interval: Initial number of seconds between two polls of a workflow
+        max_interval: Maximum number of seconds between two polls of a workflow
+        backoff: Growth factor of the polling interval of a workflow that is not progressing
+        status: StatusMonitor refreshing the status of the workflows of a session at once
+        receiver: CallbackReceiver notified by the server of the end of the workflows, or None
+
+    Methods:
+        watch(submission) -> Job : Return the Job following the workflow submitted with the given Result.
+        pending() -> list : Return the jobs that are not done yet.
+    """
+
+    def __init__(self, client, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, backoff=DEFAULT_BACKOFF, receiver=None):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.status = StatusMonitor(client)
+        self.receiver = receiver
+        self._jobs = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self, submission):
+        """watch(submission) -> Job : return the Job following the workflow submitted in asynchronous mode with the given Result
+        :param submission: result of the submission of the workflow
+        :type submission: Result
+        :returns: job of the workflow
+        :rtype: Job
+        """
+
+        job = Job(submission)
+        if job.workflowid is None:
+            job.set_exception(RuntimeError("no workflow id returned by the server"))
+            return job
+        job._interval = self.min_interval
+        notified = self.receiver is not None and "callback_url=" + self.receiver.url + ";" in submission.request
+        if notified:
+            job._interval = self.max_interval
+        job._next_poll = time.time() + job._interval
+        self.status.track(job.workflowid, job.session)
+        with self._cond:
+            self._jobs.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="PyOphidia-JobMonitor")
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify()
+        if notified:
+            self.receiver.register(submission.jobid, lambda notification: self._notify(job, notification))
+        return job
+
+    def pending(self):
+        """pending() -> list : return the jobs that are not done yet"""
+
+        with self._cond:
+            return list(self._jobs)
+
+    def _notify(self, job, notification):
+        with self._cond:
+            job._notification = notification
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._jobs:
+                    self._thread = None
+                    return
+                now = time.time()
+                notified = [job for job in self._jobs if job._notification is not None]
+                sessions = set(job.session for job in self._jobs if job._next_poll <= now and job._notification is None)
+                if not sessions and not notified:
+                    self._cond.wait(min(job._next_poll for job in self._jobs) - now)
+                    continue
+                jobs = [job for job in self._jobs if job.session in sessions and job._notification is None]
+            # Notified workflows need no status request, unless the notification does not carry the status
+            for job in notified:
+                notification, job._notification = job._notification, None
+                if notification.status is not None:
+                    self._update(job, notification.status, 1.0 if notification.status == COMPLETED_STATUS else job.progress)
+                else:
+                    self._poll(job)
+                self._forget(job)
+            # A single request refreshes the status of all the workflows of a session, including those not due yet
+            refreshed = set()
+            for session in sessions:
+                try:
+                    self.status.refresh(session)
+                    refreshed.add(session)
+                except Exception:
+                    pass
+            for job in jobs:
+                known = self.status.get(job.workflowid, job.session) if job.session in refreshed else None
+                if known is not None and known[0] is not None:
+                    job.polls += 1
+                    self._update(job, known[0], known[1] if known[1] is not None else job.progress)
+                elif job._next_poll <= now:
+                    self._poll(job)
+                self._forget(job)
+
+    def _forget(self, job):
+        if job.done():
+            self.status.untrack(job.workflowid, job.session)
+            if self.receiver is not None:
+                self.receiver.unregister(job.submission.jobid)
+            with self._cond:
+                if job in self._jobs:
+                    self._jobs.remove(job)
+
+    def _poll(self, job):
+        try:
+            job.polls += 1
+            response = self.client._request("oph_resume level=0;id=" + job.workflowid + ";", job.session).get_response()
+            status, submission_date, progress = _client._workflow_progress(response)
+            job._errors = 0
+        except Exception as e:
+            job._errors += 1
+            if job._errors >= MAX_POLL_ERRORS:
+                job.set_exception(RuntimeError("unable to get the status of workflow " + job.workflowid + ": " + str(e)))
+            else:
+                job._interval = min(self.max_interval, job._interval * self.backoff)
+                job._next_poll = time.time() + job._interval
+            return
+        self._update(job, status, progress)
+
+    def _update(self, job, status, progress):
+        if status is None and progress >= 1:
+            status = COMPLETED_STATUS
+        if status == job.status and progress == job.progress:
+            job._interval = min(self.max_interval, job._interval * self.backoff)
+        job.status, job.progress = status, progress
+        job._next_poll = time.time() + job._interval
+        if not is_final(status):
+            return
+
+        try:
+            result = self.client._request("oph_resume document_type=response;level=1;id=" + job.workflowid + ";", job.session)
+        except Exception as e:
+            job.set_exception(RuntimeError("unable to get the response of workflow " + job.workflowid + ": " + str(e)))
+            return
+        if status != COMPLETED_STATUS:
+            job.set_exception(RuntimeError(result.error or "workflow " + job.workflowid + " ended with status " + str(status)))
+        else:
+            job.set_result(result)
@@ -19,7 +19,11 @@
 import sys
 import base64
 import re
-import xml.etree.ElementTree as ET
+import socket
+import threading
+import time
+import zlib
+from xml.parsers import expat
 from inspect import currentframe
 
 if sys.version_info < (3, 0):
@@ -75,152 +79,733 @@ WRAPPING_WORKFLOW7 = '"%s"'
 WRAPPING_WORKFLOW8 = ',"%s"'
 WRAPPING_WORKFLOW9 = "]\n    }\n  ]\n}"
 
+# Operators whose requests only read data, so that they can be sent again safely
+READ_ONLY_OPERATORS = frozenset(["oph_cubeschema", "oph_cubesize", "oph_list", "oph_explorecube", "oph_resume", "oph_get_config"])
 
-def submit(username, password, server, port, query):
-    try:
-        if sys.version_info < (2, 7, 9):
-            client = httplib.HTTPS(str(server) + ":" + str(port))
+DEFAULT_POOL_SIZE = 4
+DEFAULT_POOL_IDLE_TIMEOUT = 60
+
+READ_CHUNK_SIZE = 65536
+
+ACCEPT_ENCODING = "gzip, deflate"
+DEFAULT_COMPRESSION = True
+DEFAULT_COMPRESS_THRESHOLD = None
+
+STATUS_ERROR_TITLE = '"title": "ERROR"'
+STATUS_WORKFLOW_TITLE = '"title": "Workflow Status"'
+STATUS_MASSIVE_TITLE = '"title": "Massive Operation Status"'
+STATUS_ERROR_MESSAGE = '"message": "OPH_STATUS_ERROR"'
+STATUS_MESSAGE = '"message":'
+STATUS_MARKERS = (STATUS_ERROR_TITLE, STATUS_WORKFLOW_TITLE, STATUS_MASSIVE_TITLE, STATUS_ERROR_MESSAGE, STATUS_MESSAGE)
+
+
+class _PooledHTTPConnection(httplib.HTTPConnection):
+    """HTTP connection belonging to a pool"""
+
+    def __init__(self, pool):
+        httplib.HTTPConnection.__init__(self, pool.server, pool.port)
+        self.pool = pool
+        self.last_used = time.time()
+
+
+class _PooledHTTPSConnection(httplib.HTTPSConnection):
+    """HTTPS connection resuming the TLS session cached by the pool it belongs to"""
+
+    def __init__(self, pool):
+        httplib.HTTPSConnection.__init__(self, pool.server, pool.port, context=pool.context)
+        self.pool = pool
+        self.last_used = time.time()
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        if sys.version_info < (3, 6):
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host)
         else:
-            import ssl
-
-            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
-            context.verify_mode = ssl.CERT_NONE
-            client = httplib.HTTPSConnection(str(server), str(port), context=context)
-        client.putrequest("POST", "")
-        client.putheader("User-Agent", "Ophidia Python client")
-        client.putheader("Content-type", 'text/xml; charset="UTF-8"')
-    except Exception as e:
-        print(get_linenumber(), "Something went wrong in connection setup:", e)
-        return (None, None, None, 1, e)
-    request = str(query)
-    if not request.lstrip(" \n\t").startswith("{"):
-        wrapped_query = request.lstrip(" \n\t")
-        if not wrapped_query.startswith("operator="):
-            if not wrapped_query.startswith("oph_"):
-                return (None, None, None, 3, "Invalid request")
-        if wrapped_query.startswith("oph_"):
-            wrapped_query = "operator=" + wrapped_query[: wrapped_query.find(" ")] + ";" + wrapped_query[wrapped_query.find(" ") + 1 :]
-        query_list = re.split(r"(?![^\[]*\]);+", wrapped_query)
-        if not query_list:
-            return (None, None, None, 3, "Invalid request")
-        # operator
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] == "operator":
-                    request = WRAPPING_WORKFLOW1.replace("NAME", element_list[1]).replace("AUTHOR", str(username)).replace("COMMAND", request)
-                    operator = element_list[1]
-                    break
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=self.pool.tls_session)
+            self.pool.tls_session = self.sock.session
+
+
+class _PooledUnixConnection(httplib.HTTPConnection):
+    """HTTP connection over the UNIX-domain socket of the pool it belongs to"""
+
+    def __init__(self, pool):
+        httplib.HTTPConnection.__init__(self, "localhost")
+        self.pool = pool
+        self.last_used = time.time()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(self.timeout)
+        sock.connect(self.pool.path)
+        self.sock = sock
+
+
+class Transport(object):
+    """Transport() -> obj : interface of the objects carrying requests to the Ophidia server
+
+    submit() only needs the post() method, so any object implementing it (e.g. a fake transport returning canned replies in
+    tests) can be given as its pool argument or as transport of a Client.
+
+    Methods:
+        post(body, headers, sink, deadline=None) -> (status, reason, decoder) : Send a POST request with the given body and
+            headers; the body of a successful (200) reply is passed to sink(data) as it is received, through the returned
+            ContentDecoder. When deadline (as returned by time.time()) is given, DeadlineExceeded is raised if the reply is not
+            complete by then.
+        close() -> None : Release the resources held by the transport.
+    """
+
+    def post(self, body, headers, sink, deadline=None):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+def is_transport(obj):
+    """is_transport(obj) -> bool : return True if obj can carry requests, i.e. if it has a post() method like Transport, even if
+    it is not a subclass of it"""
+
+    return not isinstance(obj, str) and callable(getattr(obj, "post", None))
+
+
+class HTTPConnectionPool(Transport):
+    """HTTPConnectionPool(server, port, maxsize=4, idle_timeout=60) -> obj : transport based on a pool of keep-alive plain HTTP
+    connections to an Ophidia server, for trusted networks only since neither the credentials nor the data are encrypted
+
+    Connections idle for more than idle_timeout seconds are closed instead of being reused. Besides the arguments of
+    Transport.post, post() takes resend: if True, a request failed on a reused connection after being written is sent again on
+    a new one, which is safe only for requests that can be run twice.
+    """
+
+    scheme = "http"
+    _connection_class = _PooledHTTPConnection
+
+    def __init__(self, server, port, maxsize=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+        self.server = str(server)
+        self.port = int(port) if port is not None else None
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """acquire() -> (connection, reused) : return an idle connection, or a new one if none is available"""
+
+        now = time.time()
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if conn.sock is not None and (self.idle_timeout is None or now - conn.last_used <= self.idle_timeout):
+                    return conn, True
+                conn.close()
+        return self._connection_class(self), False
+
+    def release(self, conn, reusable=True):
+        """release(conn, reusable=True) -> None : give a connection back to the pool, closing it if it cannot be reused"""
+
+        if reusable and conn.sock is not None:
+            conn.last_used = time.time()
+            with self._lock:
+                if len(self._idle) < self.maxsize:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def clear(self):
+        """clear() -> None : close all idle connections"""
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def post(self, body, headers, sink, deadline=None, resend=False):
+        return _post(self, body, headers, sink, deadline, resend)
+
+    def close(self):
+        self.clear()
+
+
+class ConnectionPool(HTTPConnectionPool):
+    """ConnectionPool(server, port, maxsize=4, idle_timeout=60) -> obj : transport based on a pool of keep-alive HTTPS connections
+    to an Ophidia server (the default one)
+
+    All the connections of a pool share the same SSL context and resume the last negotiated TLS session, so that only the first
+    connection pays for a full handshake. Connections idle for more than idle_timeout seconds are closed instead of being reused.
+    """
+
+    scheme = "https"
+    _connection_class = _PooledHTTPSConnection
+
+    def __init__(self, server, port, maxsize=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+        import ssl
+
+        HTTPConnectionPool.__init__(self, server, port, maxsize, idle_timeout)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        self.context.verify_mode = ssl.CERT_NONE
+        self.tls_session = None
+
+    def post(self, body, headers, sink, deadline=None, resend=False):
+        if sys.version_info < (2, 7, 9):
+            return _post_legacy(self.server, self.port, body, headers, sink)
+        return _post(self, body, headers, sink, deadline, resend)
+
+
+class UnixConnectionPool(HTTPConnectionPool):
+    """UnixConnectionPool(path, maxsize=4, idle_timeout=60) -> obj : transport based on a pool of keep-alive HTTP connections over
+    the UNIX-domain socket of an Ophidia server running on the same host
+
+    Connections idle for more than idle_timeout seconds are closed instead of being reused.
+    """
+
+    scheme = "unix"
+    _connection_class = _PooledUnixConnection
+
+    def __init__(self, path, maxsize=DEFAULT_POOL_SIZE, idle_timeout=DEFAULT_POOL_IDLE_TIMEOUT):
+        HTTPConnectionPool.__init__(self, "localhost", None, maxsize, idle_timeout)
+        self.path = str(path)
+
+
+TRANSPORTS = {"https": ConnectionPool, "http": HTTPConnectionPool, "unix": UnixConnectionPool}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(username, password, server, port, maxsize=None, idle_timeout=None, scheme="https"):
+    """get_pool(username, password, server, port, maxsize=None, idle_timeout=None, scheme='https') -> HTTPConnectionPool : return
+    the connection pool shared by all requests with the same transport scheme ('https', 'http' or 'unix'), server, credentials
+    and pool settings, creating it if needed. For the 'unix' scheme, server is the path of the socket and port is ignored.
+    maxsize and idle_timeout default to DEFAULT_POOL_SIZE and DEFAULT_POOL_IDLE_TIMEOUT; clients asking for different
+    settings get different pools, so that none of them overrides the settings of the others."""
+
+    if scheme not in TRANSPORTS:
+        raise ValueError("Unknown transport: " + str(scheme))
+    if maxsize is None:
+        maxsize = DEFAULT_POOL_SIZE
+    if idle_timeout is None:
+        idle_timeout = DEFAULT_POOL_IDLE_TIMEOUT
+    key = (scheme, str(server), str(port), str(username), str(password), maxsize, idle_timeout)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if scheme == "unix":
+                pool = _pools[key] = UnixConnectionPool(server, maxsize, idle_timeout)
+            else:
+                pool = _pools[key] = TRANSPORTS[scheme](server, port, maxsize, idle_timeout)
+    return pool
+
+
+def close_pools():
+    """close_pools() -> None : close the idle connections of all pools"""
+
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.clear()
+
+
+class TransferStats(object):
+    """TransferStats() -> obj : counters of the bytes exchanged with the Ophidia server, on the wire and before HTTP compression
+
+    Attributes:
+        requests: Number of requests sent
+        sent_bytes: Bytes of request bodies sent on the wire
+        sent_raw_bytes: Bytes of request bodies before compression
+        received_bytes: Bytes of response bodies received from the wire
+        received_raw_bytes: Bytes of response bodies after decompression
+
+    Methods:
+        saved_bytes() -> int : Return the number of bytes that compression kept off the wire.
+        reset() -> None : Set all counters to zero.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def add(self, sent, sent_raw, received, received_raw):
+        """add(sent, sent_raw, received, received_raw) -> None : account for a request/response exchange"""
+
+        with self._lock:
+            self.requests += 1
+            self.sent_bytes += sent
+            self.sent_raw_bytes += sent_raw
+            self.received_bytes += received
+            self.received_raw_bytes += received_raw
+
+    def saved_bytes(self):
+        """saved_bytes() -> int : return the number of bytes that compression kept off the wire"""
+
+        return (self.sent_raw_bytes - self.sent_bytes) + (self.received_raw_bytes - self.received_bytes)
+
+    def reset(self):
+        """reset() -> None : set all counters to zero"""
+
+        with self._lock:
+            self.requests = 0
+            self.sent_bytes = 0
+            self.sent_raw_bytes = 0
+            self.received_bytes = 0
+            self.received_raw_bytes = 0
+
+    def __repr__(self):
+        return "TransferStats(requests=%d, sent_bytes=%d, sent_raw_bytes=%d, received_bytes=%d, received_raw_bytes=%d)" % (
+            self.requests,
+            self.sent_bytes,
+            self.sent_raw_bytes,
+            self.received_bytes,
+            self.received_raw_bytes,
+        )
+
+
+class ContentDecoder(object):
+    """ContentDecoder(encoding, sink) -> obj : streaming decoder of a response body sent with the given Content-Encoding
+
+    Data passed to feed() are decompressed on the fly and handed over to sink; received and decoded count the bytes before and
+    after decompression.
+    """
+
+    def __init__(self, encoding, sink):
+        self.encoding = (encoding or "identity").strip().lower()
+        self.sink = sink
+        self.received = 0
+        self.decoded = 0
+        if self.encoding in ("gzip", "x-gzip"):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == "deflate":
+            # The stream is zlib-wrapped or raw, as sent by some servers: this is known once its first two bytes are received
+            self._decompressor = None
+            self._head = b""
+        elif self.encoding == "identity":
+            self._decompressor = None
         else:
-            return (None, None, None, 3, "Invalid request")
-        # sessionid
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] == "sessionid":
-                    request += WRAPPING_WORKFLOW2 + element_list[1] + WRAPPING_WORKFLOW2_1
-                    break
-        # exec_mode
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] == "exec_mode":
-                    request += WRAPPING_WORKFLOW3 + element_list[1] + WRAPPING_WORKFLOW3_1
-                    break
-        # callback_url
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] == "callback_url":
-                    request += WRAPPING_WORKFLOW4 + element_list[1] + WRAPPING_WORKFLOW4_1
-                    break
-        # project
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] == "project":
-                    request += WRAPPING_WORKFLOW5 + element_list[1] + WRAPPING_WORKFLOW5_1
-                    break
-        request += WRAPPING_WORKFLOW6 + operator + WRAPPING_WORKFLOW6_1
-        # all remaining arguments
-        step = 0
-        for element in query_list:
-            if element:
-                element_list = element.split("=", 1)
-                if element_list[0] != "operator" and element_list[0] != "sessionid" and element_list[0] != "exec_mode" and element_list[0] != "callback_url" and element_list[0] != "project":
-                    step += 1
-                    if step == 1:
-                        request += WRAPPING_WORKFLOW7.replace("%s", element)
-                    else:
-                        request += WRAPPING_WORKFLOW8.replace("%s", element)
-        request += WRAPPING_WORKFLOW9
+            raise ValueError("Unsupported content encoding: " + self.encoding)
+
+    def feed(self, data):
+        self.received += len(data)
+        if self.encoding == "deflate" and self._decompressor is None:
+            data = self._head = self._head + data
+            if len(data) < 2:
+                return
+            zlib_header = (ord(data[0:1]) & 0x0F) == 8 and (ord(data[0:1]) * 256 + ord(data[1:2])) % 31 == 0
+            self._decompressor = zlib.decompressobj() if zlib_header else zlib.decompressobj(-zlib.MAX_WBITS)
+            self._head = None
+        if self._decompressor is not None:
+            data = self._decompressor.decompress(data)
+        if data:
+            self.decoded += len(data)
+            self.sink(data)
+
+    def close(self):
+        if self.encoding == "deflate" and self._decompressor is None and self._head:
+            raise zlib.error("Incomplete deflate stream")
+        if self._decompressor is not None:
+            data = self._decompressor.flush()
+            if data:
+                self.decoded += len(data)
+                self.sink(data)
+
+
+def _compress(body):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+class DeadlineExceeded(socket.timeout):
+    """Raised when the deadline of a request expires before the reply of the server is complete"""
 
+
+def _remaining(deadline):
+    # Number of seconds left before the deadline, or the default socket timeout if there is no deadline
+    if deadline is None:
+        return socket.getdefaulttimeout()
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded("deadline exceeded")
+    return remaining
+
+
+def _set_timeout(conn, timeout):
+    # Applied to new connections when they connect and to pooled ones straight away, which may still have the timeout of
+    # a previous request
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+
+
+def _post(pool, body, headers, sink, deadline=None, resend=False):
+    # A connection taken from the pool may have been closed by the server in the meantime: in this case the request
+    # is sent again, once, on a brand new connection, provided that it could not be fully written or that resend is True
+    # (e.g. for read-only operators), since otherwise the server may have already run it. Connect, send and read
+    # operations are all bounded by the time left before the deadline, if any
+    while True:
+        conn, reused = pool.acquire()
+        written = False
+        try:
+            _set_timeout(conn, _remaining(deadline))
+            conn.request("POST", "", body, headers)
+            written = True
+            _set_timeout(conn, _remaining(deadline))
+            res = conn.getresponse()
+        except (httplib.HTTPException, socket.error) as e:
+            conn.close()
+            if reused and not isinstance(e, socket.timeout) and (resend or not written):
+                continue
+            raise
+        break
     try:
-        # Escape &, <, > and \n chars for http
-        request = request.replace("&", "&amp;")
-        request = request.replace("<", "&lt;")
-        request = request.replace(">", "&gt;")
-        request = request.replace("\n", "&#xA;")
-        soapMessage = SOAP_MESSAGE_TEMPLATE % request
-        client.putheader("Content-length", "%d" % len(soapMessage))
-        client.putheader("SOAPAction", '""')
-        user = str(username) + ":" + str(password)
-
-        if sys.version_info < (3, 0):
-            auth = "Basic " + base64.b64encode(user)
-        else:
-            auth = "Basic " + base64.b64encode(bytes(user, "utf-8")).decode("ISO-8859-1")
+        # The body of a successful reply is decompressed and handed over to the sink chunk by chunk, as soon as it is received
+        decoder = ContentDecoder(res.getheader("Content-Encoding"), sink)
+        while True:
+            if deadline is not None:
+                _set_timeout(conn, _remaining(deadline))
+            chunk = res.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if res.status == 200:
+                decoder.feed(chunk)
+        decoder.close()
+    except Exception:
+        conn.close()
+        raise
+    pool.release(conn, not res.will_close)
+    return res.status, res.reason, decoder
+
+
+def _post_legacy(server, port, body, headers, sink):
+    client = httplib.HTTPS(str(server) + ":" + str(port))
+    client.putrequest("POST", "")
+    for key, value in headers.items():
+        client.putheader(key, value)
+    client.putheader("Content-length", "%d" % len(body))
+    client.endheaders()
+    client.send(body)
+    statuscode, statusmessage, header = client.getreply()
+    reply = client.getfile().read()
+    decoder = ContentDecoder(header.getheader("Content-Encoding"), sink)
+    if statuscode == 200:
+        decoder.feed(reply)
+    return statuscode, statusmessage, decoder
+
+
+class EnvelopeReader(object):
+    """EnvelopeReader() -> obj : incremental parser of the SOAP envelope returned by the Ophidia server
+
+    Data are passed to feed() as they arrive from the network and are parsed on the fly: jobid and error are extracted as soon as
+    they are found, the status markers are looked for while the text of the response element is collected and the text itself is
+    joined into a single, already decoded, string only once, when close() is called.
+
+    Attributes:
+        jobid: content of the jobid element
+        error: content of the error element, as an integer
+        response: content of the response element (JSON string)
+        markers: set of STATUS_MARKERS found in the response
+    """
+
+    _MARKER_TAIL = max(len(marker) for marker in STATUS_MARKERS) - 1
+
+    def __init__(self):
+        self.jobid = None
+        self.error = None
+        self.response = None
+        self.markers = set()
+        self._inside = False
+        self._done = False
+        self._depth = 0
+        self._field = None
+        self._text = []
+        self._tail = ""
+        # The server sends UTF-8 data regardless of the encoding declared in the envelope
+        self._parser = expat.ParserCreate("UTF-8", " ")
+        self._parser.buffer_text = True
+        self._parser.buffer_size = READ_CHUNK_SIZE
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+
+    def feed(self, data):
+        self._parser.Parse(data, False)
+
+    def close(self):
+        self._parser.Parse(b"", True)
+        self._parser = None
+
+    def _start(self, name, attrs):
+        if self._inside:
+            self._depth += 1
+            if self._depth == 1:
+                self._field = name.rsplit(" ", 1)[-1]
+                self._text = []
+        elif not self._done and name == "urn:oph ophResponse":
+            self._inside = True
+            self._depth = 0
 
-        client.putheader("Authorization", auth)
-        client.endheaders()
+    def _end(self, name):
+        if not self._inside:
+            return
+        if self._depth == 0:
+            self._inside = False
+            self._done = True
+            return
+        if self._depth == 1 and self._field is not None:
+            text = "".join(self._text) if self._text else None
+            self._text = []
+            if self._field == "jobid" and self.jobid is None:
+                self.jobid = text
+            elif self._field == "error" and self.error is None and text is not None:
+                self.error = int(text)
+            elif self._field == "response" and self.response is None:
+                self.response = text
+            self._field = None
+        self._depth -= 1
 
-        if sys.version_info < (3, 0):
-            client.send(soapMessage)
-            if sys.version_info < (2, 7, 9):
-                statuscode, statusmessage, header = client.getreply()
-                reply = client.getfile().read()
+    def _data(self, text):
+        if self._inside and self._depth == 1 and self._field is not None:
+            self._text.append(text)
+            if self._field == "response":
+                self._scan(text)
+
+    def _scan(self, text):
+        # Markers may span two consecutive chunks, so the end of the previous chunk is kept and checked together with this one
+        boundary = self._tail + text[: self._MARKER_TAIL]
+        for marker in STATUS_MARKERS:
+            if marker not in self.markers and (marker in boundary or marker in text):
+                self.markers.add(marker)
+        self._tail = (self._tail + text[-self._MARKER_TAIL :])[-self._MARKER_TAIL :]
+
+
+_WORKFLOW_KEYS = ("operator", "sessionid", "exec_mode", "callback_url", "project")
+_WRAPPING_HEADER = WRAPPING_WORKFLOW1.replace("NAME", "%(name)s").replace("AUTHOR", "%(author)s").replace("COMMAND", "%(command)s")
+_WRAPPING_PARAMETERS = (
+    ("sessionid", WRAPPING_WORKFLOW2, WRAPPING_WORKFLOW2_1),
+    ("exec_mode", WRAPPING_WORKFLOW3, WRAPPING_WORKFLOW3_1),
+    ("callback_url", WRAPPING_WORKFLOW4, WRAPPING_WORKFLOW4_1),
+    ("project", WRAPPING_WORKFLOW5, WRAPPING_WORKFLOW5_1),
+)
+_BRACKETS = re.compile(r"([\[\]])")
+_XML_ESCAPES = {"&": "&amp;", "<": "&lt;", ">": "&gt;", "\n": "&#xA;"}
+_XML_SPECIAL = re.compile("[&<>\n]")
+_SOAP_MESSAGE_HEAD, _SOAP_MESSAGE_TAIL = SOAP_MESSAGE_TEMPLATE.split("%s")
+if sys.version_info >= (3, 0):
+    _SOAP_MESSAGE_HEAD = bytes(_SOAP_MESSAGE_HEAD, "utf-8")
+    _SOAP_MESSAGE_TAIL = bytes(_SOAP_MESSAGE_TAIL, "utf-8")
+
+
+def _split_arguments(text):
+    # Split on ';' except within [...] lists, like re.split(r"(?![^\[]*\]);+", text) but in linear time: a ';' is a
+    # separator unless the first bracket following it is a closing one. Empty elements are discarded.
+    parts = _BRACKETS.split(text)
+    elements = []
+    current = []
+    last = len(parts) - 1
+    for index, part in enumerate(parts):
+        if index % 2 or (index < last and parts[index + 1] == "]"):
+            current.append(part)
+            continue
+        pieces = part.split(";")
+        current.append(pieces[0])
+        for piece in pieces[1:]:
+            elements.append("".join(current))
+            current = [piece]
+    elements.append("".join(current))
+    return [element for element in elements if element]
+
+
+class Query(object):
+    """Query(query) -> obj : request for the Ophidia server, parsed once from a string like 'operator=myoperator;param1=value1;'
+    or 'myoperator param1=value1;', or given as a JSON workflow
+
+    Attributes:
+        command: Original query string
+        workflow: JSON workflow string, if the query is already a workflow (all the other attributes are None in this case)
+        operator: Name of the operator
+        sessionid: Session ID, None if not given
+        exec_mode: Execution mode, None if not given
+        callback_url: Callback URL, None if not given
+        project: Project ID, None if not given
+        arguments: List of all the other 'param=value' arguments
+        name: Name of the workflow wrapping the query (default is None, the name of the operator)
+
+    Methods:
+        to_workflow(username) -> str : Return the JSON workflow to be sent to the server.
+    """
+
+    def __init__(self, query):
+        """Query(query) -> obj
+        :param query: query like 'operator=myoperator;param1=value1;' or 'myoperator param1=value1;', or JSON workflow
+        :type query: str
+        :returns: None
+        :rtype: None
+        :raises: ValueError
+        """
+
+        self.command = str(query)
+        self.workflow = None
+        self.operator = None
+        self.sessionid = None
+        self.exec_mode = None
+        self.callback_url = None
+        self.project = None
+        self.arguments = []
+        self.name = None
+        text = self.command.lstrip(" \n\t")
+        if text.startswith("{"):
+            self.workflow = self.command
+            return
+        if text.startswith("oph_"):
+            index = text.find(" ")
+            if index == -1:
+                text = "operator=" + text
+            else:
+                text = "operator=" + text[:index] + ";" + text[index + 1 :]
+        elif not text.startswith("operator="):
+            raise ValueError("Invalid request")
+        for element in _split_arguments(text):
+            key = element.split("=", 1)[0]
+            if key in _WORKFLOW_KEYS:
+                # Only the first occurrence of workflow-level parameters is considered
+                if getattr(self, key) is None:
+                    if key == element:
+                        raise ValueError("Invalid request: missing value of " + key)
+                    setattr(self, key, element[len(key) + 1 :])
             else:
-                _res = client.getresponse()
-                statuscode, statusmessage = _res.status, _res.reason
-                reply = _res.read()
+                self.arguments.append(element)
+        if self.operator is None:
+            raise ValueError("Invalid request: missing operator")
+
+    def to_workflow(self, username):
+        """to_workflow(username) -> str : return the JSON workflow wrapping the query, to be sent to the server
+        :param username: Ophidia username, used as author of the workflow
+        :type username: str
+        :returns: JSON workflow
+        :rtype: str
+        """
+
+        if self.workflow is not None:
+            return self.workflow
+        parts = [_WRAPPING_HEADER % {"name": self.name or self.operator, "author": str(username), "command": self.command}]
+        for key, prefix, suffix in _WRAPPING_PARAMETERS:
+            value = getattr(self, key)
+            if value is not None:
+                parts.extend((prefix, value, suffix))
+        parts.extend((WRAPPING_WORKFLOW6, self.operator, WRAPPING_WORKFLOW6_1))
+        if self.arguments:
+            parts.extend(('"', '","'.join(self.arguments), '"'))
+        parts.append(WRAPPING_WORKFLOW9)
+        return "".join(parts)
+
+    def __str__(self):
+        return self.command
+
+
+def _wrap_query(username, query):
+    if not isinstance(query, Query):
+        try:
+            query = Query(query)
+        except ValueError:
+            return None
+    return query.to_workflow(username)
+
+
+def _build_message(username, password, request):
+    # Escape &, <, > and \n chars for http, in a single pass
+    request = _XML_SPECIAL.sub(lambda match: _XML_ESCAPES[match.group()], request)
+    user = str(username) + ":" + str(password)
+
+    if sys.version_info < (3, 0):
+        auth = "Basic " + base64.b64encode(user)
+        soapMessage = _SOAP_MESSAGE_HEAD + request + _SOAP_MESSAGE_TAIL
+    else:
+        auth = "Basic " + base64.b64encode(bytes(user, "utf-8")).decode("ISO-8859-1")
+        soapMessage = _SOAP_MESSAGE_HEAD + request.encode("utf-8") + _SOAP_MESSAGE_TAIL
+
+    headers = {
+        "User-Agent": "Ophidia Python client",
+        "Content-type": 'text/xml; charset="UTF-8"',
+        "SOAPAction": '""',
+        "Authorization": auth,
+    }
+    return soapMessage, headers
+
+
+def _negotiate(body, headers, compression=DEFAULT_COMPRESSION, compress_threshold=DEFAULT_COMPRESS_THRESHOLD):
+    # Ask for a compressed response and, when the request is large enough, compress the request body as well
+    if compression:
+        headers["Accept-Encoding"] = ACCEPT_ENCODING
+    if compress_threshold is not None and len(body) >= compress_threshold:
+        body = _compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body
+
+
+def submit(username, password, server, port, query, pool=None, compression=DEFAULT_COMPRESSION, compress_threshold=DEFAULT_COMPRESS_THRESHOLD, stats=None, deadline=None):
+    if not isinstance(query, Query):
+        try:
+            query = Query(query)
+        except ValueError:
+            return (None, None, None, 3, "Invalid request")
+    request = query.to_workflow(username)
+
+    try:
+        soapMessage, headers = _build_message(username, password, request)
+        raw_size = len(soapMessage)
+        reader = EnvelopeReader()
+
+        if pool is None:
+            pool = get_pool(username, password, server, port)
+        soapMessage = _negotiate(soapMessage, headers, compression, compress_threshold)
+        if isinstance(pool, HTTPConnectionPool):
+            # Only the requests of read-only operators are sent again when a pooled connection fails after writing them
+            statuscode, statusmessage, decoder = pool.post(soapMessage, headers, reader.feed, deadline, query.operator in READ_ONLY_OPERATORS)
         else:
-            client.send(bytes(soapMessage, "utf-8"))
-            _res = client.getresponse()
-            statuscode, statusmessage = _res.status, _res.reason
-            reply = _res.read()
+            statuscode, statusmessage, decoder = pool.post(soapMessage, headers, reader.feed, deadline)
+        if stats is not None:
+            stats.add(len(soapMessage), raw_size, decoder.received, decoder.decoded)
 
         if statuscode != 200:
             print(get_linenumber(), "Something went wrong in submitting the request:", statuscode, statusmessage)
             return (None, None, None, 1, statusmessage)
 
-        xmltree = ET.fromstring(reply)
-        response = xmltree.findall(".//oph:ophResponse", namespaces={"oph": "urn:oph"})[0]
-        res_error, res_response, res_jobid = None, None, None
-        if len(response.findall("jobid")) > 0 and response.findall("jobid")[0].text is not None:
-            res_jobid = response.findall("jobid")[0].text
-        if len(response.findall("error")) > 0 and response.findall("error")[0].text is not None:
-            res_error = int(response.findall("error")[0].text)
-        if len(response.findall("response")) > 0 and response.findall("response")[0].text is not None:
-            res_response = response.findall("response")[0].text
+        reader.close()
     except Exception as e:
+        if deadline is not None and isinstance(e, socket.timeout) and not isinstance(e, DeadlineExceeded):
+            e = DeadlineExceeded("deadline exceeded")
         print(get_linenumber(), "Something went wrong in submitting the request:", e)
         return (None, None, None, 1, e)
+    return _make_result(reader)
+
+
+def _decode_response(text):
+    # gSOAP sends each byte of the UTF-8 response as a latin-1 character, so the bytes are joined back and decoded again; text
+    # not encoded this way (i.e. not made of latin-1 characters forming valid UTF-8) is returned as it is
+    try:
+        return text.encode("ISO-8859-1").decode("UTF-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return text
+
+
+def _make_result(reader):
+    res_error, res_response, res_jobid, markers = reader.error, reader.response, reader.jobid, reader.markers
     if res_error is None:
         return (None, None, None, 1, "Invalid response")
     if res_error == OPH_SERVER_OK:
         response, jobid, newsession, return_value, error = None, None, None, 0, None
         if res_response is not None:
+            res_response = _decode_response(res_response)
             if (
-                '"title": "ERROR"' in res_response
-                or ('"title": "Workflow Status"' in res_response and '"message": "OPH_STATUS_ERROR"' in res_response)
-                or ('"title": "Massive Operation Status"' in res_response and '"message": "OPH_STATUS_ERROR"' in res_response)
+                STATUS_ERROR_TITLE in markers
+                or (STATUS_WORKFLOW_TITLE in markers and STATUS_ERROR_MESSAGE in markers)
+                or (STATUS_MASSIVE_TITLE in markers and STATUS_ERROR_MESSAGE in markers)
             ):
-                if '"title": "Workflow Status"' in res_response:
+                if STATUS_WORKFLOW_TITLE in markers:
                     error = "There was an error in one or more workflow tasks"
-                elif '"title": "Massive Operation Status"' in res_response:
+                elif STATUS_MASSIVE_TITLE in markers:
                     error = "There was an error in one or more tasks of the massive operation"
                 else:
-                    if '"message":' in res_response:
+                    if STATUS_MESSAGE in markers:
                         try:
                             a = res_response.index('"message": "') + len('"message": "')
                             b = res_response.index('\\n"', a)
@@ -230,9 +815,9 @@ def submit(username, password, server, port, query):
                     else:
                         error = "There was an error in the task"
             if sys.version_info < (3, 0):
-                response = str(res_response.encode("ISO-8859-1"))
+                response = res_response.encode("UTF-8")
             else:
-                response = str(res_response.encode("ISO-8859-1").decode("UTF-8"))
+                response = res_response
         if res_jobid is not None:
             if len(res_jobid) != 0:
                 jobid = str(res_jobid)
@@ -0,0 +1,589 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import binascii
+import json
+import re
+from json.decoder import scanstring
+
+# Grids whose rows are not decoded with the rest of the response, but kept as a span of the JSON string (see Rows)
+STREAMED_OBJKEYS = ("explorecube_data", "explorecube_dimvalues")
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRUCTURAL = re.compile(r'["\[\]{}]')
+_ROW_END = re.compile(r'"\s*(?:,\s*"[^"\\]*"\s*)*\]')
+_row_starts = {}
+
+
+def _row_start(index):
+    # Return the pattern matching the start of a row up to the opening quote of the cell in the given column
+    pattern = _row_starts.get(index)
+    if pattern is None:
+        pattern = _row_starts[index] = re.compile(r'\s*,?\s*\[(?:\s*"[^"\\]*"\s*,){%d}\s*"' % index)
+    return pattern
+
+
+def _skip(raw, pos):
+    # Return the position following the array or object starting at pos. Strings are skipped by looking for their closing
+    # quote, so that long ones (e.g. base64 cells) are neither matched character by character nor copied
+    depth = 0
+    while True:
+        match = _STRUCTURAL.search(raw, pos)
+        if match is None:
+            raise ValueError("Unterminated value in the response")
+        pos = match.end()
+        char = match.group()
+        if char == '"':
+            stop = raw.find('"', pos)
+            while stop != -1 and raw[stop - 1] == "\\" and (stop - len(raw[pos:stop].rstrip("\\")) - pos) % 2 == 1:
+                stop = raw.find('"', stop + 1)
+            if stop == -1:
+                raise ValueError("Unterminated string in the response")
+            pos = stop + 1
+        elif char == "[" or char == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+class _Scanner(object):
+    # Incremental reader of a JSON string: values are decoded one at a time from the current position, or skipped without
+    # building them, so that the caller chooses what to keep
+
+    __slots__ = ("raw", "pos", "_decoder")
+
+    def __init__(self, raw, pos=0):
+        self.raw = raw
+        self.pos = pos
+        self._decoder = json.JSONDecoder()
+
+    def peek(self):
+        self.pos = _WHITESPACE.match(self.raw, self.pos).end()
+        return self.raw[self.pos : self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expecting '%s' at position %d of the response" % (char, self.pos))
+        self.pos += 1
+
+    def string(self):
+        self.expect('"')
+        value, self.pos = scanstring(self.raw, self.pos)
+        return value
+
+    def value(self):
+        self.peek()
+        value, self.pos = self._decoder.raw_decode(self.raw, self.pos)
+        return value
+
+    def skip(self):
+        # Arrays and objects are skipped by matching their brackets, ignoring those within strings
+        if self.peek() not in ("[", "{"):
+            self.value()
+            return
+        self.pos = _skip(self.raw, self.pos)
+
+    def _next(self, closing):
+        # Move past the separator following an item, returning False at the end of the container
+        char = self.peek()
+        self.pos += 1
+        if char == closing:
+            return False
+        if char != ",":
+            raise ValueError("Expecting ',' or '%s' at position %d of the response" % (closing, self.pos - 1))
+        return True
+
+    def items(self):
+        # Yield the index of each item of an array, which must be read or skipped before the next one is requested
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            if not self._next("]"):
+                return
+            index += 1
+
+    def members(self):
+        # Yield the key of each member of an object, whose value must be read or skipped before the next key is requested
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.string()
+            self.expect(":")
+            yield key
+            if not self._next("}"):
+                return
+
+
+class Rows(object):
+    """Rows(raw, start, end) -> obj : rows of a large grid of a response (see STREAMED_OBJKEYS), kept as a span of the JSON string.
+    They behave as the list of rows, which is decoded when first accessed, while column() decodes a base64 column straight into
+    a NumPy array and never builds the rows
+
+    Methods:
+        column(index, dtype, first=False) -> numpy.ndarray : Return the values of a column of base64 cells as a NumPy array.
+    """
+
+    __slots__ = ("raw", "start", "end", "_rows", "_length")
+
+    def __init__(self, raw, start, end):
+        self.raw = raw
+        self.start = start
+        self.end = end
+        self._rows = None
+        self._length = None
+
+    def _escaped(self):
+        return self.raw.find("\\", self.start, self.end) != -1
+
+    def _list(self):
+        if self._rows is None:
+            self._rows = json.loads(self.raw[self.start : self.end])
+        return self._rows
+
+    def _spans(self, index):
+        # Yield the start and the end of the cell of the given column of each row. Cells must be strings without escape sequences
+        # (e.g. indexes, coordinates and base64 values), so that they are delimited by looking for quotes
+        raw = self.raw
+        end = self.end
+        start = _row_start(index)
+        pos = self.start + 1
+        while True:
+            match = start.match(raw, pos, end)
+            if match is None:
+                break
+            pos = match.end()
+            stop = raw.find('"', pos, end)
+            if stop == -1:
+                raise ValueError("Unterminated string in the response")
+            yield pos, stop
+            match = _ROW_END.match(raw, stop, end)
+            if match is None:
+                raise ValueError("Unexpected value at position %d of the response" % stop)
+            pos = match.end()
+        if _WHITESPACE.match(raw, pos, end).end() != end - 1:
+            raise ValueError("Unexpected value or missing column %d at position %d of the response" % (index, pos))
+
+    def _cells(self, index):
+        # Yield the cell of the given column of each row, decoding the rows only if they include escape sequences
+        if self._escaped():
+            for row in self._list():
+                yield row[index]
+            return
+        raw = self.raw
+        for start, stop in self._spans(index):
+            yield raw[start:stop]
+
+    def column(self, index, dtype, first=False):
+        """column(index, dtype, first=False) -> numpy.ndarray : return the values of a column of base64 cells as a NumPy array. The
+               rows are read twice: first to size the array from the length of the cells, then to decode each cell into its slot
+        :param index: index of the column
+        :type index: int
+        :param dtype: type of the values (e.g. 'f4')
+        :type dtype: str or numpy.dtype
+        :param first: if True, only the first value of each cell is decoded
+        :type first: bool
+        :returns: array of the values
+        :rtype: numpy.ndarray
+        :raises: ValueError
+        """
+
+        import numpy as np
+
+        dtype = np.dtype(dtype)
+        itemsize = dtype.itemsize
+        if first:
+            # Only the base64 characters encoding the first value are decoded
+            prefix = (itemsize + 2) // 3 * 4
+            size = len(self)
+        else:
+            size = 0
+            if self._escaped():
+                for cell in self._cells(index):
+                    size += len(cell.rstrip("=")) * 3 // 4
+            else:
+                raw = self.raw
+                for start, stop in self._spans(index):
+                    while stop > start and raw[stop - 1] == "=":
+                        stop -= 1
+                    size += (stop - start) * 3 // 4
+            if size % itemsize != 0:
+                raise ValueError("The cells of column %d do not hold values of %d bytes" % (index, itemsize))
+            size //= itemsize
+        values = np.empty(size, dtype=dtype)
+        buffer = values.view(np.uint8)
+        offset = 0
+        for cell in self._cells(index):
+            if first:
+                decoded = binascii.a2b_base64(cell[:prefix] + "==")[:itemsize]
+            else:
+                decoded = binascii.a2b_base64(cell + "==")
+            buffer[offset : offset + len(decoded)] = np.frombuffer(decoded, dtype=np.uint8)
+            offset += len(decoded)
+        if offset != buffer.size:
+            raise ValueError("The cells of column %d do not hold values of %d bytes" % (index, itemsize))
+        return values
+
+    def __len__(self):
+        if self._rows is not None:
+            return len(self._rows)
+        if self._length is None:
+            if self._escaped():
+                self._length = len(self._list())
+            else:
+                self._length = sum(1 for _ in self._spans(0))
+        return self._length
+
+    def __bool__(self):
+        return _Scanner(self.raw, self.start + 1).peek() != "]"
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        return iter(self._list())
+
+    def __getitem__(self, index):
+        return self._list()[index]
+
+    def __eq__(self, other):
+        return self._list() == (other._list() if isinstance(other, Rows) else other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Rows(%d bytes%s)" % (self.end - self.start, ", decoded" if self._rows is not None else "")
+
+
+class ResponseObject(object):
+    """ResponseObject(item) -> obj : compact record of an object (text, grid or digraph) included in a server response
+
+    Attributes:
+        objclass: Object class ('text', 'grid' or 'digraph')
+        objkey: Object key (e.g. 'status' or 'explorecube_data')
+        title: Title of the first content of the object
+        objcontent: List of contents of the object, as decoded from the response
+        content: First content of the object (dict)
+        message: Message of a text object
+        rowkeys: Column names of a grid object
+        rowfieldtypes: Column types of a grid object
+        rowvalues: Rows of a grid object
+        nodekeys: Node attribute names of a digraph object
+        nodevalues: Node attribute values of a digraph object
+        nodelinks: Links of a digraph object
+    """
+
+    __slots__ = ("objclass", "objkey", "title", "objcontent")
+
+    def __init__(self, item):
+        self.objclass = item.get("objclass")
+        self.objkey = item.get("objkey")
+        self.objcontent = item.get("objcontent") or []
+        self.title = self.objcontent[0].get("title") if self.objcontent else None
+
+    @property
+    def content(self):
+        return self.objcontent[0] if self.objcontent else {}
+
+    @property
+    def message(self):
+        return self.content.get("message")
+
+    @property
+    def rowkeys(self):
+        return self.content.get("rowkeys")
+
+    @property
+    def rowfieldtypes(self):
+        return self.content.get("rowfieldtypes")
+
+    @property
+    def rowvalues(self):
+        return self.content.get("rowvalues")
+
+    @property
+    def nodekeys(self):
+        return self.content.get("nodekeys")
+
+    @property
+    def nodevalues(self):
+        return self.content.get("nodevalues")
+
+    @property
+    def nodelinks(self):
+        return self.content.get("nodelinks")
+
+    def __repr__(self):
+        return "ResponseObject(objclass=%r, objkey=%r, title=%r)" % (self.objclass, self.objkey, self.title)
+
+
+class Response(object):
+    """Response(raw) -> obj : response received from the Ophidia server, keeping together the JSON string and the Python
+    dictionary decoded from it. The string is decoded only once, the first time the dictionary is needed, and the decoded
+    dictionary is shared by all the users of the response, which should not modify it. Objects are indexed by reading the string
+    incrementally, without decoding the rows of the grids in STREAMED_OBJKEYS, which are kept as Rows objects
+
+    Attributes:
+        raw: JSON string received from the server (or None)
+        parsed: Python dictionary decoded from raw (or None)
+        objects: List of ResponseObject records, one for each object of the response
+        extra: 'extra' section of the response (or None)
+
+    Methods:
+        find(objkey=None, title=None, objclass=None) -> ResponseObject : Return the first object with the given objkey and/or title
+            (and objclass, if given), or None.
+        find_all(objkey=None, title=None, objclass=None) -> list : Return all the objects with the given objkey and/or title (and
+            objclass, if given).
+        text(objkey=None, title=None) -> ResponseObject : Return the first text object with the given objkey and/or title, or None.
+        grid(objkey=None, title=None) -> ResponseObject : Return the first grid object with the given objkey and/or title, or None.
+        digraph(objkey=None, title=None) -> ResponseObject : Return the first digraph object with the given objkey and/or title, or
+            None.
+    """
+
+    __slots__ = ("raw", "_parsed", "_decoded", "_objects", "_extra", "_by_objkey", "_by_title")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._parsed = None
+        self._decoded = False
+        self._objects = None
+        self._extra = None
+        self._by_objkey = None
+        self._by_title = None
+
+    @property
+    def parsed(self):
+        if not self._decoded:
+            if self.raw is not None:
+                self._parsed = json.loads(self.raw)
+            self._decoded = True
+        return self._parsed
+
+    @property
+    def objects(self):
+        if self._objects is None:
+            self._index()
+        return self._objects
+
+    @property
+    def extra(self):
+        if self._objects is None:
+            self._index()
+        return self._extra
+
+    def _scan(self):
+        # Read the items of the response and its extra section from the JSON string, keeping the rows of large grids as Rows
+        scanner = _Scanner(self.raw)
+        items = []
+        for key in scanner.members():
+            if key == "response":
+                for _ in scanner.items():
+                    item = {}
+                    for name in scanner.members():
+                        if name == "objcontent" and item.get("objkey") in STREAMED_OBJKEYS:
+                            item[name] = self._scan_contents(scanner)
+                        else:
+                            item[name] = scanner.value()
+                    items.append(item)
+            elif key == "extra":
+                self._extra = scanner.value()
+            else:
+                scanner.skip()
+        return items
+
+    def _scan_contents(self, scanner):
+        contents = []
+        for _ in scanner.items():
+            content = {}
+            for name in scanner.members():
+                if name == "rowvalues" and scanner.peek() == "[":
+                    start = scanner.pos
+                    scanner.skip()
+                    content[name] = Rows(self.raw, start, scanner.pos)
+                else:
+                    content[name] = scanner.value()
+            contents.append(content)
+        return contents
+
+    def _index(self):
+        # Objects are indexed by objkey and by title in a single pass, so that any later lookup is a dictionary access. Unless
+        # the response is already decoded, the items are read from the string without decoding the rows of large grids
+        objects = []
+        by_objkey = {}
+        by_title = {}
+        if self._decoded or self.raw is None or _Scanner(self.raw).peek() != "{":
+            parsed = self.parsed
+            items = parsed.get("response", ()) if parsed is not None else ()
+            self._extra = parsed.get("extra") if parsed is not None else None
+        else:
+            items = self._scan()
+        for item in items:
+            obj = ResponseObject(item)
+            objects.append(obj)
+            by_objkey.setdefault(obj.objkey, []).append(obj)
+            by_title.setdefault(obj.title, []).append(obj)
+        self._by_objkey = by_objkey
+        self._by_title = by_title
+        self._objects = objects
+
+    def find_all(self, objkey=None, title=None, objclass=None):
+        """find_all(objkey=None, title=None, objclass=None) -> list : return all the objects with the given objkey and/or title (and
+               objclass, if given), in the order of the response. The list should not be modified
+        :param objkey: object key
+        :type objkey: str
+        :param title: title of the object
+        :type title: str
+        :param objclass: object class ('text', 'grid' or 'digraph')
+        :type objclass: str
+        :returns: list of ResponseObject
+        :rtype: list
+        :raises: ValueError
+        """
+
+        if self._objects is None:
+            self._index()
+        if objkey is not None:
+            found = self._by_objkey.get(objkey, ())
+            if title is not None:
+                found = [obj for obj in found if obj.title == title]
+        elif title is not None:
+            found = self._by_title.get(title, ())
+        else:
+            raise ValueError("objkey or title must be given")
+        if objclass is not None:
+            found = [obj for obj in found if obj.objclass == objclass]
+        return found
+
+    def find(self, objkey=None, title=None, objclass=None):
+        """find(objkey=None, title=None, objclass=None) -> ResponseObject : return the first object with the given objkey and/or title
+               (and objclass, if given)
+        :param objkey: object key
+        :type objkey: str
+        :param title: title of the object
+        :type title: str
+        :param objclass: object class ('text', 'grid' or 'digraph')
+        :type objclass: str
+        :returns: first matching object or None
+        :rtype: ResponseObject or None
+        :raises: ValueError
+        """
+
+        if self._objects is None:
+            self._index()
+        if objkey is not None:
+            found = self._by_objkey.get(objkey, ())
+        elif title is not None:
+            found = self._by_title.get(title, ())
+        else:
+            raise ValueError("objkey or title must be given")
+        for obj in found:
+            if (objclass is None or obj.objclass == objclass) and (title is None or obj.title == title):
+                return obj
+        return None
+
+    def text(self, objkey=None, title=None):
+        """text(objkey=None, title=None) -> ResponseObject : return the first text object with the given objkey and/or title, or None"""
+
+        return self.find(objkey, title, "text")
+
+    def grid(self, objkey=None, title=None):
+        """grid(objkey=None, title=None) -> ResponseObject : return the first grid object with the given objkey and/or title, or None"""
+
+        return self.find(objkey, title, "grid")
+
+    def digraph(self, objkey=None, title=None):
+        """digraph(objkey=None, title=None) -> ResponseObject : return the first digraph object with the given objkey and/or title, or
+        None"""
+
+        return self.find(objkey, title, "digraph")
+
+    def __repr__(self):
+        return "Response(%d bytes%s)" % (len(self.raw) if self.raw is not None else 0, ", decoded" if self._decoded else "")
+
+
+class Result(object):
+    """Result(request, response, jobid=None, session=None, return_value=0, error=None, status=None, exec_time=None, cube=None,
+    cwd=None, cdd=None) -> obj : immutable outcome of a single request submitted to the Ophidia server. Unlike the last_*
+    attributes of the Client, which are overwritten by each request, a Result can be safely kept and read by the thread that
+    submitted the request while other threads use the same Client.
+
+    Attributes:
+        request: Submitted query or workflow
+        response: Response received from the server (JSON string)
+        jobid: Job ID associated to the request
+        session: ID of the session returned with the response
+        return_value: Return value associated to the response
+        error: Error value associated to the response
+        status: Status of the response (e.g. 'SUCCESS'), if reported
+        exec_time: Execution time associated to the response, if reported
+        cube: PID of the cube produced by the request, if any
+        cwd: Current Working Directory reported in the response, if any
+        cdd: Current Data Directory reported in the response, if any
+
+    Methods:
+        get_response() -> Response : Return the response as a Response object.
+        deserialize_response() -> dict : Return the response as a Python dictionary, decoded only once.
+    """
+
+    __slots__ = ("request", "response", "jobid", "session", "return_value", "error", "status", "exec_time", "cube", "cwd", "cdd", "_response")
+
+    def __init__(self, request, response, jobid=None, session=None, return_value=0, error=None, status=None, exec_time=None, cube=None, cwd=None, cdd=None, indexed=None):
+        if indexed is None or indexed.raw is not response:
+            indexed = Response(response)
+        setattr_ = object.__setattr__
+        setattr_(self, "request", request)
+        setattr_(self, "response", response)
+        setattr_(self, "jobid", jobid)
+        setattr_(self, "session", session)
+        setattr_(self, "return_value", return_value)
+        setattr_(self, "error", error)
+        setattr_(self, "status", status)
+        setattr_(self, "exec_time", exec_time)
+        setattr_(self, "cube", cube)
+        setattr_(self, "cwd", cwd)
+        setattr_(self, "cdd", cdd)
+        setattr_(self, "_response", indexed)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Result objects are read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("Result objects are read-only")
+
+    def get_response(self):
+        """get_response() -> Response : return the response as a Response object"""
+
+        return self._response
+
+    def deserialize_response(self):
+        """deserialize_response() -> dict : return the response as a Python dictionary. The string is decoded only once and the same
+        dictionary is returned to all callers, so it should not be modified"""
+
+        return self._response.parsed
+
+    def __repr__(self):
+        return "Result(request=%r, jobid=%r, return_value=%r, cube=%r)" % (self.request, self.jobid, self.return_value, self.cube)
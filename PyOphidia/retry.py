@@ -0,0 +1,270 @@
+#
+#     PyOphidia - Python bindings for Ophidia
+#     Copyright (C) 2015-2023 CMCC Foundation
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+import threading
+import time
+import PyOphidia.ophsubmit as _ophsubmit
+
+READ_ONLY_OPERATORS = _ophsubmit.READ_ONLY_OPERATORS
+TRANSIENT_SERVER_ERRORS = (_ophsubmit.OPH_SERVER_IO_ERROR, _ophsubmit.OPH_SERVER_NO_RESPONSE)
+CIRCUIT_OPEN_ERROR = "Circuit breaker open: the server is not available"
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_JITTER = 0.5
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+
+def is_transient(result):
+    """is_transient(result) -> bool : return True if the (response, jobid, newsession, return_value, error) tuple returned by
+    ophsubmit.submit reports a failure that may not occur again, i.e. a connection error (but not an expired deadline) or an IO/no
+    response error of the server"""
+
+    return_value, error = result[3], result[4]
+    if return_value in TRANSIENT_SERVER_ERRORS:
+        return True
+    # Once the deadline of a request has expired, sending it again would only fail again
+    if isinstance(error, _ophsubmit.DeadlineExceeded):
+        return False
+    # Connection problems are reported with return value 1 and the exception as error
+    return return_value == 1 and isinstance(error, Exception)
+
+
+def operator_of(query):
+    """operator_of(query) -> str : return the name of the operator of a query, or None for workflows and invalid queries"""
+
+    try:
+        if not isinstance(query, _ophsubmit.Query):
+            query = _ophsubmit.Query(query)
+    except ValueError:
+        return None
+    return query.operator
+
+
+class CircuitBreaker(object):
+    """CircuitBreaker(failure_threshold=5, reset_timeout=30) -> obj : stop sending requests to a server that keeps failing
+
+    After failure_threshold consecutive transient failures the breaker opens and requests are rejected without contacting the
+    server. Once reset_timeout seconds have passed a single request is let through: the breaker closes again if it succeeds,
+    otherwise it stays open for another reset_timeout seconds.
+
+    Attributes:
+        failure_threshold: Number of consecutive failures opening the breaker
+        reset_timeout: Number of seconds after which an open breaker lets a request through
+        state: 'closed', 'open' or 'half-open'
+        failures: Current number of consecutive failures
+        trips: Number of times the breaker opened
+        rejections: Number of requests rejected while the breaker was open
+
+    Methods:
+        allow() -> bool : Return True if a request can be sent to the server.
+        record_success() -> None : Account for a request that reached the server.
+        record_failure() -> None : Account for a request that failed with a transient error.
+        reset() -> None : Close the breaker and reset its counters.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def allow(self):
+        """allow() -> bool : return True if a request can be sent to the server"""
+
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self._opened_at < self.reset_timeout:
+                    self.rejections += 1
+                    return False
+                self.state = "half-open"
+                self._probing = False
+            if self.state == "half-open":
+                # Only one request at a time probes a server that was down
+                if self._probing:
+                    self.rejections += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        """record_success() -> None : account for a request that reached the server"""
+
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """record_failure() -> None : account for a request that failed with a transient error"""
+
+        with self._lock:
+            self.failures += 1
+            if self.state == "half-open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.trips += 1
+                self._opened_at = time.time()
+                self._probing = False
+
+    def reset(self):
+        """reset() -> None : close the breaker and reset its counters"""
+
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.trips = 0
+            self.rejections = 0
+            self._opened_at = 0.0
+            self._probing = False
+
+    def __repr__(self):
+        return "CircuitBreaker(state=%s, failures=%d, trips=%d, rejections=%d)" % (self.state, self.failures, self.trips, self.rejections)
+
+
+class RetryPolicy(object):
+    """RetryPolicy(max_retries=3, backoff=0.5, max_backoff=30, jitter=0.5, deadline=None, operators=None, breaker=None) -> obj :
+    policy for sending again the requests that failed because of transient errors
+
+    Only requests for idempotent operators (by default the read-only operators in READ_ONLY_OPERATORS) are retried, waiting
+    backoff * 2^n seconds (at most max_backoff, reduced by a random fraction up to jitter) before the n-th retry. No retry is
+    started once deadline seconds have passed since the first attempt. When a CircuitBreaker is given, it is consulted before
+    every request, whatever the operator.
+
+    Attributes:
+        max_retries: Maximum number of retries for a single request (default is 3)
+        backoff: Delay in seconds before the first retry (default is 0.5)
+        max_backoff: Maximum delay in seconds between two attempts (default is 30)
+        jitter: Maximum fraction of the delay randomly removed from it, between 0 and 1 (default is 0.5)
+        deadline: Maximum number of seconds spent for a request, retries included (default is None, no limit)
+        operators: Set of operators whose requests can be retried (default is READ_ONLY_OPERATORS)
+        breaker: CircuitBreaker to be used, or None
+        calls: Number of requests executed with the policy
+        retries: Number of retries performed
+        recovered: Number of requests succeeded after one or more retries
+        exhausted: Number of retried requests that failed anyway
+
+    Methods:
+        execute(request, operator=None, deadline=None) -> tuple : Call request() until it succeeds or the policy gives up and return
+            its result.
+        delay(attempt) -> float : Return the number of seconds to wait before the given retry (starting from 0).
+        reset_counters() -> None : Reset calls, retries, recovered and exhausted counters.
+    """
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+        jitter=DEFAULT_JITTER,
+        deadline=None,
+        operators=None,
+        breaker=None,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.operators = READ_ONLY_OPERATORS if operators is None else frozenset(operators)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def delay(self, attempt):
+        """delay(attempt) -> float : return the number of seconds to wait before the given retry (starting from 0)"""
+
+        delay = min(self.max_backoff, self.backoff * (2**attempt))
+        return delay * (1.0 - self.jitter * random.random())
+
+    def _begin(self):
+        # Return the result of a rejected request if the circuit breaker is open, None otherwise
+        with self._lock:
+            self.calls += 1
+        if self.breaker is not None and not self.breaker.allow():
+            return (None, None, None, 1, CIRCUIT_OPEN_ERROR)
+        return None
+
+    def _next_delay(self, result, operator, attempt, started, deadline=None):
+        # Account for the outcome of an attempt and return the delay before the next one, or None if the result is final. The
+        # delay never goes beyond the deadline of the request (as returned by time.time()), if any
+        transient = is_transient(result)
+        if self.breaker is not None:
+            if transient:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        if not transient or operator not in self.operators:
+            if attempt > 0 and not transient:
+                with self._lock:
+                    self.recovered += 1
+            return None
+        delay = self.delay(attempt)
+        if attempt >= self.max_retries or (self.deadline is not None and time.time() + delay - started > self.deadline):
+            with self._lock:
+                self.exhausted += 1
+            return None
+        if self.breaker is not None and not self.breaker.allow():
+            with self._lock:
+                self.exhausted += 1
+            return None
+        if deadline is not None:
+            delay = max(0.0, min(delay, deadline - time.time()))
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def execute(self, request, operator=None, deadline=None):
+        """execute(request, operator=None, deadline=None) -> tuple : call request() until it succeeds or the policy gives up and
+               return its result. The waits between two attempts end by the deadline of the request, if given
+        :param request: function sending the request and returning a (response, jobid, newsession, return_value, error) tuple
+        :type request: function
+        :param operator: name of the operator of the request
+        :type operator: str
+        :param deadline: time (as returned by time.time()) by which the request must be complete, None for no limit
+        :type deadline: float
+        :returns: result of the last attempt
+        :rtype: tuple
+        """
+
+        rejected = self._begin()
+        if rejected is not None:
+            return rejected
+        started = time.time()
+        attempt = 0
+        while True:
+            result = request()
+            delay = self._next_delay(result, operator, attempt, started, deadline)
+            if delay is None:
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    def reset_counters(self):
+        """reset_counters() -> None : reset calls, retries, recovered and exhausted counters"""
+
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.recovered = 0
+            self.exhausted = 0
+
+    def __repr__(self):
+        return "RetryPolicy(calls=%d, retries=%d, recovered=%d, exhausted=%d)" % (self.calls, self.retries, self.recovered, self.exhausted)
@@ -0,0 +1,111 @@
+import json
+import socket
+
+import pytest
+
+from PyOphidia import client, cube, ophsubmit, response
+
+
+class FakeTransport(ophsubmit.Transport):
+    # Reply to each request with the given SOAP envelope, recording the body
+    # and the headers of the request
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = []
+
+    def post(self, body, headers, sink, deadline=None):
+        self.requests.append((body, headers))
+        if deadline is not None:
+            raise socket.timeout("timed out")
+        sink(self.reply)
+        return 200, "OK", ophsubmit.ContentDecoder(None, None)
+
+
+def schema(pid, measure):
+    return [
+        {"objclass": "grid", "objkey": "cubeschema_cubeinfo",
+         "objcontent": [{"title": "Datacube Information", "rowvalues": [
+             [pid, "2024-01-01", measure, "float", "1", "4", "file.nc"]]}]},
+        {"objclass": "grid", "objkey": "cubeschema_morecubeinfo",
+         "objcontent": [{"title": "Datacube Additional Information",
+                         "rowvalues": [[pid, "1", "4", "10", "12", "no",
+                                        "1.5", "MB", "480"]]}]},
+        {"objclass": "grid", "objkey": "cubeschema_diminfo",
+         "objcontent": [{"title": "Dimension Information", "rowvalues": [
+             ["time", "double", "12", "oph_time", "d", "yes", "1",
+              "-"]]}]},
+    ]
+
+
+def reply(objects):
+    return (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+            b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+            b'xmlns:oph="urn:oph"><SOAP-ENV:Body><oph:ophResponse>'
+            b'<error>0</error><response>' +
+            json.dumps({"response": objects}).encode() +
+            b'</response></oph:ophResponse></SOAP-ENV:Body>'
+            b'</SOAP-ENV:Envelope>')
+
+
+def resume(status, progress):
+    return json.dumps({"response": [
+        {"objclass": "text", "objkey": "workflow_status",
+         "objcontent": [{"title": "Workflow Status", "message": status}]},
+        {"objclass": "grid", "objkey": "workflow_progress",
+         "objcontent": [{"title": "Workflow Progress Ratio",
+                         "rowkeys": ["SUBMISSION DATE", "PROGRESS RATIO"],
+                         "rowvalues": [["2024-01-01 00:00:00",
+                                        str(progress)]]}]}]})
+
+
+def loggingbk(*rows):
+    return json.dumps({"response": [
+        {"objclass": "grid", "objkey": "loggingbk",
+         "objcontent": [{"title": "Workflows",
+                         "rowkeys": ["SESSION ID", "WORKFLOW ID",
+                                     "MARKER ID", "STATUS", "PROGRESS"],
+                         "rowvalues": [["1", str(workflowid), "1", status,
+                                        str(progress)]
+                                       for workflowid, status, progress
+                                       in rows]}]}]})
+
+
+OUTPUT = json.dumps({"response": [
+    {"objclass": "text", "objkey": "reduce",
+     "objcontent": [{"title": "Output Cube", "message": "http://host/1/2"}]}]})
+
+
+class FakeClient(object):
+    # Answer the queries of a job monitor with the given workflow statuses
+    # and loggingbk listings, in order
+    def __init__(self, statuses, listings=()):
+        self.statuses = list(statuses)
+        self.listings = list(listings)
+        self.queries = []
+
+    def _request(self, query, session=None):
+        self.queries.append((query, session))
+        if query.startswith("oph_loggingbk"):
+            if not self.listings:
+                raise RuntimeError("unknown operator")
+            return response.Result(query, loggingbk(*self.listings.pop(0)))
+        if "document_type=response" in query:
+            return response.Result(query, OUTPUT, cube="http://host/1/2")
+        return response.Result(query, resume(*self.statuses.pop(0)))
+
+
+@pytest.fixture
+def cube_client(request):
+    # Set a client submitting through the transport given by indirect
+    # parametrization (an empty reply by default) as the client of Cube
+    transport = getattr(request, "param", None) or FakeTransport(reply([]))
+    cube.Cube.client = client.Client("oph-user", "oph-passwd", "host",
+                                     "11732", transport=transport)
+    del transport.requests[:]
+    yield cube.Cube.client
+    cube.Cube.client = None
+
+
+@pytest.fixture
+def transport(cube_client):
+    return cube_client.transport
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import re
+import threading
+import zlib
+
+from PyOphidia import asyncclient, client
+
+
+def envelope(level):
+    return (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+            b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+            b'xmlns:oph="urn:oph"><SOAP-ENV:Body><oph:ophResponse>'
+            b'<error>0</error><response>' + json.dumps({"response": [
+                {"objclass": "text", "objkey": "level",
+                 "objcontent": [{"title": "Level", "message": level}]}
+            ]}).encode() + b'</response></oph:ophResponse></SOAP-ENV:Body>'
+            b'</SOAP-ENV:Envelope>')
+
+
+class Server(object):
+    # Reply to each request after level / 100 seconds with the level given
+    # in the query, framing the body as set by mode; drop closes the
+    # connection of the next request without replying, as a server failing
+    # after running it
+    def __init__(self, mode="length"):
+        self.mode = mode
+        self.drop = False
+        self.operators = []
+        self.connections = 0
+        self.inflight = self.max_inflight = 0
+        self.tasks = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.tasks.append(asyncio.current_task())
+        while True:
+            if not await reader.readline():
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            body = await reader.readexactly(length)
+            self.operators.append(re.search(br'"operator":"(\w+)"',
+                                            body).group(1).decode())
+            if self.drop:
+                self.drop = False
+                break
+            level = re.search(br'"level=(\d+)"', body).group(1).decode()
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+            await asyncio.sleep(int(level) / 100.0)
+            self.inflight -= 1
+            reply = envelope(level)
+            if self.mode == "chunked":
+                writer.write(b"HTTP/1.1 200 OK\r\n"
+                             b"Transfer-Encoding: chunked\r\n\r\n")
+                for i in range(0, len(reply), 100):
+                    part = reply[i:i + 100]
+                    writer.write(b"%x\r\n%s\r\n" % (len(part), part))
+                writer.write(b"0\r\n\r\n")
+            elif self.mode == "close":
+                writer.write(b"HTTP/1.0 200 OK\r\n\r\n" + reply)
+            else:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n"
+                             % len(reply) + reply)
+            await writer.drain()
+            if self.mode == "close":
+                break
+        writer.close()
+
+    async def stop(self):
+        self.server.close()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+def new_client(port, max_concurrency=2):
+    ophclient = client.Client("oph-user", "oph-passwd", "127.0.0.1", str(port),
+                              api_mode=False, transport="http")
+    return asyncclient.AsyncClient(ophclient, max_concurrency=max_concurrency)
+
+
+def level(response):
+    return response["response"][0]["objcontent"][0]["message"]
+
+
+def test_read_response():
+    async def read(data, status_line=b"HTTP/1.1 200 OK\r\n"):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        received = []
+        status, reason, will_close, decoder = \
+            await asyncclient._read_response(reader, status_line,
+                                             received.append)
+        return status, will_close, b"".join(received)
+
+    body = zlib.compress(b"x" * 1000)
+    chunked = b"".join(b"%x\r\n%s\r\n" % (len(body[i:i + 7]), body[i:i + 7])
+                       for i in range(0, len(body), 7))
+    assert asyncio.run(read(
+        b"Content-Encoding: deflate\r\nTransfer-Encoding: chunked\r\n\r\n" +
+        chunked + b"0\r\nTrailer: 1\r\n\r\n")) == (200, False, b"x" * 1000)
+    assert asyncio.run(read(b"Content-Length: 5\r\n\r\nhelloextra")) == \
+        (200, False, b"hello")
+    assert asyncio.run(read(b"\r\nhello world", b"HTTP/1.0 200 OK\r\n")) == \
+        (200, True, b"hello world")
+    assert asyncio.run(read(b"Content-Length: 5\r\n\r\nerror",
+                            b"HTTP/1.1 500 Error\r\n")) == (500, False, b"")
+
+
+def test_submit_many():
+    for mode in ("length", "chunked", "close"):
+        async def run():
+            server = Server(mode)
+            port = await server.start()
+            async with new_client(port) as ophclient:
+                responses = await ophclient.submit_many(
+                    ["oph_list level=%d;" % i for i in (5, 1, 4, 2, 3)])
+            await server.stop()
+            return server, [level(response) for response in responses]
+
+        server, levels = asyncio.run(run())
+        assert levels == ["5", "1", "4", "2", "3"]
+        assert server.max_inflight == 2
+        assert server.connections == (5 if mode == "close" else 2)
+
+
+def test_stale_connection():
+    async def run(operator):
+        server = Server()
+        port = await server.start()
+        async with new_client(port) as ophclient:
+            await ophclient.submit("oph_list level=0;")
+            server.drop = True
+            response = await ophclient.submit(operator + " level=0;")
+        await server.stop()
+        return server, response
+
+    server, response = asyncio.run(run("oph_list"))
+    assert level(response) == "0"
+    assert server.operators == ["oph_list"] * 3 and server.connections == 2
+    server, response = asyncio.run(run("oph_delete"))
+    assert response is None
+    assert server.operators == ["oph_list", "oph_delete"]
+
+
+def test_loops():
+    # The server runs in its own loop, so that the same AsyncClient can be
+    # used by two asyncio.run calls, each one with a new loop
+    server = Server()
+    loop = asyncio.new_event_loop()
+    port = loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        ophclient = new_client(port)
+        for i in range(2):
+            response = asyncio.run(ophclient.submit("oph_list level=0;"))
+            assert level(response) == "0"
+        assert server.connections == 2
+    finally:
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
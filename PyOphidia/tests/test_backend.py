@@ -0,0 +1,114 @@
+import base64
+import re
+import struct
+
+import pytest
+
+from PyOphidia import cube
+from PyOphidia.tests.conftest import FakeTransport, reply
+
+xr = pytest.importorskip("xarray")
+backend = pytest.importorskip("PyOphidia.backend")
+
+
+def indexes(microfilter, size):
+    # Return the 1-based indexes selected by a microfilter s, s:e or s:t:e
+    bounds = [int(x) for x in microfilter.split(":")]
+    if len(bounds) == 1:
+        return [bounds[0]]
+    step = bounds[1] if len(bounds) == 3 else 1
+    return list(range(bounds[0], bounds[-1] + 1, step))
+
+
+class HyperslabTransport(FakeTransport):
+    # Reply to each explorecube request with the hyperslab of a 4 x 3 cube
+    # (lat explicit, lon implicit) selected by index, with a tos value of
+    # 10 * lat + lon and -1 as _FillValue for lat 4
+    def post(self, body, headers, sink, deadline=None):
+        match = re.search(br"subset_filter=([0-9:]+)\|([0-9:]+)", body)
+        if match is None:
+            self.reply = reply([])
+            return FakeTransport.post(self, body, headers, sink, deadline)
+        lats = indexes(match.group(1).decode(), 4)
+        lons = indexes(match.group(2).decode(), 3)
+
+        def encode(fmt, values):
+            return base64.b64encode(struct.pack(str(len(values)) + fmt,
+                                                *values)).decode()
+
+        self.reply = reply([
+            {"objclass": "grid", "objkey": "explorecube_dimvalues",
+             "objcontent": [
+                 {"title": "lat", "rowkeys": ["INDEX", "lat"],
+                  "rowfieldtypes": ["int", "double"],
+                  "rowvalues": [[str(i), encode("d", [i * 1.5])]
+                                for i in lats]},
+                 {"title": "lon", "rowkeys": ["INDEX", "lon"],
+                  "rowfieldtypes": ["int", "double"],
+                  "rowvalues": [[str(i), encode("d", [i * 0.5])]
+                                for i in lons]}]},
+            {"objclass": "grid", "objkey": "explorecube_data",
+             "objcontent": [{"title": "tos",
+                             "rowkeys": ["INDEX", "lat", "tos"],
+                             "rowfieldtypes": ["int", "double", "float"],
+                             "rowvalues": [[str(i), str(i), encode(
+                                 "f", [10 * i + j if i < 4 else -1
+                                       for j in lons])] for i in lats]}]},
+            {"objclass": "grid", "objkey": "explorecube_metadata",
+             "objcontent": [{"title": "Metadata",
+                             "rowkeys": ["Key", "Value", "Variable",
+                                         "Type"],
+                             "rowvalues": [["_FillValue", "-1", "tos",
+                                            "float"],
+                                           ["title", "test", "", "text"]]}]},
+        ])
+        return FakeTransport.post(self, body, headers, sink, deadline)
+
+
+pytestmark = pytest.mark.parametrize(
+    "cube_client", [HyperslabTransport(reply([]))], indirect=True)
+
+
+@pytest.fixture
+def mycube(transport):
+    mycube = cube.Cube(pid="http://host/1/2")
+    mycube.measure, mycube.measure_type = "tos", "float"
+    mycube.dim_info = [
+        {"name": "lat", "size": "4", "array": "no", "hierarchy": "oph_base"},
+        {"name": "lon", "size": "3", "array": "yes", "hierarchy": "oph_base"},
+    ]
+    mycube.rowsxfrag = "2"
+    return mycube, transport.requests
+
+
+def test_lazy_dataset(mycube):
+    mycube, requests = mycube
+    ds = mycube.to_dataset(lazy=True)
+    assert len(requests) == 2
+    assert ds["lat"].values.tolist() == [1.5, 3.0, 4.5, 6.0]
+    assert ds["lon"].values.tolist() == [0.5, 1.0, 1.5]
+    assert ds.attrs == {"title": "test"}
+    assert ds["tos"].attrs == {"_FillValue": "-1"}
+    assert ds["tos"].encoding["preferred_chunks"] == {"lat": 2}
+
+    assert ds["tos"][1:3, 2].values.tolist() == [23.0, 33.0]
+    assert len(requests) == 3
+    assert b"subset_filter=2:3|3;" in requests[2][0]
+    assert ds["tos"][::-2, 0:3:2].values.tolist()[1] == [21.0, 23.0]
+    assert b"subset_filter=2:2:4|1:2:3;" in requests[3][0]
+    values = ds["tos"].values
+    assert values.shape == (4, 3) and values[0].tolist() == [11, 12, 13]
+    assert all(value != value for value in values[3])
+    assert ds["tos"][4:].values.shape == (0, 3)
+    assert len(requests) == 5
+
+
+def test_entrypoint(mycube):
+    mycube, requests = mycube
+    entrypoint = backend.OphidiaBackendEntrypoint()
+    assert entrypoint.guess_can_open("http://host/ophidia/1/2")
+    assert not entrypoint.guess_can_open("file.nc")
+    ds = xr.open_dataset(mycube, engine=backend.OphidiaBackendEntrypoint,
+                         drop_variables="lon")
+    assert "lon" not in ds.variables
+    assert ds["tos"].sel(lat=3.0).values.tolist() == [21.0, 22.0, 23.0]
@@ -0,0 +1,93 @@
+import pytest
+
+from PyOphidia import cache, response
+
+SESSION = "sessionid=http://host/sessions/1/experiment;"
+SCHEMA = "oph_cubeschema level=1;cube=http://host/1/1;ncores=1;" + SESSION
+LIST = "oph_list level=2;cwd=/;" + SESSION
+
+
+def result(query, return_value=0):
+    return response.Result(query, "{}", return_value=return_value,
+                           session="http://host/sessions/1/experiment")
+
+
+def test_normalized_key():
+    responses = cache.ResponseCache()
+    assert responses.get(SCHEMA) is None
+    responses.update(SCHEMA, result(SCHEMA))
+    hit = responses.get("oph_cubeschema cube=http://host/1/1;level=1;"
+                        "exec_mode=sync;" + SESSION)
+    assert hit is not None and hit.request == SCHEMA
+    assert responses.get("oph_cubeschema level=2;cube=http://host/1/1;" +
+                         SESSION) is None
+    responses.update("oph_man function=oph_list;cube=http://host/1/1;",
+                     result("oph_man"))
+    assert responses.get("oph_man function=oph_list;cube=http://host/1/2;"
+                         "cwd=/a;") is not None
+    for query in ("oph_cubeschema action=add;cube=http://host/1/1;",
+                  "oph_list level=2;exec_mode=async;"):
+        responses.update(query, result(query))
+        assert responses.get(query) is None
+    responses.update(LIST + "path=/x;", result(LIST, return_value=3))
+    assert responses.get(LIST + "path=/x;") is None
+    assert (responses.hits, responses.misses) == (2, 3)
+
+
+def test_lru_and_ttl():
+    responses = cache.ResponseCache(maxsize=2, ttls=dict(
+        cache.DEFAULT_TTLS, oph_list=-1))
+    for level in (1, 2, 3):
+        query = "oph_cubesize level=" + str(level) + ";cube=http://host/1/1;"
+        responses.update(query, result(query))
+        responses.get("oph_cubesize level=1;cube=http://host/1/1;")
+    assert len(responses) == 2 and responses.evictions == 1
+    assert responses.get("oph_cubesize level=2;cube=http://host/1/1;") \
+        is None
+    responses.update(LIST, result(LIST))
+    assert responses.get(LIST) is None and responses.invalidations == 1
+
+
+def test_invalidation():
+    responses = cache.ResponseCache()
+    other = SCHEMA.replace("/1/1", "/1/2")
+    for query in (SCHEMA, other, LIST):
+        responses.update(query, result(query))
+    responses.update("oph_list level=0;" + SESSION, result("oph_list"))
+    assert len(responses) == 4
+    responses.update("oph_explorecube cube=http://host/1/1;" + SESSION,
+                     result("oph_explorecube"))
+    assert len(responses) == 4
+    responses.update("oph_cubeschema action=add;key=a;value=1;"
+                     "cube=http://host/1/1;" + SESSION, result("{}"))
+    assert responses.get(SCHEMA) is None and responses.get(LIST) is None
+    assert responses.get(other) is not None
+    responses.update(SCHEMA, result(SCHEMA))
+    responses.update("oph_delete cube=http://host/1/1;" + SESSION,
+                     result("oph_delete"))
+    assert responses.get(SCHEMA) is None
+    responses.update('{"name": "w", "tasks": []}', result("{}"))
+    assert len(responses) == 0
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_metadata_cache(tmp_path, sqlite):
+    path = str(tmp_path / "metadata.db") if sqlite else None
+    metadata = cache.MetadataCache(path, maxsize=3, max_bytes=40)
+    metadata.put("http://host/1/1", "dim_info", [{"name": "lat"}])
+    metadata.put("http://host/1/1", "coordinates", {"lat": [1.5, 2.5]})
+    metadata.put("http://host/1/2", "dim_info", [])
+    assert metadata.get("http://host/1/1", "dim_info") == [{"name": "lat"}]
+    metadata.put("http://host/1/3", "dim_info", [])
+    assert len(metadata) == 3 and metadata.evictions == 1
+    assert metadata.get("http://host/1/1", "coordinates") is None
+    metadata.put("http://host/1/4", "cubeschema", "x" * 30)
+    assert metadata.get("http://host/1/1", "dim_info") is None
+    assert metadata.get("http://host/1/4", "cubeschema") == "x" * 30
+    assert metadata.get("http://host/1/3", "dim_info") == []
+    metadata.drop("http://host/1/4")
+    assert len(metadata) == 1 and metadata.evictions == 3
+    metadata.put("http://host/1/5", "dim_info", [{"name": "time"}])
+    if sqlite:
+        shared = cache.MetadataCache(path)
+        assert shared.get("http://host/1/5", "dim_info") == [{"name": "time"}]
@@ -0,0 +1,57 @@
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pytest
+
+from PyOphidia import callback, jobs, response
+from PyOphidia.tests.conftest import FakeClient
+
+JOBID = "http://host/sessions/1/experiment?7#9"
+
+
+def notify(receiver, **params):
+    urlopen(receiver.url + "?" + urlencode(params), timeout=5).read()
+
+
+def test_parse_notification():
+    notification = callback.parse_notification({"JobID": JOBID,
+                                                "status": "1"})
+    assert notification.session == "http://host/sessions/1/experiment"
+    assert notification.workflowid == "7" and notification.status is None
+    notification = callback.parse_notification(
+        {"workflowid": 8, "status": "OPH_STATUS_COMPLETED"})
+    assert (notification.session, notification.workflowid) == (None, "8")
+    assert callback.parse_notification({"status": "x"}) is None
+
+
+def test_receiver():
+    receiver = callback.CallbackReceiver()
+    try:
+        received = []
+        notify(receiver, jobid=JOBID, status="OPH_STATUS_COMPLETED")
+        receiver.register(JOBID, received.append)
+        assert received[0].status == "OPH_STATUS_COMPLETED"
+        urlopen(receiver.url, data=b'{"workflowid": 7}', timeout=5).read()
+        assert received[1].jobid is None and receiver.notifications == 2
+        with pytest.raises(HTTPError):
+            urlopen("http://127.0.0.1:" + str(receiver.port) + "/?jobid=" +
+                    JOBID, timeout=5)
+    finally:
+        receiver.close()
+
+
+def test_job_notified():
+    receiver = callback.CallbackReceiver()
+    try:
+        client = FakeClient([])
+        monitor = jobs.JobMonitor(client, receiver=receiver)
+        job = monitor.watch(response.Result(
+            "oph_reduce exec_mode=async;callback_url=" + receiver.url + ";",
+            "{}", jobid=JOBID, session=JOBID.split("?")[0]))
+        notify(receiver, jobid=JOBID, status="OPH_STATUS_COMPLETED")
+        assert job.result(timeout=5).cube == "http://host/1/2"
+        assert [query for query, session in client.queries] == \
+            ["oph_resume document_type=response;level=1;id=7;"]
+    finally:
+        receiver.close()
@@ -0,0 +1,164 @@
+import json
+import re
+import threading
+import time
+
+import pytest
+
+from PyOphidia import client, ophsubmit
+from PyOphidia.tests.conftest import FakeTransport
+
+CONFIG = [["OPH_SESSION_ID", "http://host/sessions/abc/experiment"],
+          ["OPH_BASE_SRC_PATH", "/data"], ["OPH_CDD", "/home"],
+          ["OPH_CWD", "/ws"], ["OPH_DATACUBE", "http://host/1/5"]]
+REPLY = (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+         b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+         b'xmlns:oph="urn:oph"><SOAP-ENV:Body><oph:ophResponse>'
+         b'<error>0</error><response>' + json.dumps({"response": [
+             {"objclass": "grid", "objkey": "get_config",
+              "objcontent": [{"title": "Config",
+                              "rowkeys": ["PARAMETER", "VALUE"],
+                              "rowvalues": CONFIG}]}]}).encode() +
+         b'</response></oph:ophResponse></SOAP-ENV:Body></SOAP-ENV:Envelope>')
+
+
+def test_resume_state(tmp_path):
+    path = str(tmp_path / "session.json")
+    transport = FakeTransport(REPLY)
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=transport, session_cache=path)
+    assert len(transport.requests) == 1
+    assert b"key=all;" in transport.requests[0][0]
+    assert (ophclient.session, ophclient.base_src_path, ophclient.cdd,
+            ophclient.cwd, ophclient.cube) == tuple(row[1] for row in CONFIG)
+
+    transport = FakeTransport(REPLY)
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=transport, session_cache=path)
+    assert transport.requests == []
+    assert ophclient.cwd == "/ws" and ophclient.cube == "http://host/1/5"
+    ophclient.cwd = "/other"
+    ophclient._save_session()
+    assert client._read_session_cache(path, "host:11732:oph-user")["cwd"] \
+        == "/other"
+    assert client._read_session_cache(path, "host:11732:oph-user",
+                                      ttl=-1) is None
+
+
+class DuckTransport(object):
+    # Any object with a post method can carry the requests of a Client
+    def __init__(self):
+        self.bodies = []
+
+    def post(self, body, headers, sink, deadline=None):
+        self.bodies.append(body)
+        sink(REPLY)
+        return 200, "OK", ophsubmit.ContentDecoder(None, None)
+
+
+def test_duck_transport():
+    transport = DuckTransport()
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=transport)
+    assert len(transport.bodies) == 1 and ophclient.cwd == "/ws"
+    with pytest.raises(RuntimeError):
+        client.Client("oph-user", "oph-passwd", "host", "11732",
+                      transport="ftp")
+
+
+class SessionTransport(object):
+    # Serve a session whose workflows are numbered in order of arrival: the
+    # request of a thread with a deadline waits for the next request and then
+    # expires, the others wait for the cancel, while oph_resume lists the
+    # workflows still running
+    def __init__(self):
+        self.workflows = []
+        self.cancelled = []
+        self.unreachable = False
+        self.received = threading.Event()
+        self.done = threading.Event()
+
+    def post(self, body, headers, sink, deadline=None):
+        operator = re.search(br'"operator":"(\w+)"', body).group(1)
+        name = re.search(br'"name":"([^"]*)"', body).group(1).decode()
+        rows = []
+        if operator == b"oph_resume":
+            rows = [[str(i + 1), workflow, "OPH_STATUS_RUNNING"]
+                    for i, workflow in enumerate(self.workflows)]
+        elif operator == b"oph_cancel":
+            self.cancelled.append(re.search(br'"id=(\d+)"', body).group(1))
+            self.done.set()
+        elif deadline is not None and self.unreachable:
+            raise ophsubmit.DeadlineExceeded("deadline exceeded")
+        elif operator != b"oph_get_config":
+            self.workflows.append(name)
+            if deadline is not None:
+                self.received.wait(5)
+                raise ophsubmit.DeadlineExceeded("deadline exceeded")
+            self.received.set()
+            self.done.wait(5)
+        sink(REPLY.replace(b"get_config", b"resume").replace(
+            json.dumps(CONFIG).encode(), json.dumps(rows).encode()).replace(
+            b'["PARAMETER", "VALUE"]', b'["WORKFLOW ID", "NAME", "STATUS"]'))
+        return 200, "OK", ophsubmit.ContentDecoder(None, None)
+
+
+def test_cancel_expired():
+    transport = SessionTransport()
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=transport)
+    ophclient.session = "http://host/sessions/abc/experiment"
+
+    def expiring():
+        with ophclient.deadline(5, cancel=True):
+            ophclient.submit("oph_apply query=oph_max(measure);")
+
+    thread = threading.Thread(target=expiring)
+    thread.start()
+    while not transport.workflows:
+        time.sleep(0.01)
+    assert ophclient.submit("oph_apply query=oph_min(measure);") is not None
+    thread.join()
+    assert transport.workflows[0].startswith("oph_apply #")
+    assert transport.workflows[1] == "oph_apply"
+    assert transport.cancelled == [b"1"]
+
+    transport.unreachable = True
+    transport.workflows = ["oph_apply"]
+    with ophclient.deadline(5, cancel=True):
+        assert ophclient.submit("oph_apply query=oph_max(measure);") is None
+    assert transport.cancelled == [b"1"]
+
+
+def test_deadline_nesting():
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=FakeTransport(REPLY))
+    assert ophclient._get_deadline() == (None, False)
+    with ophclient.deadline(10) as same:
+        assert same is ophclient
+        outer = ophclient._get_deadline()[0]
+        with ophclient.deadline(100, cancel=True):
+            assert ophclient._get_deadline() == (outer, True)
+            with ophclient.deadline(1):
+                inner, cancel = ophclient._get_deadline()
+                assert inner < outer and cancel
+        assert ophclient._get_deadline() == (outer, False)
+        ophclient.timeout = 0.5
+        assert ophclient._get_deadline()[0] < outer
+        ophclient.timeout = None
+    assert ophclient._get_deadline() == (None, False)
+
+
+def test_pretty_print(capsys):
+    ophclient = client.Client("oph-user", "oph-passwd", "host", "11732",
+                              transport=FakeTransport(REPLY))
+    text = {"response": [{"objclass": "text", "objkey": "status",
+                          "objcontent": [{"title": "Output Cube",
+                                          "message": "http://host/1/9"}]}]}
+    capsys.readouterr()
+    ophclient.pretty_print(text, None)
+    assert "http://host/1/9" in capsys.readouterr().out
+    ophclient.pretty_print(text["response"][0], text)
+    assert "http://host/1/9" in capsys.readouterr().out
+    ophclient.pretty_print(None, None)
+    assert "OPH_CWD" in capsys.readouterr().out
@@ -0,0 +1,192 @@
+import base64
+import json
+import re
+import struct
+import sys
+
+import pytest
+
+from PyOphidia import cache, cube
+from PyOphidia.tests.conftest import FakeTransport, reply, schema
+
+
+def test_lazy_info(transport):
+    transport.reply = reply(schema("http://host/1/2", "tos"))
+    mycube = cube.Cube(pid="http://host/1/2")
+    assert transport.requests == []
+    assert mycube.measure == "tos"
+    assert len(transport.requests) == 1
+    assert b"oph_cubesize" in transport.requests[0][0]
+    assert b"oph_cubeschema" in transport.requests[0][0]
+    assert mycube.size == "1.5 MB"
+    assert mycube.dim_info[0]["name"] == "time"
+    assert len(transport.requests) == 1
+    with pytest.raises(AttributeError):
+        mycube.missing
+
+
+def test_info_many(transport):
+    transport.reply = reply(schema("http://host/1/3", "tas") +
+                            schema("http://host/1/2", "tos"))
+    metadata = cube.Cube.metadata_cache = cache.MetadataCache()
+    try:
+        cubes = cube.Cube.info_many([cube.Cube(pid="http://host/1/2"),
+                                     cube.Cube(pid="http://host/1/3")])
+        assert [c.measure for c in cubes] == ["tos", "tas"]
+        assert len(transport.requests) == 1
+        assert b'"author": "oph-user"' in transport.requests[0][0]
+        assert len(metadata) == 2
+        assert cube.Cube(pid="http://host/1/3").nelements == "480"
+        assert len(transport.requests) == 1
+    finally:
+        cube.Cube.metadata_cache = None
+
+
+def test_info_display(transport, capsys):
+    metadata = cube.Cube.metadata_cache = cache.MetadataCache()
+    try:
+        metadata.put("http://host/1/2", "cubeschema",
+                     json.dumps({"response": schema("http://host/1/2",
+                                                    "tos")}))
+        mycube = cube.Cube(pid="http://host/1/2")
+        capsys.readouterr()
+        mycube.info(display=True)
+        assert transport.requests == []
+        assert "Datacube Information" in capsys.readouterr().out
+    finally:
+        cube.Cube.metadata_cache = None
+
+
+def test_export_array(transport):
+    def encode(fmt, *values):
+        return base64.b64encode(struct.pack(fmt, *values)).decode()
+
+    transport.reply = reply([
+        {"objclass": "grid", "objkey": "explorecube_dimvalues",
+         "objcontent": [
+             {"title": "lat", "rowkeys": ["INDEX", "lat"],
+              "rowfieldtypes": ["int", "double"],
+              "rowvalues": [["1", encode("d", 10.0)],
+                            ["2", encode("d", 20.0)]]},
+             {"title": "lon", "rowkeys": ["INDEX", "lon"],
+              "rowfieldtypes": ["int", "float"],
+              "rowvalues": [["1", encode("3f", 1.0, 2.0, 3.0)]]}]},
+        {"objclass": "grid", "objkey": "explorecube_data",
+         "objcontent": [{"title": "tos", "rowkeys": ["INDEX", "lat", "tos"],
+                         "rowfieldtypes": ["int", "double", "float"],
+                         "rowvalues": [["1", "10", encode("3f", 1.5, 2.5, 3.5)],
+                                       ["2", "20", encode("3f", 4.5, 5.5,
+                                                          6.5)]]}]},
+    ])
+    data = cube.Cube(pid="http://host/1/2").export_array()
+    assert data["dimension"] == [{"name": "lat", "values": [10.0, 20.0]},
+                                 {"name": "lon", "values": [1.0, 2.0, 3.0]}]
+    assert data["measure"] == [{"name": "tos", "values": [[1.5, 2.5, 3.5],
+                                                          [4.5, 5.5, 6.5]]}]
+    assert type(data["measure"][0]["values"][0][0]) is float
+
+
+def test_iter_chunks(transport):
+    values = base64.b64encode(struct.pack("2d", 1.0, 2.0)).decode()
+    transport.reply = reply([
+        {"objclass": "grid", "objkey": "explorecube_dimvalues",
+         "objcontent": [
+             {"title": "lat", "rowkeys": ["INDEX", "lat"],
+              "rowfieldtypes": ["int", "double"],
+              "rowvalues": [["1", values[:11]]]},
+             {"title": "lon", "rowkeys": ["INDEX", "lon"],
+              "rowfieldtypes": ["int", "double"],
+              "rowvalues": [["1", values[:11]], ["2", values[:11]]]}]},
+        {"objclass": "grid", "objkey": "explorecube_data",
+         "objcontent": [{"title": "tos", "rowkeys": ["INDEX", "lat", "tos"],
+                         "rowfieldtypes": ["int", "double", "double"],
+                         "rowvalues": [["1", "0", values]]}]},
+    ])
+    mycube = cube.Cube(pid="http://host/1/2")
+    mycube.dim_info = [
+        {"name": "lat", "size": "3", "array": "no"},
+        {"name": "lon", "size": "2", "array": "yes"},
+    ]
+    blocks = list(mycube.iter_chunks(chunk_size=2))
+    assert [selection for selection, _ in blocks] == [
+        {"lat": slice(0, 2)}, {"lat": slice(2, 3)}]
+    assert blocks[0][1].tolist() == [[1.0, 2.0]]
+    assert len(transport.requests) == 2
+    assert b"subset_filter=3:3" in transport.requests[1][0]
+    blocks = mycube.iter_chunks(dims="lat|lon", chunk_size="3|1", prefetch=0)
+    assert len(list(blocks)) == 2
+    with pytest.raises(RuntimeError):
+        mycube.iter_chunks(dims="depth")
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_decode_column(monkeypatch, numpy):
+    if not numpy:
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    rows = [["1", base64.b64encode(struct.pack("3d", i, i + 0.5, i + 0.25))
+             .decode()] for i in (1.0, 2.0)]
+    assert list(cube._decode_column(rows, 1, "double", first=True)) == \
+        [1.0, 2.0]
+    assert list(cube._decode_column(rows, 1, "double")) == \
+        [1.0, 1.5, 1.25, 2.0, 2.5, 2.25]
+
+
+class BlockTransport(FakeTransport):
+    # Reply to each explorecube request with the rows of lat selected by
+    # subset_filter, with a tos value of 10 * lat + lon
+    def post(self, body, headers, sink, deadline=None):
+        match = re.search(br"subset_filter=(\d+):(\d+)", body)
+        if match is None:
+            self.reply = reply([])
+            return FakeTransport.post(self, body, headers, sink, deadline)
+        lats = range(int(match.group(1)), int(match.group(2)) + 1)
+
+        def encode(fmt, *values):
+            return base64.b64encode(struct.pack(fmt, *values)).decode()
+
+        self.reply = reply([
+            {"objclass": "grid", "objkey": "explorecube_dimvalues",
+             "objcontent": [
+                 {"title": "lat", "rowkeys": ["INDEX", "lat"],
+                  "rowfieldtypes": ["int", "double"],
+                  "rowvalues": [[str(i), encode("d", i)] for i in lats]},
+                 {"title": "lon", "rowkeys": ["INDEX", "lon"],
+                  "rowfieldtypes": ["int", "double"],
+                  "rowvalues": [["1", encode("d", 0)],
+                                ["2", encode("d", 1)]]}]},
+            {"objclass": "grid", "objkey": "explorecube_data",
+             "objcontent": [{"title": "tos",
+                             "rowkeys": ["INDEX", "lat", "tos"],
+                             "rowfieldtypes": ["int", "double", "double"],
+                             "rowvalues": [[str(i), str(i), encode(
+                                 "2d", 10 * i, 10 * i + 1)] for i in lats]}]},
+        ])
+        return FakeTransport.post(self, body, headers, sink, deadline)
+
+
+@pytest.mark.parametrize("cube_client", [BlockTransport(reply([]))],
+                         indirect=True)
+def test_parallel_export(transport):
+    mycube = cube.Cube(pid="http://host/1/2")
+    mycube.dim_info = [
+        {"name": "lat", "size": "5", "array": "no", "hierarchy": "oph_base"},
+        {"name": "lon", "size": "2", "array": "yes", "hierarchy": "oph_base"},
+    ]
+    mycube.rowsxfrag, mycube.nfragments = "2", "3"
+    data = mycube.export_array(parallel=4)
+    assert len(transport.requests) == 3
+    assert data["dimension"][0]["values"] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert data["measure"][0]["values"] == [
+        [10.0 * i, 10.0 * i + 1] for i in range(1, 6)]
+    pytest.importorskip("xarray")
+    ds = mycube.to_dataset(parallel=2)
+    assert len(transport.requests) == 5
+    assert ds["lat"].values.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert ds["tos"].dims == ("lat", "lon")
+    assert ds["tos"].values[:, 1].tolist() == [11.0, 21.0, 31.0, 41.0, 51.0]
+
+    assert cube._plan_parallel(
+        [{"name": "lat", "size": "8", "array": "no"},
+         {"name": "lon", "size": "3", "array": "no"}],
+        "6", "4", 3)[1] == [("1:4", {"lat": slice(0, 4)}),
+                            ("5:8", {"lat": slice(4, 8)})]
@@ -0,0 +1,71 @@
+import pytest
+
+from PyOphidia import cube, graph
+from PyOphidia.tests.conftest import FakeTransport, reply, schema
+
+OUTPUT = {"objclass": "text", "objkey": "status",
+          "objcontent": [{"title": "Output Cube",
+                          "message": "http://host/1/9"}]}
+
+
+pytestmark = pytest.mark.parametrize(
+    "cube_client", [FakeTransport(reply([OUTPUT] + schema("http://host/1/9",
+                                                          "tos")))],
+    indirect=True)
+
+
+def test_lazy_chain(transport):
+    mycube = cube.Cube(pid="http://host/1/1")
+    with cube.Cube.lazy() as lazy:
+        subset = mycube.subset(subset_dims="time", subset_filter="1:12")
+        reduced = subset.reduce(operation="max")
+    assert transport.requests == []
+    assert graph.is_lazy(reduced.pid) and lazy.nodes == 2
+    tasks = lazy.workflow()["tasks"]
+    assert [task["operator"] for task in tasks] == ["oph_subset",
+                                                     "oph_reduce"]
+    assert "cube=http://host/1/1" in tasks[0]["arguments"]
+    assert tasks[1]["dependencies"] == [
+        {"task": "subset_0", "type": "single", "argument": "cube"}]
+    assert not [arg for arg in tasks[1]["arguments"]
+                if arg.startswith("cube=")]
+
+    assert reduced.compute().pid == "http://host/1/9"
+    assert len(transport.requests) == 1 and lazy.workflows == 1
+    body = transport.requests[0][0]
+    assert b"oph_subset" in body and b"oph_reduce" in body
+
+
+def test_lazy_data_access(transport):
+    with cube.Cube.lazy():
+        reduced = cube.Cube(pid="http://host/1/1").reduce(operation="max")
+    assert graph.is_lazy(reduced.pid)
+    assert reduced.measure == "tos"
+    assert reduced.pid == "http://host/1/9"
+    assert len(transport.requests) == 2
+    with pytest.raises(RuntimeError):
+        graph.bind("oph_explorecube cube=lazy://0123456789abcdef/0;")
+
+
+def test_workflow_recorder(transport):
+    mycube = cube.Cube(pid="http://host/1/1")
+    with cube.Cube.workflow(name="max") as wf:
+        subset = mycube.subset(subset_dims="time", subset_filter="1:12")
+        reduced = subset.reduce(operation="max")
+        tasks = wf.workflow()["tasks"]
+        assert [task["name"] for task in tasks] == ["subset_0", "reduce_1"]
+        subset.delete()
+        tasks = wf.workflow()["tasks"]
+        assert tasks[2]["operator"] == "oph_delete"
+        assert {"task": "reduce_1"} in tasks[2]["dependencies"]
+    assert len(transport.requests) == 1 and wf.workflows == 1
+    assert b'"name": "max"' in transport.requests[0][0]
+    assert wf.workflow()["tasks"] == []
+    with pytest.raises(RuntimeError):
+        reduced.compute()
+
+    with cube.Cube.workflow() as wf:
+        reduced = mycube.reduce(operation="max")
+    assert len(transport.requests) == 2
+    assert reduced.compute().pid == "http://host/1/9"
+    assert len(transport.requests) == 2
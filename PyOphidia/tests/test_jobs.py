@@ -0,0 +1,70 @@
+import pytest
+
+from PyOphidia import jobs, response
+from PyOphidia.tests.conftest import FakeClient
+
+
+def submission(jobid):
+    return response.Result("oph_reduce operation=max;exec_mode=async;",
+                           "{}", jobid=jobid, session=jobid.split("?")[0])
+
+
+def test_job_completed():
+    client = FakeClient([("OPH_STATUS_RUNNING", 0.5),
+                         ("OPH_STATUS_COMPLETED", 1.0)])
+    monitor = jobs.JobMonitor(client, min_interval=0.01)
+    job = monitor.watch(submission("http://host/sessions/1/experiment?7#9"))
+    assert job.workflowid == "7"
+    assert job.result(timeout=5).cube == "http://host/1/2"
+    assert job.progress == 1.0
+    assert ("oph_resume level=0;id=7;",
+            "http://host/sessions/1/experiment") in client.queries
+    assert monitor.pending() == []
+
+
+def test_status_monitor_batch():
+    session = "http://host/sessions/1/experiment"
+    client = FakeClient([], [[(7, "OPH_STATUS_RUNNING", 0.5),
+                              (8, "OPH_STATUS_PENDING", 0)],
+                             [(7, "OPH_STATUS_RUNNING", 0.5),
+                              (8, "OPH_STATUS_RUNNING", 0.25),
+                              (9, "OPH_STATUS_RUNNING", 0)]])
+    monitor = jobs.StatusMonitor(client)
+    monitor.track(7, session)
+    monitor.track("8", session)
+    assert monitor.queries() == [(session, "oph_loggingbk session_level=0;"
+                                  "job_level=1;session_filter=" + session +
+                                  ";nlines=1000;")]
+    assert [(d.workflowid, d.status, d.progress)
+            for d in monitor.refresh()] == [("7", "OPH_STATUS_RUNNING", 0.5),
+                                            ("8", "OPH_STATUS_PENDING", 0.0)]
+    deltas = monitor.refresh(session)
+    assert len(deltas) == 1 and deltas[0].previous_status == \
+        "OPH_STATUS_PENDING"
+    assert monitor.get(8, session) == ("OPH_STATUS_RUNNING", 0.25)
+    assert monitor.get(9, session) is None and monitor.refreshes == 2
+
+
+def test_job_failed():
+    client = FakeClient([("OPH_STATUS_ERROR", 1.0)])
+    monitor = jobs.JobMonitor(client, min_interval=0.01)
+    job = monitor.watch(submission("http://host/sessions/1/experiment?8#1"))
+    done, not_done = jobs.wait([job], timeout=5)
+    assert job in done
+    with pytest.raises(RuntimeError):
+        job.result()
+
+
+def test_jobs_batched():
+    client = FakeClient([], [[(7, "OPH_STATUS_RUNNING", 0.5),
+                              (8, "OPH_STATUS_RUNNING", 0.5)],
+                             [(7, "OPH_STATUS_COMPLETED", 1),
+                              (8, "OPH_STATUS_COMPLETED", 1)]])
+    monitor = jobs.JobMonitor(client, min_interval=0.01, backoff=1)
+    watched = [monitor.watch(submission("http://host/sessions/1/experiment?"
+                                        + workflowid + "#1"))
+               for workflowid in ("7", "8")]
+    done, not_done = jobs.wait(watched, timeout=5)
+    assert not not_done and monitor.status.refreshes == 2
+    assert not [query for query, session in client.queries
+                if query.startswith("oph_resume level=0")]
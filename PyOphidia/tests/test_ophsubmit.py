@@ -0,0 +1,239 @@
+import json
+import re
+import socket
+import threading
+import time
+import zlib
+from http.client import HTTPException
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from PyOphidia import ophsubmit
+from PyOphidia.tests.conftest import FakeTransport
+
+
+@pytest.mark.parametrize("text",
+                         ["a=1;b=2;", ";;a=[1;2];b=3", "a=[1;2;[3;4]];b=5;;",
+                          "a=1];b=[2", "subset_filter=[" + ";".join(
+                              str(i) for i in range(1000)) + "];cube=1;"])
+def test_split_arguments(text):
+    expected = [e for e in re.split(r"(?![^\[]*\]);+", text) if e]
+    assert ophsubmit._split_arguments(text) == expected
+
+
+def test_query_parsing():
+    query = ophsubmit.Query("oph_list level=2;sessionid=abc;exec_mode=sync;"
+                            "subset_filter=[1;2];sessionid=def;")
+    assert query.operator == "oph_list"
+    assert query.sessionid == "abc"
+    assert query.exec_mode == "sync"
+    assert query.project is None
+    assert query.arguments == ["level=2", "subset_filter=[1;2]"]
+
+    workflow = json.loads(query.to_workflow("oph-user"))
+    assert workflow["name"] == "oph_list"
+    assert workflow["author"] == "oph-user"
+    assert workflow["sessionid"] == "abc"
+    assert workflow["tasks"][0]["arguments"] == ["level=2",
+                                                 "subset_filter=[1;2]"]
+
+
+@pytest.mark.parametrize("text", ["list level=2;", "level=2;",
+                                  "operator;level=2;"])
+def test_invalid_query(text):
+    with pytest.raises(ValueError):
+        ophsubmit.Query(text)
+    assert ophsubmit._wrap_query("oph-user", text) is None
+
+
+def test_json_workflow():
+    workflow = '{"name": "test", "tasks": []}'
+    assert ophsubmit._wrap_query("oph-user", workflow) == workflow
+
+
+def test_build_message():
+    message, headers = ophsubmit._build_message("oph-user", "oph-passwd",
+                                                'a & b < c > d\n"é"')
+    assert b"a &amp; b &lt; c &gt; d&#xA;\"\xc3\xa9\"" in message
+    assert headers["Authorization"].startswith("Basic ")
+
+
+def compress(data, wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+@pytest.mark.parametrize("encoding,wbits", [("gzip", 16 + zlib.MAX_WBITS),
+                                            ("deflate", zlib.MAX_WBITS),
+                                            ("deflate", -zlib.MAX_WBITS),
+                                            ("identity", None)])
+def test_content_decoder(encoding, wbits):
+    data = b"<response>" + b"0123456789" * 500 + b"</response>"
+    body = data if wbits is None else compress(data, wbits)
+    received = []
+    decoder = ophsubmit.ContentDecoder(encoding, received.append)
+    for i in range(len(body)):
+        decoder.feed(body[i:i + 1])
+    decoder.close()
+    assert b"".join(received) == data
+    assert (decoder.received, decoder.decoded) == (len(body), len(data))
+    with pytest.raises(ValueError):
+        ophsubmit.ContentDecoder("br", received.append)
+
+
+def test_negotiate():
+    headers = {}
+    body = b"x" * 100
+    assert ophsubmit._negotiate(body, headers, True, 200) is body
+    assert headers == {"Accept-Encoding": "gzip, deflate"}
+    headers = {}
+    compressed = ophsubmit._negotiate(body, headers, False, 100)
+    assert headers == {"Content-Encoding": "gzip"}
+    assert zlib.decompress(compressed, 16 + zlib.MAX_WBITS) == body
+
+
+def test_submit_through_transport():
+    reply = (b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+             b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+             b'xmlns:oph="urn:oph"><SOAP-ENV:Body><oph:ophResponse>'
+             b'<error>0</error>'
+             b'<jobid>http://host/sessions/abc/experiment?7#9</jobid>'
+             b'<response>{"response": []}</response></oph:ophResponse>'
+             b'</SOAP-ENV:Body></SOAP-ENV:Envelope>')
+    transport = FakeTransport(reply)
+    result = ophsubmit.submit("oph-user", "oph-passwd", "host", 11732,
+                              "oph_list level=2;", pool=transport)
+    assert result[0] == '{"response": []}'
+    assert result[1:4] == ("http://host/sessions/abc/experiment?7#9",
+                           "http://host/sessions/abc/experiment", 0)
+    assert len(transport.requests) == 1
+
+    result = ophsubmit.submit("oph-user", "oph-passwd", "host", 11732,
+                              "oph_list level=2;", pool=transport,
+                              deadline=time.time() + 10)
+    assert result[3] == 1
+    assert isinstance(result[4], ophsubmit.DeadlineExceeded)
+    with pytest.raises(ophsubmit.DeadlineExceeded):
+        ophsubmit._remaining(time.time() - 1)
+
+
+def test_get_pool_scheme():
+    pool = ophsubmit.get_pool("oph-user", "oph-passwd", "/tmp/oph.sock", 0,
+                              scheme="unix")
+    assert isinstance(pool, ophsubmit.UnixConnectionPool)
+    assert (pool.path, pool.server, pool.port) == ("/tmp/oph.sock",
+                                                   "localhost", None)
+    assert pool.maxsize == ophsubmit.DEFAULT_POOL_SIZE and pool.acquire()
+    assert ophsubmit.get_pool("oph-user", "oph-passwd", "host", 11732,
+                              scheme="http").scheme == "http"
+    with pytest.raises(ValueError):
+        ophsubmit.get_pool("oph-user", "oph-passwd", "host", 11732,
+                           scheme="ftp")
+    ophsubmit.close_pools()
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Reply to each request with its body; in "drop" mode, close the
+    # connection without replying, as a server failing after running it
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.bodies.append(body)
+        if self.server.mode == "drop":
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.bodies, server.connections, server.mode = [], 0, "echo"
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_reuse(server):
+    pool = ophsubmit.HTTPConnectionPool("127.0.0.1", server.server_port)
+    for body in (b"first", b"second"):
+        received = []
+        status = pool.post(body, {}, received.append)[0]
+        assert status == 200 and received == [body]
+    assert server.connections == 1
+
+    server.mode = "drop"
+    with pytest.raises((HTTPException, socket.error)):
+        pool.post(b"delete", {}, None)
+    assert server.bodies[2:] == [b"delete"]
+
+    server.mode = "echo"
+    pool.post(b"list", {}, lambda data: None)
+    server.mode = "drop"
+    with pytest.raises((HTTPException, socket.error)):
+        pool.post(b"list", {}, None, resend=True)
+    assert server.bodies[4:] == [b"list", b"list"]
+    pool.close()
+
+
+def test_get_pool_settings():
+    first = ophsubmit.get_pool("oph-user", "oph-passwd", "host", 11732,
+                               maxsize=2, scheme="http")
+    second = ophsubmit.get_pool("oph-user", "oph-passwd", "host", 11732,
+                                maxsize=8, scheme="http")
+    assert first is not second
+    assert (first.maxsize, second.maxsize) == (2, 8)
+    assert ophsubmit.get_pool("oph-user", "oph-passwd", "host", 11732,
+                              maxsize=2, scheme="http") is first
+    ophsubmit.close_pools()
+
+
+def test_deadline_interrupts():
+    # The server never replies to a request it keeps reading
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    pool = ophsubmit.HTTPConnectionPool("127.0.0.1",
+                                        listener.getsockname()[1])
+    started = time.time()
+    result = ophsubmit.submit("oph-user", "oph-passwd", "127.0.0.1", 0,
+                              "oph_list level=2;", pool=pool,
+                              deadline=started + 0.3)
+    assert 0.3 <= time.time() - started < 5
+    assert isinstance(result[4], ophsubmit.DeadlineExceeded)
+    listener.close()
+
+
+@pytest.mark.parametrize("text,gsoap", [("café àè", True),
+                                        ("café", False), ("€ 5", False)])
+def test_non_ascii_response(text, gsoap):
+    # gSOAP sends each UTF-8 byte of the response as a latin-1 character
+    response = json.dumps({"response": [{"title": text}]},
+                          ensure_ascii=False).encode("utf-8")
+    if gsoap:
+        response = response.decode("latin-1").encode("utf-8")
+    transport = FakeTransport(
+        b'<?xml version="1.0" encoding="UTF-8"?><SOAP-ENV:Envelope '
+        b'xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" '
+        b'xmlns:oph="urn:oph"><SOAP-ENV:Body><oph:ophResponse>'
+        b'<error>0</error><response>' + response + b'</response>'
+        b'</oph:ophResponse></SOAP-ENV:Body></SOAP-ENV:Envelope>')
+    result = ophsubmit.submit("oph-user", "oph-passwd", "host", 11732,
+                              "oph_list level=2;", pool=transport)
+    assert json.loads(result[0])["response"][0]["title"] == text
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from PyOphidia import response
+
+RAW = json.dumps({"response": [
+    {"objclass": "text", "objkey": "status",
+     "objcontent": [{"title": "SUCCESS", "message": "ok"}]},
+    {"objclass": "text", "objkey": "cwd",
+     "objcontent": [{"title": "Current Working Directory", "message": "/"}]},
+    {"objclass": "grid", "objkey": "explorecube_data",
+     "objcontent": [{"title": "tos", "rowkeys": ["INDEX", "tos"],
+                     "rowfieldtypes": ["int", "double"],
+                     "rowvalues": [["1", "AAAAAAAA8D8"]]}]},
+    {"objclass": "grid", "objkey": "explorecube_metadata",
+     "objcontent": [{"title": "a", "rowvalues": []}]},
+    {"objclass": "grid", "objkey": "explorecube_metadata",
+     "objcontent": [{"title": "b", "rowvalues": []}]},
+]})
+
+
+def test_parsed_once():
+    res = response.Response(RAW)
+    assert res.parsed is res.parsed
+    assert response.Response(None).parsed is None
+
+
+def test_find():
+    res = response.Response(RAW)
+    assert res.text(objkey="status").message == "ok"
+    assert res.text(title="Current Working Directory").objkey == "cwd"
+    assert res.grid(objkey="explorecube_data").rowkeys == ["INDEX", "tos"]
+    assert res.grid(objkey="status") is None
+    assert res.find(objkey="missing") is None
+    assert res.find(objkey="explorecube_metadata").title == "a"
+    assert [obj.title for obj in res.find_all(
+        objkey="explorecube_metadata")] == ["a", "b"]
+    assert len(res.objects) == 5
+    with pytest.raises(ValueError):
+        res.find()
+
+
+def test_result_read_only():
+    result = response.Result("oph_list level=2;", RAW, cube="http://host/1/1")
+    assert result.deserialize_response() is result.get_response().parsed
+    assert result.get_response().text(objkey="status").message == "ok"
+    with pytest.raises(AttributeError):
+        result.cube = None
+    assert result.cube == "http://host/1/1"
+
+
+def test_streamed_rows():
+    res = response.Response(RAW)
+    rows = res.grid(objkey="explorecube_data").rowvalues
+    assert isinstance(rows, response.Rows) and not res._decoded
+    assert len(rows) == 1 and rows
+    assert rows.column(1, "f8").tolist() == [1.0]
+    assert rows.column(1, "f8", first=True).tolist() == [1.0]
+    with pytest.raises(ValueError):
+        rows.column(1, "f4,f4,f4")
+    assert rows == [["1", "AAAAAAAA8D8"]] and rows[0][0] == "1"
+    assert res.find(objkey="explorecube_metadata").rowvalues == []
+    assert res.extra is None and not res._decoded
@@ -0,0 +1,73 @@
+import socket
+import time
+
+from PyOphidia import ophsubmit, retry
+
+OK = ("{}", None, None, 0, None)
+NO_RESPONSE = (None, None, None, 8, "Error on serving request: server no "
+                                    "response")
+REFUSED = (None, None, None, 1, socket.error("Connection refused"))
+DEADLINE = (None, None, None, 1, ophsubmit.DeadlineExceeded("deadline "
+                                                             "exceeded"))
+AUTH_ERROR = (None, None, None, 5, "Error on serving request: server "
+                                   "authentication error")
+
+
+def sequence(*results):
+    results = list(results)
+    return lambda: results.pop(0)
+
+
+def test_is_transient():
+    assert retry.is_transient(NO_RESPONSE)
+    assert retry.is_transient(REFUSED)
+    assert not retry.is_transient(AUTH_ERROR)
+    assert not retry.is_transient(DEADLINE)
+    assert not retry.is_transient(OK)
+
+
+def test_delay():
+    policy = retry.RetryPolicy(backoff=1, max_backoff=5, jitter=0.5)
+    for attempt, expected in enumerate([1, 2, 4, 5, 5]):
+        assert expected / 2.0 <= policy.delay(attempt) <= expected
+
+
+def test_retry_read_only_operators():
+    policy = retry.RetryPolicy(backoff=0)
+    assert policy.execute(sequence(REFUSED, NO_RESPONSE, OK),
+                          "oph_list") == OK
+    assert policy.execute(sequence(REFUSED, OK), "oph_delete") == REFUSED
+    assert policy.execute(sequence(AUTH_ERROR, OK), "oph_list") == AUTH_ERROR
+    assert policy.execute(sequence(*[REFUSED] * 4),
+                          "oph_cubeschema") == REFUSED
+    assert (policy.calls, policy.retries, policy.recovered,
+            policy.exhausted) == (4, 5, 1, 1)
+
+
+def test_circuit_breaker():
+    breaker = retry.CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    policy = retry.RetryPolicy(backoff=0, max_retries=0, breaker=breaker)
+    policy.execute(sequence(REFUSED), "oph_list")
+    assert breaker.state == "closed"
+    policy.execute(sequence(REFUSED), "oph_list")
+    assert breaker.state == "open" and breaker.trips == 1
+    assert breaker.allow() and breaker.state == "half-open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+    breaker.reset_timeout = 60
+    breaker.record_failure()
+    breaker.record_failure()
+    assert policy.execute(sequence(OK), "oph_list")[4] == \
+        retry.CIRCUIT_OPEN_ERROR
+
+
+def test_backoff_within_deadline():
+    policy = retry.RetryPolicy(backoff=10, jitter=0)
+    started = time.time()
+    assert policy.execute(sequence(REFUSED, OK), "oph_list",
+                          deadline=started + 0.2) == OK
+    assert time.time() - started < 5
+    assert policy._next_delay(REFUSED, "oph_list", 0, started,
+                              time.time() - 1) == 0
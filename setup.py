@@ -62,5 +62,10 @@ setup(
         'numpy>=1.19',
         'pandas>=1.2',
         'xarray'
-    ]},
+    ],
+        "xarray": ["numpy>=1.19", "xarray"],
+    },
+    entry_points={
+        "xarray.backends": ["ophidia = PyOphidia.backend:OphidiaBackendEntrypoint"],
+    },
 )